@@ -0,0 +1,106 @@
+"""
+Prueba de concurrencia del camino de escritura (update_game / save_quiz_result).
+
+Lanza envíos simultáneos para un usuario nuevo contra la app en proceso
+(httpx + ASGITransport, sin red) y verifica que los contadores quedan
+exactos: un solo total_games por juego nuevo, total_answered/total_correct
+iguales a los resultados enviados y best_score igual al máximo.
+
+Necesita un MongoDB real (MONGO_URI / DB_NAME del .env; usar una base de
+pruebas). Sale con código 1 si algún contador no cuadra.
+
+Uso (desde backend2/):
+    python -m bench.concurrent_writes --games 3 --submissions 60
+"""
+import argparse
+import asyncio
+import sys
+import uuid
+
+import httpx
+
+import main
+from db import repository as repo
+
+
+async def run(games: int, submissions: int) -> bool:
+    username = f"bench_{uuid.uuid4().hex[:10]}"
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post("/user/register", json={"username": username, "password": "bench-pass"})
+
+            def quiz(i):
+                return client.post("/user/save_quiz_result", json={
+                    "username": username,
+                    "game_number": i % games,
+                    "question_number": i,
+                    "quiz_question": "q",
+                    "quiz_options": ["a", "b", "c", "d"],
+                    "selected_option": "A",
+                    "correct_answer_letter": "A",
+                    "correct_answer_text": "a",
+                    "is_correct": i % 2 == 0,
+                })
+
+            def progress(i):
+                return client.post("/user/update_game", json={
+                    "username": username,
+                    "game_number": i % games,
+                    "question_number": i,
+                    "correct_count": 0,
+                    "highest_score": i,
+                })
+
+            # Todo a la vez: quizzes y progreso compiten por crear los mismos juegos
+            responses = await asyncio.gather(
+                *(quiz(i) for i in range(submissions)),
+                *(progress(i) for i in range(submissions)),
+            )
+            errors = [r.status_code for r in responses if r.status_code != 200]
+
+        user = await repo.get_user(username)
+        stats = user.get("stats", {})
+        game_docs = await repo.count_games({"user_id": user["_id"]})
+
+        expected = {
+            "http_errors": [],
+            "games_docs": games,
+            "stats.total_games": games,
+            "stats.total_answered": submissions,
+            "stats.total_correct": (submissions + 1) // 2,
+            "best_score": submissions - 1,
+        }
+        actual = {
+            "http_errors": errors,
+            "games_docs": game_docs,
+            "stats.total_games": stats.get("total_games"),
+            "stats.total_answered": stats.get("total_answered"),
+            "stats.total_correct": stats.get("total_correct"),
+            "best_score": user.get("best_score"),
+        }
+
+        # Limpieza del usuario de prueba
+        await repo.games_col().delete_many({"user_id": user["_id"]})
+        await repo.quiz_col().delete_many({"user_id": user["_id"]})
+        await repo.users_col().delete_one({"_id": user["_id"]})
+
+    ok = True
+    for key, value in expected.items():
+        mark = "✔" if actual[key] == value else "❌"
+        ok = ok and actual[key] == value
+        print(f"{mark} {key:22} expected={value} actual={actual[key]}")
+    return ok
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Concurrent write-path consistency check.")
+    parser.add_argument("--games", type=int, default=3)
+    parser.add_argument("--submissions", type=int, default=60)
+    args = parser.parse_args()
+    return 0 if asyncio.run(run(args.games, args.submissions)) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,181 @@
+"""
+Servidor falso compatible con la API de OpenAI (POST /v1/chat/completions).
+
+Sirve respuestas sintéticas con latencia, tasa de errores y streaming
+configurables, para medir el backend sin gastar tokens ni depender de la
+red. Si el prompt pide JSON (generate_quiz) responde un quiz válido.
+
+Uso (desde backend2/):
+    python -m bench.fake_openai --port 8099 --latency-ms 400 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=bench uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+QUIZ_JSON = json.dumps({
+    "question": "Which protein gives meat its red color?",
+    "options": ["Myoglobin", "Collagen", "Actin", "Elastin"],
+    "correct_answer_index": 0,
+})
+ANSWER_WORDS = (
+    "Meat color depends mostly on myoglobin and its oxidation state, "
+    "while tenderness is driven by connective tissue and postmortem aging."
+).split()
+
+
+class FakeSettings:
+    def __init__(self, latency_ms=300.0, jitter_ms=100.0, error_rate=0.0,
+                 rate_limit_rate=0.0, token_delay_ms=15.0, answer_tokens=40):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.token_delay_ms = token_delay_ms
+        self.answer_tokens = answer_tokens
+        self.requests = 0
+
+
+def _answer_text(settings: FakeSettings, wants_json: bool) -> str:
+    if wants_json:
+        return QUIZ_JSON
+    words = [ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(settings.answer_tokens)]
+    return " ".join(words)
+
+
+def _usage(prompt: str, completion: str) -> dict:
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = max(1, len(completion) // 4)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def create_app(settings: FakeSettings) -> Starlette:
+    async def chat_completions(request: Request):
+        settings.requests += 1
+        body = await request.json()
+        model = body.get("model", "fake-model")
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        wants_json = "JSON" in prompt
+
+        # Latencia hasta el primer byte
+        delay = max(0.0, random.gauss(settings.latency_ms, settings.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+        roll = random.random()
+        if roll < settings.rate_limit_rate:
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_error"}},
+                status_code=429, headers={"retry-after": "1"},
+            )
+        if roll < settings.rate_limit_rate + settings.error_rate:
+            return JSONResponse(
+                {"error": {"message": "Upstream error (fake)", "type": "server_error"}},
+                status_code=500,
+            )
+
+        text = _answer_text(settings, wants_json)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": _usage(prompt, text),
+            })
+
+        async def stream():
+            tokens = [text] if wants_json else [w + " " for w in text.split()]
+            for token in tokens:
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(settings.token_delay_ms / 1000)
+            done = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            yield f"data: {json.dumps(done)}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                usage = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": _usage(prompt, text),
+                }
+                yield f"data: {json.dumps(usage)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    async def stats(request: Request):
+        return JSONResponse({"requests": settings.requests})
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/stats", stats),
+    ])
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de respuestas 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fracción de respuestas 429")
+    parser.add_argument("--token-delay-ms", type=float, default=15.0)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+
+
+def settings_from_args(args) -> FakeSettings:
+    return FakeSettings(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        token_delay_ms=args.token_delay_ms,
+        answer_tokens=args.answer_tokens,
+    )
+
+
+def main_cli():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(settings_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main_cli()
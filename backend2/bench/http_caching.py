@@ -0,0 +1,117 @@
+"""
+Benchmark: bytes por la red y CPU del servidor al re-pedir el historial.
+
+Simula el patrón del frontend: tras cada acción vuelve a pedir get_stats,
+pero solo una de cada --write-every peticiones llega después de un cambio
+real. Compara tres configuraciones sobre el mismo payload (historial
+sintético de bench.serialization servido con BSONJSONResponse):
+
+- before:        sin ETag ni compresión (cuerpo completo siempre)
+- compression:   CompressionMiddleware (gzip / brotli si está instalado)
+- etag+compress: además If-None-Match → 304 mientras la versión no cambie
+
+La CPU del servidor se mide con process_time alrededor de la app ASGI
+(httpx + ASGITransport corre en el mismo hilo, fuera de esa medida).
+
+Uso (desde backend2/):
+    python -m bench.http_caching --messages 2000 --requests 300 --write-every 5
+"""
+import argparse
+import asyncio
+import time
+from typing import Optional
+
+import httpx
+from fastapi import FastAPI, Header
+
+from bench.serialization import build_history
+from services import conditional
+from services.bson_json import BSONJSONResponse
+from services.compression import CompressionMiddleware, brotli
+
+
+class ServerCPU:
+    """Acumula el tiempo de CPU consumido dentro de la app."""
+
+    def __init__(self, app):
+        self.app = app
+        self.seconds = 0.0
+
+    async def __call__(self, scope, receive, send):
+        t0 = time.process_time()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.seconds += time.process_time() - t0
+
+
+def build_app(history: dict, user: dict, use_etag: bool, compress: bool):
+    app = FastAPI()
+
+    @app.get("/user/get_stats/{username}")
+    async def get_stats(username: str, if_none_match: Optional[str] = Header(None)):
+        etag = conditional.user_etag(user)
+        if use_etag and conditional.is_fresh(etag, if_none_match):
+            return conditional.not_modified(etag)
+        response = BSONJSONResponse({"username": username, **history, "next_after": None})
+        return conditional.with_etag(response, etag) if use_etag else response
+
+    if compress:
+        app.add_middleware(CompressionMiddleware)
+    return app
+
+
+async def run_case(name: str, history: dict, requests: int, write_every: int, use_etag: bool, compress: bool) -> dict:
+    user = {"_id": history["user_id"], "version": 0}
+    app = ServerCPU(build_app(history, user, use_etag, compress))
+    transport = httpx.ASGITransport(app=app)
+    wire_bytes, not_modified = 0, 0
+    etag = None
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(requests):
+            if i and i % write_every == 0:
+                user["version"] += 1
+            headers = {"Accept-Encoding": "br, gzip"}
+            if use_etag and etag:
+                headers["If-None-Match"] = etag
+            response = await client.get("/user/get_stats/bench", headers=headers)
+            wire_bytes += response.num_bytes_downloaded + sum(len(k) + len(v) + 4 for k, v in response.headers.raw)
+            if response.status_code == 304:
+                not_modified += 1
+            etag = response.headers.get("etag", etag)
+    return {
+        "case": name,
+        "kb_per_request": wire_bytes / requests / 1024,
+        "server_cpu_ms_per_request": app.seconds / requests * 1000,
+        "not_modified": not_modified,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Bytes-on-wire and server CPU for history refetches.")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--write-every", type=int, default=5)
+    args = parser.parse_args()
+
+    history = build_history(args.messages)
+    cases = [
+        ("before", False, False),
+        ("compression", False, True),
+        ("etag+compress", True, True),
+    ]
+    print(f"encoding offered: br, gzip (brotli {'available' if brotli else 'not installed, gzip used'})")
+    baseline = None
+    for name, use_etag, compress in cases:
+        row = asyncio.run(run_case(name, history, args.requests, args.write_every, use_etag, compress))
+        baseline = baseline or row
+        print(
+            f"{name:14} {row['kb_per_request']:9.1f} KB/req  "
+            f"cpu={row['server_cpu_ms_per_request']:7.2f} ms/req  "
+            f"304s={row['not_modified']:4d}  "
+            f"bytes x{baseline['kb_per_request'] / row['kb_per_request']:.1f} less"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,59 @@
+"""
+Perfil de tiempo de importación de la app (arranque en frío).
+
+Corre `python -X importtime -c "import main"` en procesos nuevos y reporta
+el tiempo acumulado de `main` (mediana de --repeat corridas) y los módulos
+de primer nivel más caros.
+
+Uso (desde backend2/):
+    python -m bench.import_profile --repeat 5 --top 15
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+
+def profile_once(module: str) -> list:
+    """Lista de (self_us, cumulative_us, depth, nombre) de una importación."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Import-time profile of the app.")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    totals = []
+    rows = []
+    for _ in range(args.repeat):
+        rows = profile_once(args.module)
+        totals.append(next(cum for _, cum, _, name in rows if name == args.module))
+
+    print(f"import {args.module}: median {statistics.median(totals) / 1000:.0f} ms "
+          f"(min {min(totals) / 1000:.0f} ms, {args.repeat} runs)\n")
+
+    # Dependencias directas de main y de los paquetes propios, por tiempo acumulado
+    min_depth = min(depth for _, _, depth, _ in rows)
+    direct = [r for r in rows if r[2] == min_depth + 1 or r[3].split(".")[0] in ("services", "db", "routes", "config")]
+    direct.sort(key=lambda r: r[1], reverse=True)
+    print(f"{'module':40} {'cumulative ms':>14}")
+    for _, cumulative, _, name in direct[:args.top]:
+        print(f"{name:40} {cumulative / 1000:14.1f}")
+
+
+if __name__ == "__main__":
+    main_cli()
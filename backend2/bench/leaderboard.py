@@ -0,0 +1,87 @@
+"""
+Benchmark del leaderboard y del rank con muchos usuarios.
+
+Siembra --users usuarios sintéticos (best_score aleatorio) en la base del
+.env, crea los índices y mide /user/leaderboard y /user/rank/{username}
+contra la app en proceso (httpx + ASGITransport). Muestra además el plan
+de las dos consultas para confirmar que usan best_score_desc (IXSCAN, sin
+SORT en memoria). Usar una base de pruebas: los usuarios sembrados se
+borran al terminar.
+
+Uso (desde backend2/):
+    python -m bench.leaderboard --users 100000 --requests 500
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+import httpx
+
+import main
+from db import repository as repo
+from db.indexes import ensure_indexes, explain_routes
+
+
+async def seed(prefix: str, users: int) -> list:
+    usernames = [f"{prefix}{i:06d}" for i in range(users)]
+    for start in range(0, users, 5000):
+        await repo.users_col().insert_many([
+            {"username": name, "password": b"", "best_score": random.randint(0, 1000), "stats": {}}
+            for name in usernames[start:start + 5000]
+        ], ordered=False)
+    return usernames
+
+
+async def timed(client, url: str, count: int) -> dict:
+    timings = []
+    for _ in range(count):
+        t0 = time.perf_counter()
+        response = await client.get(url() if callable(url) else url)
+        timings.append(time.perf_counter() - t0)
+        response.raise_for_status()
+    timings.sort()
+    return {
+        "p50_ms": statistics.median(timings) * 1000,
+        "p95_ms": timings[int(len(timings) * 0.95) - 1] * 1000,
+    }
+
+
+async def run(users: int, requests: int):
+    prefix = f"lb_{uuid.uuid4().hex[:6]}_"
+    async with main.app.router.lifespan_context(main.app):
+        db = main.app.state.db
+        await ensure_indexes(db)
+        usernames = await seed(prefix, users)
+        try:
+            for row in await explain_routes(db):
+                if row["collection"] == "users":
+                    print(f"{row['route']:22} stages={row['stages']}")
+
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                results = {
+                    "leaderboard?limit=10": await timed(client, "/user/leaderboard?limit=10", requests),
+                    "leaderboard?limit=100": await timed(client, "/user/leaderboard?limit=100", requests),
+                    "rank/{username}": await timed(
+                        client, lambda: f"/user/rank/{random.choice(usernames)}", requests
+                    ),
+                }
+            for name, row in results.items():
+                print(f"{name:22} p50={row['p50_ms']:7.2f} ms  p95={row['p95_ms']:7.2f} ms")
+        finally:
+            await repo.users_col().delete_many({"username": {"$regex": f"^{prefix}"}})
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Leaderboard / rank benchmark.")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.requests))
+
+
+if __name__ == "__main__":
+    main_cli()
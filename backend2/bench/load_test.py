@@ -0,0 +1,365 @@
+"""
+Prueba de carga: una clase entera usando la app (login, chat, quizzes, stats).
+
+Cada estudiante simulado recorre todas las rutas de chatbot_routes.py y
+user_routes.py. Al final se reporta por endpoint p50/p95/p99, requests/s y
+errores, y se escribe un JSON para comparar entre commits.
+
+Por defecto todo corre en este proceso, sin red externa:
+- OpenAI: bench/fake_openai.py levantado con uvicorn en un puerto libre
+  (latencia, streaming y tasa de errores configurables).
+- MongoDB: un mongod local (BENCH_MONGO_URI, por defecto
+  mongodb://127.0.0.1:27017) con una base temporal que se borra al final.
+  Por ejemplo: docker run --rm -p 27017:27017 mongo:7
+- La app se llama con httpx + ASGITransport.
+
+Con --target se mide un servidor ya levantado (uvicorn/Render); en ese caso
+OPENAI_BASE_URL del servidor debe apuntar a un fake_openai aparte, y el
+export solo se mide si se pasa --export-key (EXPORT_API_KEY del servidor).
+
+Uso (desde backend2/):
+    python -m bench.load_test --students 30 --games 2 --questions 3
+    python -m bench.load_test --latency-ms 800 --error-rate 0.05
+    python -m bench.load_test --compare bench/results/load_abc1234.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+
+from bench import fake_openai
+
+BENCH_MONGO_URI = os.getenv("BENCH_MONGO_URI", "mongodb://127.0.0.1:27017")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DELETE_JOB_POLL_S = 0.2
+DELETE_JOB_MAX_POLLS = 50
+
+
+# ---------------------------
+# Registro de latencias
+# ---------------------------
+def percentile(sorted_values: list, q: float) -> float:
+    """Percentil por rango más cercano (valores ya ordenados)."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        elapsed = time.perf_counter() - t0
+
+        self.latencies.setdefault(name, []).append(elapsed)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return response
+
+    def report(self, wall_s: float) -> dict:
+        endpoints = {}
+        for name, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            endpoints[name] = {
+                "count": len(values),
+                "errors": self.errors.get(name, 0),
+                "rps": round(len(values) / wall_s, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {
+            "wall_s": round(wall_s, 3),
+            "total_requests": total,
+            "total_errors": sum(self.errors.values()),
+            "rps": round(total / wall_s, 2),
+            "endpoints": endpoints,
+        }
+
+
+# ---------------------------
+# Escenario de un estudiante
+# ---------------------------
+async def student(client: httpx.AsyncClient, rec: Recorder, index: int, username: str, cohort: str, args):
+    password = "bench-pass"
+    await rec.call(client, "POST /user/register", "POST", "/user/register",
+                   json={"username": username, "password": password, "cohort": cohort})
+    response = await rec.call(client, "POST /user/login", "POST", "/user/login",
+                              json={"username": username, "password": password})
+    token = response.json().get("access_token") if response is not None and response.status_code == 200 else None
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+
+    # Pequeño desfase: los estudiantes no empiezan exactamente a la vez
+    await asyncio.sleep(random.uniform(0, args.think_ms / 1000))
+
+    score = 0
+    for game in range(1, args.games + 1):
+        for q in range(args.questions):
+            text = f"Question {q} of game {game}: why does meat turn brown when {random.randint(0, 999)}?"
+            message = {"username": username, "text": text, "game_number": game, "question_number": q}
+            if q % 2:
+                await rec.call(client, "POST /user/save_message/stream", "POST", "/user/save_message/stream",
+                               json=message, headers=headers)
+            else:
+                await rec.call(client, "POST /user/save_message", "POST", "/user/save_message",
+                               json=message, headers=headers)
+
+            response = await rec.call(client, "POST /chatbot/generate_quiz", "POST", "/chatbot/generate_quiz",
+                                      json={"username": username, "game_number": game}, headers=headers)
+            quiz = response.json() if response is not None and response.status_code == 200 else {}
+            is_correct = random.random() < 0.7
+            score += 1 if is_correct else 0
+            await rec.call(client, "POST /user/save_quiz_result", "POST", "/user/save_quiz_result", json={
+                "username": username,
+                "game_number": game,
+                "question_number": q,
+                "quiz_question": quiz.get("question", "q"),
+                "quiz_options": quiz.get("options", ["a", "b", "c", "d"]),
+                "selected_option": "A" if is_correct else "B",
+                "correct_answer_letter": "A",
+                "correct_answer_text": quiz.get("correct_answer_text", "a"),
+                "is_correct": is_correct,
+            }, headers=headers)
+            await rec.call(client, "POST /user/update_game", "POST", "/user/update_game", json={
+                "username": username,
+                "game_number": game,
+                "question_number": q,
+                "correct_count": score,
+                "highest_score": score,
+            }, headers=headers)
+            await asyncio.sleep(random.uniform(0, args.think_ms / 1000))
+
+    # Chat libre con memoria de sesión
+    response = await rec.call(client, "POST /chatbot/ask", "POST", "/chatbot/ask",
+                              json={"question": "What is marbling?"})
+    session_id = response.json().get("session_id") if response is not None and response.status_code == 200 else None
+    await rec.call(client, "POST /chatbot/ask/stream", "POST", "/chatbot/ask/stream",
+                   json={"question": "And how is it graded?", "session_id": session_id})
+
+    # Eventos sin conexión sincronizados de una vez
+    events = [
+        {
+            "event_id": f"{username}-offline-{i}",
+            "game_number": args.games + 1,
+            "question_number": i,
+            "quiz_question": "q",
+            "quiz_options": ["a", "b", "c", "d"],
+            "selected_option": "A",
+            "correct_answer_letter": "A",
+            "correct_answer_text": "a",
+            "is_correct": i % 2 == 0,
+        }
+        for i in range(args.batch_size)
+    ]
+    await rec.call(client, "POST /user/batch_events", "POST", "/user/batch_events", json={
+        "username": username,
+        "quiz_results": events,
+        "progress": [{
+            "event_id": f"{username}-progress",
+            "game_number": args.games + 1,
+            "question_number": args.batch_size,
+            "correct_count": args.batch_size // 2,
+            "highest_score": score,
+        }],
+    }, headers=headers)
+
+    # Pantallas de progreso
+    await rec.call(client, "GET /user/get_stats", "GET", f"/user/get_stats/{username}", headers=headers)
+    await rec.call(client, "GET /user/get_stats?history=false", "GET", f"/user/get_stats/{username}",
+                   params={"history": "false"}, headers=headers)
+    await rec.call(client, "GET /user/get_stats?limit=20", "GET", f"/user/get_stats/{username}",
+                   params={"limit": 20, "view": "summary"}, headers=headers)
+    await rec.call(client, "GET /user/get_stats?format=ndjson", "GET", f"/user/get_stats/{username}",
+                   params={"format": "ndjson"}, headers=headers)
+    await rec.call(client, "GET /user/get_game_messages", "GET", f"/user/get_game_messages/{username}/1",
+                   headers=headers)
+    await rec.call(client, "GET /user/quiz_history", "GET", f"/user/quiz_history/{username}", headers=headers)
+    await rec.call(client, "GET /user/quiz_history?limit=20", "GET", f"/user/quiz_history/{username}",
+                   params={"limit": 20}, headers=headers)
+    await rec.call(client, "GET /user/debug_user_links", "GET", f"/user/debug_user_links/{username}",
+                   headers=headers)
+    await rec.call(client, "GET /chatbot/cache_stats", "GET", "/chatbot/cache_stats")
+    await rec.call(client, "GET /user/write_stats", "GET", "/user/write_stats")
+
+    # Ranking
+    await rec.call(client, "GET /user/leaderboard", "GET", "/user/leaderboard", params={"limit": 10})
+    await rec.call(client, "GET /user/rank", "GET", f"/user/rank/{username}", headers=headers)
+    await rec.call(client, "GET /user/leaderboard_stats", "GET", "/user/leaderboard_stats")
+
+    # Export de la cohorte (lo pide el docente, no cada estudiante)
+    if args.export_key and index == 0:
+        export_headers = {"X-Export-Key": args.export_key}
+        await rec.call(client, "GET /export/quiz_results?format=csv", "GET", "/export/quiz_results",
+                       params={"format": "csv", "cohort": cohort}, headers=export_headers)
+        await rec.call(client, "GET /export/messages?format=ndjson", "GET", "/export/messages",
+                       params={"format": "ndjson", "cohort": cohort}, headers=export_headers)
+
+    if args.cleanup:
+        response = await rec.call(client, "DELETE /user/delete_all_messages", "DELETE",
+                                  f"/user/delete_all_messages/{username}", headers=headers)
+        job_id = response.json().get("job_id") if response is not None and response.status_code == 202 else None
+        # Progreso del job de borrado hasta que termina
+        for _ in range(DELETE_JOB_MAX_POLLS if job_id else 0):
+            response = await rec.call(client, "GET /user/delete_jobs", "GET", f"/user/delete_jobs/{job_id}")
+            if response is None or response.status_code != 200 or response.json().get("status") in ("done", "failed"):
+                break
+            await asyncio.sleep(DELETE_JOB_POLL_S)
+
+
+async def run_class(client: httpx.AsyncClient, args) -> dict:
+    rec = Recorder()
+    run_id = uuid.uuid4().hex[:6]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(
+        student(client, rec, i, f"bench{run_id}s{i}", f"bench{run_id}", args) for i in range(args.students)
+    ))
+    return rec.report(time.perf_counter() - t0)
+
+
+# ---------------------------
+# Entorno local (fake OpenAI + mongod)
+# ---------------------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_openai(args) -> str:
+    """Levanta el fake de OpenAI en un hilo aparte y devuelve su base_url."""
+    import uvicorn
+
+    port = _free_port()
+    config = uvicorn.Config(
+        fake_openai.create_app(fake_openai.settings_from_args(args)),
+        host="127.0.0.1", port=port, log_level="warning",
+    )
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+async def run_in_process(args) -> dict:
+    # La configuración se lee al importar los módulos: se fija antes de importar main
+    os.environ["OPENAI_BASE_URL"] = start_fake_openai(args)
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["MONGO_URI"] = BENCH_MONGO_URI
+    os.environ["MONGO_TLS"] = "false"
+    os.environ["DB_NAME"] = f"chatbot_bench_{uuid.uuid4().hex[:8]}"
+    # El export solo responde con clave y salt propios configurados
+    args.export_key = args.export_key or uuid.uuid4().hex
+    os.environ["EXPORT_API_KEY"] = args.export_key
+    os.environ["EXPORT_ANON_SALT"] = uuid.uuid4().hex
+
+    import main
+    from db import mongo_client
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            result = await run_class(client, args)
+        if not args.keep_db:
+            await mongo_client.client.drop_database(os.environ["DB_NAME"])
+    return result
+
+
+async def run_against_target(args) -> dict:
+    limits = httpx.Limits(max_connections=args.students * 2)
+    async with httpx.AsyncClient(base_url=args.target, timeout=120, limits=limits) as client:
+        return await run_class(client, args)
+
+
+# ---------------------------
+# Resultados
+# ---------------------------
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(result: dict, baseline: dict = None):
+    base = (baseline or {}).get("endpoints", {})
+    print(f"{'endpoint':40} {'n':>5} {'err':>4} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, row in result["endpoints"].items():
+        line = (f"{name:40} {row['count']:5} {row['errors']:4} {row['rps']:7.1f} "
+                f"{row['p50_ms']:8.1f} {row['p95_ms']:8.1f} {row['p99_ms']:8.1f}")
+        if name in base and base[name]["p95_ms"]:
+            change = (row["p95_ms"] / base[name]["p95_ms"] - 1) * 100
+            line += f"   p95 {change:+.0f}%"
+        print(line)
+    print(f"\ntotal: {result['total_requests']} requests, {result['total_errors']} errors, "
+          f"{result['rps']} req/s in {result['wall_s']} s")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Classroom load test for the chatbot backend.")
+    parser.add_argument("--students", type=int, default=20)
+    parser.add_argument("--games", type=int, default=2)
+    parser.add_argument("--questions", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=10, help="eventos por batch_events")
+    parser.add_argument("--think-ms", type=float, default=200.0, help="pausa aleatoria entre pasos")
+    parser.add_argument("--target", help="URL de un servidor ya levantado (sin fake local)")
+    parser.add_argument("--export-key", help="EXPORT_API_KEY del servidor en --target (sin ella no se mide /export)")
+    parser.add_argument("--no-cleanup", dest="cleanup", action="store_false")
+    parser.add_argument("--keep-db", action="store_true")
+    parser.add_argument("--out", help="archivo JSON de resultados (por defecto bench/results/)")
+    parser.add_argument("--compare", help="JSON de una corrida anterior para comparar p95")
+    fake_openai.add_arguments(parser)
+    args = parser.parse_args()
+
+    runner = run_against_target if args.target else run_in_process
+    result = asyncio.run(runner(args))
+
+    commit = _git_commit()
+    output = {
+        "commit": commit,
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "export_key")},
+        **result,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(output, baseline)
+
+    out = args.out
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"load_{commit}_{int(time.time())}.json")
+    with open(out, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"results: {out}")
+    return 1 if result["total_errors"] and not args.error_rate and not args.rate_limit_rate else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
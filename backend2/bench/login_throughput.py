@@ -0,0 +1,65 @@
+"""
+Benchmark: throughput de verificación de contraseñas (login) vs tamaño del pool.
+
+Simula una clase haciendo login a la vez: lanza N verificaciones bcrypt
+concurrentes contra services.password_hasher y mide logins/s y latencia.
+
+Uso (desde backend2/):
+    python -m bench.login_throughput --logins 60 --sizes 1 2 4 8 --kind process
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import bcrypt
+
+from services import password_hasher
+
+
+async def run_once(hashed: bytes, logins: int) -> dict:
+    latencies = []
+
+    async def one_login():
+        t0 = time.perf_counter()
+        ok = await password_hasher.verify_password("classroom-password", hashed)
+        latencies.append(time.perf_counter() - t0)
+        assert ok
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(logins)))
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "logins_per_s": logins / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=60)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 4])
+    parser.add_argument("--kind", choices=["process", "thread"], default=password_hasher.PASSWORD_POOL_KIND)
+    parser.add_argument("--rounds", type=int, default=password_hasher.BCRYPT_ROUNDS)
+    args = parser.parse_args()
+
+    # El pool no debe rechazar durante la prueba
+    password_hasher.PASSWORD_POOL_MAX_PENDING = args.logins
+    hashed = bcrypt.hashpw(b"classroom-password", bcrypt.gensalt(args.rounds))
+
+    print(f"{args.logins} concurrent logins, bcrypt cost {args.rounds}, {args.kind} pool")
+    print(f"{'workers':>8} {'logins/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for size in args.sizes:
+        password_hasher.start(workers=size, kind=args.kind)
+        await password_hasher.verify_password("warmup", hashed)  # arranque de los workers
+        result = await run_once(hashed, args.logins)
+        password_hasher.shutdown()
+        print(f"{size:>8} {result['logins_per_s']:>10.1f} {result['p50_ms']:>10.0f} {result['p99_ms']:>10.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
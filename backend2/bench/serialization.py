@@ -0,0 +1,100 @@
+"""
+Micro-benchmark: serialización de un historial de get_stats.
+
+Compara el camino anterior (serialize_doc superficial + jsonable_encoder de
+FastAPI + json.dumps de JSONResponse) con el codec actual
+(services.bson_json: orjson sin pasar por jsonable_encoder) sobre un
+historial sintético de N mensajes. Verifica además que ambos producen el
+mismo JSON.
+
+Uso (desde backend2/):
+    python -m bench.serialization --messages 5000 --repeat 20
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from services.bson_json import BSONJSONResponse
+
+
+def build_history(messages: int) -> dict:
+    user_id = ObjectId()
+    start = datetime(2025, 1, 1)
+    docs = [
+        {
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "game_number": i // 20,
+            "question_number": i % 20,
+            "user_message": f"Question {i}: how does pH affect water holding capacity in pork?",
+            "bot_response": "Water holding capacity depends on the net charge of myofibrillar proteins. " * 4,
+            "created_at": start + timedelta(seconds=i * random.randint(20, 90)),
+        }
+        for i in range(messages)
+    ]
+    games = [
+        {"_id": ObjectId(), "user_id": user_id, "game_number": g, "question_number": 19,
+         "correct_count": 12, "answered": 20, "created_at": start}
+        for g in range(messages // 20)
+    ]
+    return {"user_id": user_id, "games": games, "messages": docs}
+
+
+def legacy_serialize_doc(doc):
+    # Copia del serialize_doc que usaban las rutas (solo ObjectId de primer nivel)
+    return {k: str(v) if isinstance(v, ObjectId) else v for k, v in doc.items()}
+
+
+def legacy_path(history: dict) -> bytes:
+    content = {
+        "username": "bench",
+        "games": [legacy_serialize_doc(g) for g in history["games"]],
+        "messages": [legacy_serialize_doc(m) for m in history["messages"]],
+        "next_after": None,
+    }
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def codec_path(history: dict) -> bytes:
+    return BSONJSONResponse({
+        "username": "bench",
+        "games": history["games"],
+        "messages": history["messages"],
+        "next_after": None,
+    }).body
+
+
+def measure(fn, history: dict, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        body = fn(history)
+        timings.append(time.perf_counter() - t0)
+    return {"median_ms": statistics.median(timings) * 1000, "min_ms": min(timings) * 1000, "bytes": len(body)}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Response serialization micro-benchmark.")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    history = build_history(args.messages)
+    assert json.loads(legacy_path(history)) == json.loads(codec_path(history)), "outputs differ"
+
+    legacy = measure(legacy_path, history, args.repeat)
+    codec = measure(codec_path, history, args.repeat)
+    for name, row in (("jsonable_encoder + json", legacy), ("bson_json (orjson)", codec)):
+        print(f"{name:26} median={row['median_ms']:8.2f} ms  min={row['min_ms']:8.2f} ms  bytes={row['bytes']}")
+    print(f"speedup (median): {legacy['median_ms'] / codec['median_ms']:.1f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
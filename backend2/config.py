@@ -0,0 +1,141 @@
+"""
+Configuración única de la app.
+
+El .env se lee una sola vez, aquí; el resto de módulos toma sus valores de
+`settings` en lugar de llamar a load_dotenv()/os.getenv por su cuenta.
+Los nombres de los atributos son los de las variables de entorno
+(ver .env.example).
+"""
+import os
+
+from dotenv import load_dotenv
+
+
+def _str(name: str, default=None):
+    return os.getenv(name, default)
+
+def _int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+def _float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+def _bool(name: str, default: bool) -> bool:
+    return os.getenv(name, "true" if default else "false").lower() == "true"
+
+
+class Settings:
+    def __init__(self):
+        load_dotenv()
+
+        # App
+        self.LOG_LEVEL = _str("LOG_LEVEL", "INFO")
+        self.HISTORY_BATCH_SIZE = _int("HISTORY_BATCH_SIZE", 200)
+
+        # MongoDB
+        self.MONGO_URI = _str("MONGO_URI")
+        self.DB_NAME = _str("DB_NAME")
+        self.MONGO_MAX_POOL_SIZE = _int("MONGO_MAX_POOL_SIZE", 50)
+        self.MONGO_MIN_POOL_SIZE = _int("MONGO_MIN_POOL_SIZE", 0)
+        self.MONGO_SERVER_SELECTION_TIMEOUT_MS = _int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)
+        self.MONGO_CONNECT_TIMEOUT_MS = _int("MONGO_CONNECT_TIMEOUT_MS", 5000)
+        self.MONGO_SOCKET_TIMEOUT_MS = _int("MONGO_SOCKET_TIMEOUT_MS", 10000)
+        # Atlas exige TLS; un mongod local (benchmarks) normalmente no lo tiene
+        self.MONGO_TLS = _bool("MONGO_TLS", True)
+        self.MONGO_ENSURE_INDEXES = _bool("MONGO_ENSURE_INDEXES", True)
+        self.READYZ_TIMEOUT_S = _float("READYZ_TIMEOUT_S", 2.0)
+
+        # OpenAI
+        self.OPENAI_API_KEY = _str("OPENAI_API_KEY")
+        self.OPENAI_MAX_CONCURRENCY = _int("OPENAI_MAX_CONCURRENCY", 8)
+        self.OPENAI_MAX_QUEUE = _int("OPENAI_MAX_QUEUE", 100)
+        self.OPENAI_QUEUE_TIMEOUT_S = _float("OPENAI_QUEUE_TIMEOUT_S", 30)
+        self.OPENAI_TIMEOUT_S = _float("OPENAI_TIMEOUT_S", 60)
+        self.OPENAI_MAX_RETRIES = _int("OPENAI_MAX_RETRIES", 3)
+        self.OPENAI_BACKOFF_BASE_S = _float("OPENAI_BACKOFF_BASE_S", 0.5)
+        self.OPENAI_BACKOFF_MAX_S = _float("OPENAI_BACKOFF_MAX_S", 8)
+        self.OPENAI_POOL_MAX_CONNECTIONS = _int("OPENAI_POOL_MAX_CONNECTIONS", 20)
+        self.OPENAI_POOL_MAX_KEEPALIVE = _int("OPENAI_POOL_MAX_KEEPALIVE", 10)
+        self.OPENAI_COALESCE_ENABLED = _bool("OPENAI_COALESCE_ENABLED", True)
+        # Tras terminar, la respuesta se sigue compartiendo este tiempo (0 = solo en vuelo)
+        self.OPENAI_COALESCE_WINDOW_S = _float("OPENAI_COALESCE_WINDOW_S", 2.0)
+        # Importar el SDK en segundo plano al arrancar (fuera del camino del primer request)
+        self.OPENAI_WARMUP = _bool("OPENAI_WARMUP", True)
+
+        # Memoria de conversación (/chatbot/ask)
+        self.CONVERSATION_BACKEND = _str("CONVERSATION_BACKEND", "memory")
+        self.CONVERSATION_MAX_SESSIONS = _int("CONVERSATION_MAX_SESSIONS", 1000)
+        self.CONVERSATION_TTL_S = _int("CONVERSATION_TTL_S", 3600)
+        self.CONVERSATION_TOKEN_BUDGET = _int("CONVERSATION_TOKEN_BUDGET", 2000)
+        self.CONVERSATION_SUMMARY_MAX_CHARS = _int("CONVERSATION_SUMMARY_MAX_CHARS", 600)
+
+        # Caché de respuestas
+        self.ANSWER_CACHE_ENABLED = _bool("ANSWER_CACHE_ENABLED", True)
+        self.ANSWER_CACHE_MAX_ENTRIES = _int("ANSWER_CACHE_MAX_ENTRIES", 2000)
+        self.ANSWER_CACHE_TTL_S = _int("ANSWER_CACHE_TTL_S", 86400)
+        self.ANSWER_CACHE_SIMILARITY = _float("ANSWER_CACHE_SIMILARITY", 0.8)
+        self.ANSWER_CACHE_PERSIST = _bool("ANSWER_CACHE_PERSIST", False)
+
+        # Quizzes
+        self.QUIZ_CACHE_MAX_ENTRIES = _int("QUIZ_CACHE_MAX_ENTRIES", 500)
+        self.QUIZ_CACHE_TTL_S = _int("QUIZ_CACHE_TTL_S", 1800)
+        self.QUIZ_PREFETCH_ENABLED = _bool("QUIZ_PREFETCH_ENABLED", True)
+        self.QUIZ_PREFETCH_WORKERS = _int("QUIZ_PREFETCH_WORKERS", 2)
+        self.QUIZ_PREFETCH_QUEUE = _int("QUIZ_PREFETCH_QUEUE", 50)
+        self.QUIZ_CONTEXT_TOKEN_BUDGET = _int("QUIZ_CONTEXT_TOKEN_BUDGET", 1500)
+        self.QUIZ_CONTEXT_SUMMARY_MAX_CHARS = _int("QUIZ_CONTEXT_SUMMARY_MAX_CHARS", 800)
+        # Deadline de generate_quiz: pasado este tiempo se sirve del banco local
+        self.QUIZ_DEADLINE_S = _float("QUIZ_DEADLINE_S", 8)
+        self.QUIZ_BREAKER_FAILURES = _int("QUIZ_BREAKER_FAILURES", 5)
+        self.QUIZ_BREAKER_OPEN_S = _float("QUIZ_BREAKER_OPEN_S", 30)
+        # Quizzes generados (fuente del banco) sin regenerarse en este plazo se borran
+        self.GENERATED_QUIZ_TTL_S = _int("GENERATED_QUIZ_TTL_S", 30 * 86400)
+
+        # Contraseñas
+        self.BCRYPT_ROUNDS = _int("BCRYPT_ROUNDS", 12)
+        self.PASSWORD_POOL_KIND = _str("PASSWORD_POOL_KIND", "process")  # process | thread
+        self.PASSWORD_POOL_WORKERS = _int("PASSWORD_POOL_WORKERS", os.cpu_count() or 2)
+        self.PASSWORD_POOL_MAX_PENDING = _int("PASSWORD_POOL_MAX_PENDING", 64)
+
+        # Tokens de sesión y caché de usuarios
+        self.SECRET_KEY = _str("SECRET_KEY")
+        self.ACCESS_TOKEN_TTL_S = _int("ACCESS_TOKEN_TTL_S", 12 * 3600)
+        self.AUTH_REQUIRED = _bool("AUTH_REQUIRED", False)
+        self.USER_CACHE_MAX_ENTRIES = _int("USER_CACHE_MAX_ENTRIES", 5000)
+        self.USER_CACHE_TTL_S = _int("USER_CACHE_TTL_S", 30)
+
+        # Leaderboard
+        self.LEADERBOARD_TOP_K = _int("LEADERBOARD_TOP_K", 100)
+        self.LEADERBOARD_REFRESH_S = _float("LEADERBOARD_REFRESH_S", 60)
+
+        # Compresión de respuestas
+        self.COMPRESSION_ENABLED = _bool("COMPRESSION_ENABLED", True)
+        self.COMPRESSION_MIN_BYTES = _int("COMPRESSION_MIN_BYTES", 1024)
+        self.COMPRESSION_GZIP_LEVEL = _int("COMPRESSION_GZIP_LEVEL", 6)
+        self.COMPRESSION_BROTLI_QUALITY = _int("COMPRESSION_BROTLI_QUALITY", 4)
+
+        # Borrado de historial (jobs en segundo plano)
+        self.DELETE_BATCH_SIZE = _int("DELETE_BATCH_SIZE", 500)
+        # Pausa entre lotes: reparte la carga de escritura/replicación
+        self.DELETE_BATCH_PAUSE_S = _float("DELETE_BATCH_PAUSE_S", 0.05)
+        self.DELETE_JOB_TTL_S = _int("DELETE_JOB_TTL_S", 7 * 86400)
+        # Lease del worker que corre un job: sin renovarlo en este plazo otro lo retoma
+        self.DELETE_JOB_LEASE_S = _int("DELETE_JOB_LEASE_S", 60)
+
+        # Export para investigación
+        self.EXPORT_API_KEY = _str("EXPORT_API_KEY")
+        # Salt propio del hash de user_id; sin él (o sin EXPORT_API_KEY) no hay export
+        self.EXPORT_ANON_SALT = _str("EXPORT_ANON_SALT")
+        self.EXPORT_BATCH_SIZE = _int("EXPORT_BATCH_SIZE", 1000)
+        self.EXPORT_CHUNK_ROWS = _int("EXPORT_CHUNK_ROWS", 500)
+
+        # Write-behind
+        self.WRITE_MODE_MESSAGES = _str("WRITE_MODE_MESSAGES", "sync")
+        self.WRITE_MODE_QUIZ_RESULTS = _str("WRITE_MODE_QUIZ_RESULTS", "sync")
+        self.WRITE_BEHIND_MAX_QUEUE = _int("WRITE_BEHIND_MAX_QUEUE", 10000)
+        self.WRITE_BEHIND_BATCH_SIZE = _int("WRITE_BEHIND_BATCH_SIZE", 200)
+        self.WRITE_BEHIND_FLUSH_INTERVAL_S = _float("WRITE_BEHIND_FLUSH_INTERVAL_S", 1.0)
+        self.WRITE_BEHIND_PUT_TIMEOUT_S = _float("WRITE_BEHIND_PUT_TIMEOUT_S", 2.0)
+
+
+settings = Settings()
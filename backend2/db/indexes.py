@@ -0,0 +1,231 @@
+"""
+Índices requeridos por las rutas.
+
+- ensure_indexes(db): los crea de forma idempotente (se llama en el lifespan).
+- python -m db.indexes            → crea los índices
+- python -m db.indexes --explain  → corre explain() sobre la consulta de cada
+  ruta y marca las que hacen COLLSCAN (código de salida 1 si hay alguna).
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_TTL_S = settings.CONVERSATION_TTL_S
+ANSWER_CACHE_TTL_S = settings.ANSWER_CACHE_TTL_S
+DELETE_JOB_TTL_S = settings.DELETE_JOB_TTL_S
+GENERATED_QUIZ_TTL_S = settings.GENERATED_QUIZ_TTL_S
+
+# colección -> índices
+REQUIRED_INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        # Ranking: orden del leaderboard y count de usuarios por encima de un puntaje
+        IndexModel([("best_score", DESCENDING), ("username", ASCENDING)], name="best_score_desc"),
+        # Export por cohorte (solo usuarios que la tienen)
+        IndexModel([("cohort", ASCENDING)], name="cohort", sparse=True),
+    ],
+    "games": [
+        IndexModel(
+            [("user_id", ASCENDING), ("game_number", ASCENDING)],
+            name="user_game_unique",
+            unique=True,
+        ),
+    ],
+    "messages": [
+        IndexModel(
+            [("user_id", ASCENDING), ("game_number", ASCENDING), ("question_number", ASCENDING)],
+            name="user_game_question",
+        ),
+        # Paginación por keyset (created_at, _id) del historial
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)],
+            name="user_created_at_id",
+        ),
+    ],
+    "quiz_results": [
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)],
+            name="user_created_at_id",
+        ),
+        # Idempotencia del endpoint batch: un event_id por usuario
+        IndexModel(
+            [("user_id", ASCENDING), ("event_id", ASCENDING)],
+            name="user_event_unique",
+            unique=True,
+            partialFilterExpression={"event_id": {"$type": "string"}},
+        ),
+    ],
+    # Jobs de borrado: uno activo por usuario (único parcial), barrido de
+    # leases vencidos; el estado se guarda unos días
+    "deletion_jobs": [
+        IndexModel(
+            [("user_id", ASCENDING)],
+            name="user_active_unique",
+            unique=True,
+            partialFilterExpression={"active": True},
+        ),
+        IndexModel(
+            [("lease_until", ASCENDING)],
+            name="active_lease_until",
+            partialFilterExpression={"active": True},
+        ),
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=DELETE_JOB_TTL_S),
+    ],
+    # Banco de quizzes: selección por palabras clave (multikey)
+    "quiz_bank": [
+        IndexModel([("keywords", ASCENDING)], name="keywords"),
+    ],
+    # Fuente del banco: cada regeneración renueva last_generated_at; lo que
+    # el modelo dejó de generar caduca y sale del banco en la próxima construcción
+    "generated_quizzes": [
+        IndexModel(
+            [("last_generated_at", ASCENDING)],
+            name="last_generated_at_ttl",
+            expireAfterSeconds=GENERATED_QUIZ_TTL_S,
+        ),
+    ],
+    "conversations": [
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_ttl", expireAfterSeconds=CONVERSATION_TTL_S),
+    ],
+    "answer_cache": [
+        IndexModel([("namespace", ASCENDING), ("bands", ASCENDING)], name="namespace_bands"),
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=ANSWER_CACHE_TTL_S),
+    ],
+}
+
+
+# Índices reemplazados por otros de REQUIRED_INDEXES: se borran después de
+# crear el nuevo para no dejar escrituras pagando un índice que nadie usa
+LEGACY_INDEXES = {
+    # Reemplazado por user_created_at_id (keyset con _id)
+    "quiz_results": ["user_created_at"],
+    # Reemplazado por user_active_unique (un job activo por usuario)
+    "deletion_jobs": ["user_status"],
+}
+
+
+async def ensure_indexes(db) -> list:
+    """
+    Crea los índices que falten y borra los de LEGACY_INDEXES. Si uno no se
+    puede crear (por ejemplo usernames duplicados ya existentes) se registra
+    y se sigue con el resto. Devuelve la lista de índices que fallaron.
+    """
+    failed = []
+    for collection, models in REQUIRED_INDEXES.items():
+        for model in models:
+            name = model.document["name"]
+            try:
+                await db[collection].create_indexes([model])
+            except OperationFailure as e:
+                logger.error("Could not create index %s.%s: %s", collection, name, e)
+                failed.append(f"{collection}.{name}")
+
+    for collection, names in LEGACY_INDEXES.items():
+        existing = await db[collection].index_information()
+        for name in names:
+            if name not in existing:
+                continue
+            try:
+                await db[collection].drop_index(name)
+                logger.info("Dropped legacy index %s.%s", collection, name)
+            except OperationFailure as e:
+                logger.error("Could not drop index %s.%s: %s", collection, name, e)
+                failed.append(f"{collection}.{name}")
+    return failed
+
+
+# ---------------------------
+# Diagnóstico con explain()
+# ---------------------------
+def route_queries(user_id: ObjectId, username: str) -> list:
+    """Las consultas de lectura de cada ruta, tal como las hacen los handlers."""
+    return [
+        ("get_user", "users", {"username": username}, None),
+        ("update_game (find game)", "games", {"user_id": user_id, "game_number": 1}, None),
+        ("get_stats (games)", "games", {"user_id": user_id}, None),
+        ("get_stats (messages)", "messages", {"user_id": user_id}, [("created_at", 1), ("_id", 1)]),
+        (
+            "get_game_messages",
+            "messages",
+            {"user_id": user_id, "game_number": 1},
+            [("question_number", 1)],
+        ),
+        ("quiz_history", "quiz_results", {"user_id": user_id}, [("created_at", 1), ("_id", 1)]),
+        ("leaderboard", "users", {}, [("best_score", -1), ("username", 1)]),
+        ("rank (count above)", "users", {"best_score": {"$gt": 0}}, None),
+        ("quiz bank pick", "quiz_bank", {"keywords": {"$in": ["ph", "protein"]}}, None),
+    ]
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    if "inputStage" in plan:
+        yield from _stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def _winning_plan(explain: dict) -> dict:
+    planner = explain.get("queryPlanner", {})
+    plan = planner.get("winningPlan", {})
+    # Con el motor SBE el plan viene envuelto en queryPlan
+    return plan.get("queryPlan", plan)
+
+
+async def explain_routes(db) -> list:
+    sample = await db["users"].find_one({}, {"username": 1})
+    user_id = sample["_id"] if sample else ObjectId()
+    username = sample["username"] if sample else "sample_user"
+
+    report = []
+    for route, collection, query, sort in route_queries(user_id, username):
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = [s for s in _stages(_winning_plan(explain)) if s]
+        report.append({
+            "route": route,
+            "collection": collection,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return report
+
+
+async def _main(argv=None):
+    from db import mongo_client
+
+    parser = argparse.ArgumentParser(description="Manage and verify MongoDB indexes.")
+    parser.add_argument("--explain", action="store_true", help="run explain() on each route query")
+    args = parser.parse_args(argv)
+
+    db = await mongo_client.connect()
+    try:
+        failed = await ensure_indexes(db)
+        for name in failed:
+            print(f"❌ index not created: {name}")
+        if not args.explain:
+            print("✔ indexes ensured" if not failed else "⚠ some indexes could not be created")
+            return 1 if failed else 0
+
+        report = await explain_routes(db)
+        for row in report:
+            flag = "❌ COLLSCAN" if row["collscan"] else "✔"
+            print(f"{flag:12} {row['route']:28} {row['collection']:14} {' <- '.join(row['stages'])}")
+        return 1 if any(row["collscan"] for row in report) else 0
+    finally:
+        await mongo_client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
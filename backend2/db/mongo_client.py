@@ -1,13 +1,56 @@
-from pymongo import MongoClient
-from dotenv import load_dotenv
-import os
+from pymongo import AsyncMongoClient
 
-load_dotenv()
+from config import settings
+from services.metrics import MongoCommandTimer
 
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
+MONGO_URI = settings.MONGO_URI
+DB_NAME = settings.DB_NAME
 
-client = MongoClient(MONGO_URI, tls=True)
+# Tamaño del pool y timeouts (configurables por entorno)
+MONGO_MAX_POOL_SIZE = settings.MONGO_MAX_POOL_SIZE
+MONGO_MIN_POOL_SIZE = settings.MONGO_MIN_POOL_SIZE
+MONGO_SERVER_SELECTION_TIMEOUT_MS = settings.MONGO_SERVER_SELECTION_TIMEOUT_MS
+MONGO_CONNECT_TIMEOUT_MS = settings.MONGO_CONNECT_TIMEOUT_MS
+MONGO_SOCKET_TIMEOUT_MS = settings.MONGO_SOCKET_TIMEOUT_MS
+# Atlas exige TLS; un mongod local (benchmarks) normalmente no lo tiene
+MONGO_TLS = settings.MONGO_TLS
 
-db = client[DB_NAME]
+# El cliente se crea y se cierra en el lifespan de la app (ver main.py)
+client = None
+db = None
 
+
+async def connect():
+    """Crea el cliente asíncrono de MongoDB con el pool configurado."""
+    global client, db
+    if client is not None:
+        return db
+
+    client = AsyncMongoClient(
+        MONGO_URI,
+        tls=MONGO_TLS,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        # Tiempos por colección y comando (métricas Prometheus)
+        event_listeners=[MongoCommandTimer()],
+    )
+    db = client[DB_NAME]
+    return db
+
+
+async def close():
+    """Cierra el cliente (se llama al apagar la app)."""
+    global client, db
+    if client is not None:
+        await client.close()
+    client = None
+    db = None
+
+
+def get_db():
+    if db is None:
+        raise RuntimeError("MongoDB client not initialized. Call connect() in the app lifespan.")
+    return db
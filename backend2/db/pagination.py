@@ -0,0 +1,48 @@
+"""
+Paginación por keyset sobre (created_at, _id).
+
+El cursor `after` es opaco para el cliente: base64 del último
+(created_at, _id) devuelto. La siguiente página pide los documentos
+estrictamente posteriores, usando el índice en lugar de skip().
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+KEYSET_SORT = [("created_at", 1), ("_id", 1)]
+
+
+def encode_cursor(doc: dict) -> str:
+    created_at = doc["created_at"]
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    payload = json.dumps({"t": created_at, "i": str(doc["_id"])}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token: str) -> tuple:
+    """Devuelve (created_at, _id). Lanza ValueError si el cursor no es válido."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return datetime.fromisoformat(payload["t"]), ObjectId(payload["i"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def keyset_query(query: dict, after: Optional[str]) -> dict:
+    if not after:
+        return query
+    created_at, last_id = decode_cursor(after)
+    return {
+        "$and": [
+            query,
+            {"$or": [
+                {"created_at": {"$gt": created_at}},
+                {"created_at": created_at, "_id": {"$gt": last_id}},
+            ]},
+        ]
+    }
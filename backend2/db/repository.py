@@ -0,0 +1,399 @@
+"""
+Capa de acceso a datos asíncrona.
+
+Todas las rutas pasan por estas funciones en lugar de tocar las
+colecciones directamente, así ningún handler bloquea el event loop.
+"""
+from typing import Any, Dict, List, Optional, Union
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from db.mongo_client import get_db
+
+Doc = Dict[str, Any]
+UserId = Union[ObjectId, str]
+
+
+# ---------------------------
+# Colecciones
+# ---------------------------
+def users_col():
+    return get_db()["users"]
+
+def messages_col():
+    return get_db()["messages"]
+
+def games_col():
+    return get_db()["games"]
+
+def quiz_col():
+    return get_db()["quiz_results"]
+
+def conversations_col():
+    return get_db()["conversations"]
+
+def answer_cache_col():
+    return get_db()["answer_cache"]
+
+def deletion_jobs_col():
+    return get_db()["deletion_jobs"]
+
+def quiz_bank_col():
+    return get_db()["quiz_bank"]
+
+def generated_quizzes_col():
+    return get_db()["generated_quizzes"]
+
+
+def as_object_id(value: UserId) -> ObjectId:
+    return value if isinstance(value, ObjectId) else ObjectId(value)
+
+
+def _cursor(collection, query: Doc, projection: Optional[Doc], sort, limit: int, batch_size: int):
+    cursor = collection.find(query, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+    return cursor
+
+
+# ---------------------------
+# Usuarios
+# ---------------------------
+async def get_user(username: str, projection: Optional[Doc] = None) -> Optional[Doc]:
+    return await users_col().find_one({"username": username}, projection)
+
+async def insert_user(doc: Doc) -> ObjectId:
+    result = await users_col().insert_one(doc)
+    return result.inserted_id
+
+def leaderboard_cursor(limit: int):
+    """Usuarios por best_score desc (índice best_score_desc)."""
+    return users_col().find(
+        {}, {"_id": 0, "username": 1, "best_score": 1}
+    ).sort([("best_score", -1), ("username", 1)]).limit(limit)
+
+async def count_users_above(score: int) -> int:
+    return await users_col().count_documents({"best_score": {"$gt": score}})
+
+async def count_users() -> int:
+    return await users_col().estimated_document_count()
+
+async def cohort_user_ids(cohort: str) -> List[ObjectId]:
+    cursor = users_col().find({"cohort": cohort}, {"_id": 1})
+    return [doc["_id"] async for doc in cursor]
+
+async def update_user(user_id: UserId, update: Doc) -> None:
+    await users_col().update_one({"_id": as_object_id(user_id)}, update)
+
+
+async def update_user_returning(user_id: UserId, update: Doc, projection: Optional[Doc] = None) -> Optional[Doc]:
+    """update_one que devuelve el documento ya actualizado (find_one_and_update)."""
+    return await users_col().find_one_and_update(
+        {"_id": as_object_id(user_id)}, update, projection=projection, return_document=ReturnDocument.AFTER
+    )
+
+async def update_users(user_ids: list, update: Doc) -> None:
+    await users_col().update_many({"_id": {"$in": [as_object_id(u) for u in user_ids]}}, update)
+
+
+# ---------------------------
+# Mensajes
+# ---------------------------
+async def insert_message(doc: Doc) -> ObjectId:
+    result = await messages_col().insert_one(doc)
+    return result.inserted_id
+
+async def _insert_many_status(collection, docs: List[Doc]) -> Dict[int, str]:
+    """
+    insert_many no ordenado. Devuelve {índice: estado} con "inserted",
+    "duplicate" (E11000: ya estaba, p. ej. de un intento anterior) o "error".
+    """
+    status = {i: "inserted" for i in range(len(docs))}
+    if not docs:
+        return status
+    try:
+        await collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get("writeErrors", []):
+            status[err["index"]] = "duplicate" if err.get("code") == 11000 else "error"
+    return status
+
+async def insert_messages(docs: List[Doc]) -> Dict[int, str]:
+    return await _insert_many_status(messages_col(), docs)
+
+async def find_messages(
+    query: Doc,
+    projection: Optional[Doc] = None,
+    sort: Optional[List[tuple]] = None,
+) -> List[Doc]:
+    cursor = messages_col().find(query, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    return await cursor.to_list(length=None)
+
+def messages_cursor(
+    query: Doc,
+    projection: Optional[Doc] = None,
+    sort: Optional[List[tuple]] = None,
+    limit: int = 0,
+    batch_size: int = 0,
+):
+    """Cursor asíncrono sin materializar (para paginar o hacer streaming)."""
+    return _cursor(messages_col(), query, projection, sort, limit, batch_size)
+
+async def count_messages(query: Doc) -> int:
+    return await messages_col().count_documents(query)
+
+
+# ---------------------------
+# Juegos
+# ---------------------------
+async def find_game(user_id: UserId, game_number: int) -> Optional[Doc]:
+    return await games_col().find_one({
+        "user_id": as_object_id(user_id),
+        "game_number": game_number,
+    })
+
+async def upsert_game(user_id: UserId, game_number: int, update: Doc) -> bool:
+    """
+    Upsert atómico del juego. Devuelve True si el juego se creó en esta
+    llamada (el índice único (user_id, game_number) garantiza que solo una
+    escritura concurrente lo crea; la otra se reintenta como update).
+    """
+    query = {"user_id": as_object_id(user_id), "game_number": game_number}
+    try:
+        result = await games_col().update_one(query, update, upsert=True)
+    except DuplicateKeyError:
+        result = await games_col().update_one(query, update, upsert=True)
+    return result.upserted_id is not None
+
+async def set_game_context_summary(user_id: UserId, game_number: int, summary: Doc) -> None:
+    """Guarda el resumen acumulado del contexto (no crea el juego si no existe)."""
+    await games_col().update_one(
+        {"user_id": as_object_id(user_id), "game_number": game_number},
+        {"$set": {"context_summary": summary}},
+    )
+
+async def bulk_upsert_games(updates: List[tuple]) -> int:
+    """
+    bulk_write de upserts [(query, update)]; devuelve cuántos juegos se
+    crearon. Como en upsert_game, los que chocan con el índice único (otro
+    upsert concurrente creó el juego) se reintentan como update.
+    """
+    if not updates:
+        return 0
+    operations = [UpdateOne(query, update, upsert=True) for query, update in updates]
+    try:
+        result = await games_col().bulk_write(operations, ordered=False)
+        return result.upserted_count
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != 11000 for err in errors):
+            raise
+        created = e.details.get("nUpserted", 0)
+        for err in errors:
+            query, update = updates[err["index"]]
+            result = await games_col().update_one(query, update, upsert=True)
+            created += 1 if result.upserted_id is not None else 0
+        return created
+
+async def find_games(query: Doc, projection: Optional[Doc] = None) -> List[Doc]:
+    return await games_col().find(query, projection).to_list(length=None)
+
+async def count_games(query: Doc) -> int:
+    return await games_col().count_documents(query)
+
+
+# ---------------------------
+# Resultados de quiz
+# ---------------------------
+async def insert_quiz_result(doc: Doc) -> ObjectId:
+    result = await quiz_col().insert_one(doc)
+    return result.inserted_id
+
+async def insert_quiz_results(docs: List[Doc]) -> Dict[int, str]:
+    """Como _insert_many_status; "duplicate" también es un event_id ya registrado."""
+    return await _insert_many_status(quiz_col(), docs)
+
+async def claim_unapplied_quiz_results(user_id: UserId, event_ids: List[str], claim: str, now, stale_before) -> List[Doc]:
+    """
+    Reserva (apply_claim) los eventos del batch cuyo agregado todavía no se
+    aplicó: los recién insertados y los de un intento anterior que falló
+    después del insert. Un claim de más de stale_before se considera
+    abandonado. Devuelve los documentos reservados.
+    """
+    user_id = as_object_id(user_id)
+    await quiz_col().update_many(
+        {
+            "user_id": user_id,
+            "event_id": {"$in": event_ids},
+            "applied": False,
+            "$or": [{"apply_claim": None}, {"apply_claim_at": {"$lt": stale_before}}],
+        },
+        {"$set": {"apply_claim": claim, "apply_claim_at": now}},
+    )
+    cursor = quiz_col().find(
+        {"user_id": user_id, "apply_claim": claim, "applied": False},
+        {"game_number": 1, "question_number": 1, "is_correct": 1},
+    )
+    return await cursor.to_list(length=None)
+
+async def finish_quiz_results_claim(user_id: UserId, claim: str, applied: bool) -> None:
+    """applied=True: agregado aplicado. False: se libera para el próximo reintento."""
+    update = (
+        {"$set": {"applied": True}, "$unset": {"apply_claim": "", "apply_claim_at": ""}}
+        if applied
+        else {"$set": {"apply_claim": None}}
+    )
+    await quiz_col().update_many(
+        {"user_id": as_object_id(user_id), "apply_claim": claim, "applied": False}, update
+    )
+
+def quiz_results_cursor(
+    query: Doc,
+    projection: Optional[Doc] = None,
+    sort: Optional[List[tuple]] = None,
+    limit: int = 0,
+    batch_size: int = 0,
+):
+    return _cursor(quiz_col(), query, projection, sort, limit, batch_size)
+
+async def count_quiz_results(query: Doc) -> int:
+    return await quiz_col().count_documents(query)
+
+async def distinct_quiz_questions(user_id: UserId) -> List[str]:
+    return await quiz_col().distinct("quiz_question", {"user_id": as_object_id(user_id)})
+
+
+# ---------------------------
+# Banco local de quizzes
+# ---------------------------
+async def record_generated_quiz(quiz_id: str, quiz: Doc, keywords: List[str], now) -> None:
+    # keywords: las del contexto de la última generación
+    await generated_quizzes_col().update_one(
+        {"_id": quiz_id},
+        {
+            "$setOnInsert": {**quiz, "created_at": now},
+            "$set": {"keywords": keywords, "last_generated_at": now},
+            "$inc": {"generated": 1},
+        },
+        upsert=True,
+    )
+
+def generated_quizzes_cursor(batch_size: int):
+    return generated_quizzes_col().find({}).batch_size(batch_size)
+
+async def delete_stale_bank_quizzes(built_before) -> int:
+    result = await quiz_bank_col().delete_many({"updated_at": {"$lt": built_before}})
+    return result.deleted_count
+
+async def best_bank_quiz(keywords: List[str], exclude_ids: List[str]) -> Optional[Doc]:
+    """
+    Entrada con más palabras clave en común (empates al azar). El $match usa
+    el índice multikey y el ranking se hace en el servidor sobre todos los
+    candidatos, sin traerlos a Python.
+    """
+    match = {"keywords": {"$in": keywords}}
+    if exclude_ids:
+        match["_id"] = {"$nin": exclude_ids}
+    pipeline = [
+        {"$match": match},
+        {"$addFields": {
+            "overlap": {"$size": {"$setIntersection": ["$keywords", keywords]}},
+            "tiebreak": {"$rand": {}},
+        }},
+        {"$sort": {"overlap": -1, "tiebreak": 1}},
+        {"$limit": 1},
+        {"$project": {"tiebreak": 0}},
+    ]
+    cursor = await quiz_bank_col().aggregate(pipeline)
+    docs = await cursor.to_list(length=1)
+    return docs[0] if docs else None
+
+async def sample_bank_quiz(exclude_ids: List[str]) -> Optional[Doc]:
+    pipeline = [{"$match": {"_id": {"$nin": exclude_ids}}}] if exclude_ids else []
+    pipeline.append({"$sample": {"size": 1}})
+    cursor = await quiz_bank_col().aggregate(pipeline)
+    docs = await cursor.to_list(length=1)
+    return docs[0] if docs else None
+
+
+# ---------------------------
+# Borrado por lotes y jobs de borrado
+# ---------------------------
+async def delete_batch(collection, query: Doc, sort: List[tuple], batch_size: int) -> int:
+    """
+    Borra como mucho batch_size documentos de query: toma los _id en el orden
+    de sort (recorriendo un índice) y los borra por _id. Devuelve cuántos se
+    borraron; 0 cuando ya no queda nada.
+    """
+    cursor = collection.find(query, {"_id": 1}).sort(sort).limit(batch_size)
+    ids = [doc["_id"] async for doc in cursor]
+    if not ids:
+        return 0
+    result = await collection.delete_many({"_id": {"$in": ids}})
+    return result.deleted_count
+
+async def insert_deletion_job(doc: Doc) -> None:
+    await deletion_jobs_col().insert_one(doc)
+
+async def find_deletion_job(job_id: str) -> Optional[Doc]:
+    return await deletion_jobs_col().find_one({"_id": job_id})
+
+async def find_active_deletion_job(user_id: UserId) -> Optional[Doc]:
+    return await deletion_jobs_col().find_one({"user_id": as_object_id(user_id), "active": True})
+
+async def find_stale_deletion_jobs(now) -> List[Doc]:
+    """Jobs sin terminar cuyo lease venció (worker caído o job interrumpido)."""
+    cursor = deletion_jobs_col().find({"active": True, "lease_until": {"$lt": now}}, {"_id": 1})
+    return await cursor.to_list(length=None)
+
+async def claim_deletion_job(job_id: str, owner: str, now, lease_until) -> Optional[Doc]:
+    """Toma el job si su lease venció; None si otro worker lo tiene."""
+    return await deletion_jobs_col().find_one_and_update(
+        {"_id": job_id, "active": True, "lease_until": {"$lt": now}},
+        {"$set": {"owner": owner, "lease_until": lease_until}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def update_deletion_job(job_id: str, update: Doc, owner: Optional[str] = None) -> bool:
+    """Con owner solo actualiza si ese worker sigue teniendo el job."""
+    query = {"_id": job_id}
+    if owner is not None:
+        query["owner"] = owner
+    result = await deletion_jobs_col().update_one(query, update)
+    return result.matched_count > 0
+
+
+# ---------------------------
+# Conversaciones (memoria de /ask)
+# ---------------------------
+async def load_conversation(session_id: str) -> Optional[Doc]:
+    return await conversations_col().find_one({"_id": session_id})
+
+async def save_conversation(session_id: str, state: Doc) -> None:
+    await conversations_col().update_one(
+        {"_id": session_id},
+        {"$set": state},
+        upsert=True,
+    )
+
+
+# ---------------------------
+# Caché persistente de respuestas del tutor
+# ---------------------------
+async def find_cached_answer(key: str) -> Optional[Doc]:
+    return await answer_cache_col().find_one({"_id": key})
+
+async def find_cached_answers_by_bands(namespace: str, bands: List[str], limit: int = 20) -> List[Doc]:
+    cursor = answer_cache_col().find({"namespace": namespace, "bands": {"$in": bands}}).limit(limit)
+    return await cursor.to_list(length=limit)
+
+async def save_cached_answer(doc: Doc) -> None:
+    await answer_cache_col().replace_one({"_id": doc["_id"]}, doc, upsert=True)
@@ -0,0 +1,83 @@
+"""
+Job offline: construye el banco local de quizzes (colección quiz_bank).
+
+La fuente son los quizzes que generó el propio servidor (generated_quizzes,
+escritos por build_quiz cuando el modelo devuelve un quiz completo); lo que
+los clientes envían a save_quiz_result no entra nunca, así nadie puede
+inyectar preguntas en el banco. Se descartan los inválidos y el quiz fijo de
+respaldo, y cada pregunta se guarda con sus palabras clave (las del
+contexto con el que se generó más las de la pregunta) para que generate_quiz
+pueda servirla al instante cuando el modelo no responde. generated_quizzes
+tiene TTL (GENERATED_QUIZ_TTL_S) sobre la última generación.
+
+Es idempotente: la clave es el hash de la pregunta normalizada. Al terminar
+se borran las entradas que no salieron de esta construcción (por ejemplo las
+de versiones anteriores armadas desde quiz_results).
+
+Uso (desde backend2/):
+    python -m jobs.build_quiz_bank                   # crea / actualiza
+    python -m jobs.build_quiz_bank --dry-run         # solo informa
+    python -m jobs.build_quiz_bank --min-generated 2 # solo preguntas generadas 2+ veces
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+
+from pymongo import ReplaceOne
+
+from db import mongo_client
+from db import repository as repo
+from services.quiz_bank import bank_entry
+from services.quiz_generator import FALLBACK_QUIZ
+
+BATCH_SIZE = 500
+
+
+async def build(min_generated: int = 1, dry_run: bool = False) -> dict:
+    scanned, stored, invalid = 0, 0, 0
+    ops = []
+    now = datetime.utcnow()
+    async for row in repo.generated_quizzes_cursor(batch_size=BATCH_SIZE):
+        scanned += 1
+        if row.get("generated", 1) < min_generated or row.get("question") == FALLBACK_QUIZ["question"]:
+            continue
+        entry = bank_entry(
+            row.get("question"), row.get("options"),
+            row.get("correct_answer_letter"), row.get("correct_answer_text"),
+            context_keywords=row.get("keywords"),
+        )
+        if entry is None:
+            invalid += 1
+            continue
+        entry.update({"generated": row.get("generated", 1), "updated_at": now})
+        ops.append(ReplaceOne({"_id": entry["_id"]}, entry, upsert=True))
+        stored += 1
+        if len(ops) >= BATCH_SIZE:
+            if not dry_run:
+                await repo.quiz_bank_col().bulk_write(ops, ordered=False)
+            ops = []
+    if ops and not dry_run:
+        await repo.quiz_bank_col().bulk_write(ops, ordered=False)
+
+    removed = 0 if dry_run else await repo.delete_stale_bank_quizzes(now)
+    return {"scanned": scanned, "stored": stored, "invalid": invalid, "removed": removed, "dry_run": dry_run}
+
+
+async def _main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the local quiz bank from server-generated quizzes.")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--min-generated", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    await mongo_client.connect()
+    try:
+        result = await build(min_generated=args.min_generated, dry_run=args.dry_run)
+    finally:
+        await mongo_client.close()
+    print(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
@@ -0,0 +1,67 @@
+"""
+Export anonimizado de messages / quiz_results / games a disco.
+
+Mismos filtros y columnas que GET /export/{dataset}; además permite Parquet
+(un row group por trozo, requiere pyarrow). Sin --out escribe CSV/NDJSON
+por stdout.
+
+Uso (desde backend2/):
+    python -m jobs.export quiz_results --format parquet --out quiz.parquet
+    python -m jobs.export messages --since 2025-01-01 --until 2025-06-01 --cohort ANSC-301 --out messages.csv
+    python -m jobs.export games --game-number 2 --format ndjson > games.ndjson
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+
+from db import mongo_client
+from services import export
+
+
+async def run(args) -> int:
+    rows = export.iter_rows(
+        args.dataset, since=args.since, until=args.until,
+        game_number=args.game_number, cohort=args.cohort,
+    )
+    if args.format == "parquet":
+        return await export.write_parquet(args.dataset, args.out, rows)
+
+    chunks = export.ndjson_chunks(rows) if args.format == "ndjson" else export.csv_chunks(args.dataset, rows)
+    out = open(args.out, "wb") if args.out else sys.stdout.buffer
+    try:
+        async for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.out:
+            out.close()
+    return 0
+
+
+async def _main(argv=None):
+    parser = argparse.ArgumentParser(description="Anonymized research export.")
+    parser.add_argument("dataset", choices=list(export.DATASETS))
+    parser.add_argument("--format", choices=["csv", "ndjson", "parquet"], default="csv")
+    parser.add_argument("--out", help="output file (required for parquet)")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--game-number", type=int)
+    parser.add_argument("--cohort")
+    args = parser.parse_args(argv)
+    if args.format == "parquet" and not args.out:
+        parser.error("--out is required for parquet")
+    if not export.EXPORT_ANON_SALT:
+        parser.error("EXPORT_ANON_SALT is not configured")
+
+    await mongo_client.connect()
+    try:
+        written = await run(args)
+    finally:
+        await mongo_client.close()
+    if args.format == "parquet":
+        print(f"{written} rows -> {args.out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
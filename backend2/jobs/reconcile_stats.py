@@ -0,0 +1,115 @@
+"""
+Job offline: repara los agregados materializados de `users.stats`.
+
+Recalcula total_games, total_answered, total_correct y per_game a partir de
+`games` y `quiz_results` con pipelines de agregación (por lotes de usuarios)
+y corrige solo los documentos que se desviaron. Las lecturas de la API nunca
+recorren el historial; este job es el único que lo hace.
+
+Uso (desde backend2/):
+    python -m jobs.reconcile_stats             # corrige
+    python -m jobs.reconcile_stats --dry-run   # solo informa
+    python -m jobs.reconcile_stats --username bob
+"""
+import argparse
+import asyncio
+import sys
+
+from pymongo import UpdateOne
+
+from db import mongo_client
+from db import repository as repo
+
+BATCH_SIZE = 500
+
+
+async def expected_stats(user_ids: list) -> dict:
+    expected = {
+        uid: {"total_games": 0, "total_answered": 0, "total_correct": 0, "per_game": {}}
+        for uid in user_ids
+    }
+
+    games = repo.games_col().aggregate([
+        {"$match": {"user_id": {"$in": user_ids}}},
+        {"$group": {"_id": "$user_id", "total_games": {"$sum": 1}}},
+    ])
+    async for row in await games:
+        expected[row["_id"]]["total_games"] = row["total_games"]
+
+    quizzes = repo.quiz_col().aggregate([
+        {"$match": {"user_id": {"$in": user_ids}}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "game_number": "$game_number"},
+            "answered": {"$sum": 1},
+            "correct": {"$sum": {"$cond": ["$is_correct", 1, 0]}},
+        }},
+    ])
+    async for row in await quizzes:
+        stats = expected[row["_id"]["user_id"]]
+        stats["total_answered"] += row["answered"]
+        stats["total_correct"] += row["correct"]
+        stats["per_game"][str(row["_id"]["game_number"])] = {
+            "answered": row["answered"],
+            "correct": row["correct"],
+        }
+    return expected
+
+
+def _drifted(current: dict, expected: dict) -> bool:
+    current = current or {}
+    return any(current.get(field, 0 if field != "per_game" else {}) != value for field, value in expected.items())
+
+
+async def reconcile(dry_run: bool = False, username: str = None) -> dict:
+    query = {"username": username} if username else {}
+    cursor = repo.users_col().find(query, {"username": 1, "stats": 1}).sort("_id", 1).batch_size(BATCH_SIZE)
+
+    checked, repaired = 0, 0
+    batch = []
+
+    async def flush(users):
+        nonlocal checked, repaired
+        expected = await expected_stats([u["_id"] for u in users])
+        ops = []
+        for user in users:
+            checked += 1
+            stats = expected[user["_id"]]
+            if not _drifted(user.get("stats"), stats):
+                continue
+            repaired += 1
+            print(f"drift: {user['username']}: {user.get('stats')} -> {stats}")
+            ops.append(UpdateOne(
+                {"_id": user["_id"]},
+                {"$set": {f"stats.{field}": value for field, value in stats.items()}},
+            ))
+        if ops and not dry_run:
+            await repo.users_col().bulk_write(ops, ordered=False)
+
+    async for user in cursor:
+        batch.append(user)
+        if len(batch) >= BATCH_SIZE:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+
+    return {"checked": checked, "repaired": repaired, "dry_run": dry_run}
+
+
+async def _main(argv=None):
+    parser = argparse.ArgumentParser(description="Repair drift in materialized user stats.")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--username")
+    args = parser.parse_args(argv)
+
+    await mongo_client.connect()
+    try:
+        result = await reconcile(dry_run=args.dry_run, username=args.username)
+    finally:
+        await mongo_client.close()
+    print(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
@@ -1,16 +1,73 @@
 #------- Nuevo código ----------#
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from config import settings
 from routes.chatbot_routes import router as chatbot_router
 from routes.user_routes import router as user_router
-import openai
-import os
-from dotenv import load_dotenv
+from routes.export_routes import router as export_router
+from db import mongo_client
+from db.indexes import ensure_indexes
+from services import compression, deletion_jobs, metrics, openai_gateway, password_hasher, write_behind
+from services.bson_json import BSONJSONResponse
+from services.quiz_cache import quiz_cache, QUIZ_PREFETCH_ENABLED
+import asyncio
+import logging
+
+# Logs estructurados (clave=valor) en lugar de prints
+logging.basicConfig(
+    level=settings.LOG_LEVEL,
+    format="%(asctime)s %(levelname)s %(name)s %(message)s",
+)
+logger = logging.getLogger("startup")
+
+
+async def _in_background(name: str, coro):
+    try:
+        await coro
+        logger.info("task=%s status=done", name)
+    except Exception as e:
+        logger.error("task=%s status=failed error=%s", name, e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Arranque sin I/O bloqueante: el cliente de Mongo conecta en segundo
+    # plano y lo demás (índices, SDK de OpenAI) no retrasa el primer request
+    app.state.settings = settings
+    app.state.db = await mongo_client.connect()
+    background = []
+    if settings.MONGO_ENSURE_INDEXES:
+        background.append(asyncio.create_task(_in_background("ensure_indexes", ensure_indexes(app.state.db))))
+    if settings.OPENAI_WARMUP:
+        background.append(asyncio.create_task(_in_background("openai_warmup", asyncio.to_thread(openai_gateway.warm_up))))
+    if QUIZ_PREFETCH_ENABLED:
+        quiz_cache.start()
+    password_hasher.start()
+    write_behind.start_all()
+    # Retoma jobs de borrado que un worker caído o un apagado dejaron a medias
+    deletion_jobs.start_sweeper()
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await deletion_jobs.stop_all()
+        # Primero se vacían los buffers de escritura, con Mongo aún abierto
+        await write_behind.stop_all()
+        password_hasher.shutdown()
+        await quiz_cache.stop()
+        await openai_gateway.close()
+        await mongo_client.close()
+        app.state.db = None
 
-app = FastAPI(title="Chatbot Game Backend")
 
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+app = FastAPI(
+    title="Chatbot Game Backend",
+    lifespan=lifespan,
+    default_response_class=BSONJSONResponse,
+)
 
 # 👇 Agrega esta sección CORS justo después de crear la app
 origins = [
@@ -30,6 +87,42 @@ app.add_middleware(
 
 app.include_router(chatbot_router, prefix="/chatbot", tags=["Chatbot"])
 app.include_router(user_router, prefix="/user", tags=["Users"])
+app.include_router(export_router, prefix="/export", tags=["Export"])
+
+# Compresión brotli/gzip por encima de COMPRESSION_MIN_BYTES
+if compression.COMPRESSION_ENABLED:
+    app.add_middleware(compression.CompressionMiddleware)
+
+# Latencia y peticiones en vuelo por ruta
+app.add_middleware(metrics.MetricsMiddleware, fastapi_app=app)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+# ---------------------------
+# Probes
+# ---------------------------
+@app.get("/healthz", include_in_schema=False)
+def healthz():
+    """Liveness: el proceso responde (no toca dependencias)."""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz(request: Request):
+    """Readiness: MongoDB responde a un ping."""
+    db = getattr(request.app.state, "db", None)
+    try:
+        if db is None:
+            raise RuntimeError("MongoDB client not initialized")
+        await asyncio.wait_for(db.command("ping"), timeout=settings.READYZ_TIMEOUT_S)
+    except Exception as e:
+        return BSONJSONResponse(
+            {"status": "unavailable", "mongo": str(e) or type(e).__name__},
+            status_code=503,
+        )
+    return {"status": "ready", "mongo": "ok"}
 
 @app.get("/")
 def root():
@@ -1,27 +1,39 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
 from pydantic import BaseModel
-import openai
-import os
-from dotenv import load_dotenv
-import json, re
-
-load_dotenv()
+from typing import Optional
+from services import auth, openai_gateway
+from services.answer_cache import answer_cache, ANSWER_CACHE_ENABLED
+from services import metrics, quiz_bank, user_cache
+from services.circuit_breaker import CircuitOpen
+from services.conversation_store import conversation_store
+from services.quiz_cache import quiz_cache
+from services.quiz_generator import (
+    FALLBACK_QUIZ, QUIZ_DEADLINE_S, QUIZ_MODEL, fit_context, load_game_context, quiz_breaker
+)
+from services.sse import sse_event, sse_response
+import asyncio
+import logging
+import uuid
 
 router = APIRouter()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+logger = logging.getLogger(__name__)
 
-# Memoria de conversación del endpoint /ask
-conversation_history = []
+ASK_MODEL = "gpt-5-mini"
+ASK_CACHE_NAMESPACE = f"ask:{ASK_MODEL}"
 
 # --------------------------
 # 📌 Modelo de entrada
 # --------------------------
 class Question(BaseModel):
     question: str
+    # Sesión de la conversación (si no se envía se crea una nueva)
+    session_id: Optional[str] = None
 
 class QuizRequest(BaseModel):
     username: str
-    context: str
+    # Opcional: con game_number el servidor arma el contexto desde `messages`
+    context: Optional[str] = None
+    game_number: Optional[int] = None
 
 
 # --------------------------
@@ -29,110 +41,130 @@ class QuizRequest(BaseModel):
 # --------------------------
 @router.post("/ask")
 async def ask_question(q: Question):
+    session_id = q.session_id or uuid.uuid4().hex
     try:
-        conversation_history.append({"role": "user", "content": q.question})
+        messages = await conversation_store.get_messages(session_id, q.question)
 
-        response = openai.chat.completions.create(
-            model="gpt-5-mini",
-            messages=conversation_history
-        )
+        # Solo se usa la caché en el primer turno: después la respuesta
+        # depende del historial de la sesión
+        use_cache = ANSWER_CACHE_ENABLED and len(messages) == 1
+        answer = await answer_cache.get(ASK_CACHE_NAMESPACE, q.question) if use_cache else None
 
-        answer = response.choices[0].message.content
-        conversation_history.append({"role": "assistant", "content": answer})
+        if answer is None:
+            response = await openai_gateway.chat_completion(
+                model=ASK_MODEL,
+                messages=messages
+            )
+            answer = response.choices[0].message.content
+            if use_cache:
+                await answer_cache.put(ASK_CACHE_NAMESPACE, q.question, answer)
 
-        if len(conversation_history) >= 20:
-            conversation_history.clear()
+        await conversation_store.append(session_id, q.question, answer)
 
-        return {"answer": answer}
+        return {"answer": answer, "session_id": session_id}
 
     except Exception as e:
         return {"error": str(e)}
 
 
 # --------------------------
-# 🧠 Generador de QUIZ
+# 📡 Variante streaming (SSE) de /ask
 # --------------------------
-@router.post("/generate_quiz")
-async def generate_quiz(data: QuizRequest):
-    """
-    Genera un quiz basado en TODO el contexto enviado.
-    Devuelve pregunta, opciones, letra correcta (A-D) y texto correcto.
-    """
+@router.post("/ask/stream")
+async def ask_question_stream(q: Question):
+    session_id = q.session_id or uuid.uuid4().hex
+    messages = await conversation_store.get_messages(session_id, q.question)
 
-    try:
-        prompt = f"""
-        You are an expert Meat Science tutor.
+    async def event_stream():
+        parts = []
+        try:
+            async for token in openai_gateway.stream_chat_completion(
+                model=ASK_MODEL,
+                messages=messages
+            ):
+                parts.append(token)
+                yield sse_event({"token": token})
+        except Exception as e:
+            yield sse_event({"error": str(e)}, event="error")
+            return
 
-        Based ONLY on the following conversation context, generate ONE multiple-choice quiz question.
+        answer = "".join(parts)
+        await conversation_store.append(session_id, q.question, answer)
 
-        Output ONLY valid JSON in this exact structure:
+        yield sse_event({"answer": answer, "session_id": session_id}, event="done")
 
-        {{
-          "question": "string",
-          "options": ["string1", "string2", "string3", "string4"],
-          "correct_answer_index": 0
-        }}
+    return sse_response(event_stream())
 
-        Conversation:
-        {data.context}
-        """
 
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Return ONLY raw JSON. No explanations."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.4,
-        )
+# --------------------------
+# 🧠 Generador de QUIZ
+# --------------------------
+async def fallback_quiz(context: str, user: Optional[dict], reason: str) -> dict:
+    """Quiz del banco local (por palabras clave, no visto); el fijo si el banco está vacío."""
+    metrics.OPENAI_FALLBACKS.labels(model=QUIZ_MODEL, reason=reason).inc()
+    try:
+        quiz = await quiz_bank.pick(context, user["_id"] if user else None)
+    except Exception as e:
+        logger.warning("quiz bank pick failed error=%s", e)
+        quiz = None
+    return quiz or dict(FALLBACK_QUIZ)
 
-        raw = response.choices[0].message.content.strip()
 
-        # --------------------------
-        # Intentar parsear JSON válido
-        # --------------------------
-        try:
-            quiz_data = json.loads(raw)
-        except json.JSONDecodeError:
-            match = re.search(r"\{[\s\S]*\}", raw)
-            if match:
-                quiz_data = json.loads(match.group(0))
-            else:
-                raise ValueError("Invalid JSON returned by the model.")
-
-        # --------------------------
-        # Validaciones mínimas
-        # --------------------------
-        if "options" not in quiz_data or len(quiz_data["options"]) != 4:
-            quiz_data["options"] = ["Protein", "Carbohydrates", "Lipids", "Vitamins"]
-
-        if "question" not in quiz_data or not quiz_data["question"]:
-            quiz_data["question"] = "Which nutrient is most abundant in meat?"
-
-        if "correct_answer_index" not in quiz_data:
-            quiz_data["correct_answer_index"] = 0
-
-        correct_idx = int(quiz_data["correct_answer_index"])
-        options = quiz_data["options"]
-
-        correct_letter = chr(65 + correct_idx)   # A, B, C, D
-        correct_text = options[correct_idx]
-
-        # --------------------------
-        # ✔ Respuesta final
-        # --------------------------
-        return {
-            "question": quiz_data["question"],
-            "options": options,
-            "correct_answer_letter": correct_letter,
-            "correct_answer_text": correct_text
-        }
+def _consume_result(task: asyncio.Task) -> None:
+    # La generación sigue tras el deadline (llena la caché); su error no se pierde en el log
+    if not task.cancelled() and task.exception() is not None:
+        logger.info("quiz generation finished after deadline with error=%s", task.exception())
+
+
+@router.post("/generate_quiz")
+async def generate_quiz(data: QuizRequest, authorization: Optional[str] = Header(None)):
+    """
+    Genera un quiz a partir del contexto del juego.
+    Con game_number el contexto se arma en el servidor (resumen + últimos
+    turnos dentro del presupuesto de tokens); si no, se recorta el enviado.
+    Si el modelo no responde en QUIZ_DEADLINE_S, falla o su circuit breaker
+    está abierto, responde al instante desde el banco local de quizzes.
+    Devuelve pregunta, opciones, letra correcta (A-D) y texto correcto.
+    El usuario sale del token de sesión (igual que en user_routes).
+    """
+    if data.game_number is None and not data.context:
+        raise HTTPException(status_code=400, detail="Send game_number or context")
+    username = auth.username_from_request(data.username, authorization)
 
+    context = fit_context(data.context) if data.context else ""
+    user = None
+    try:
+        user = await user_cache.get_user(username)
+        if data.game_number is not None and user:
+            # Contexto canónico del servidor: es el mismo que usa el prefetch
+            context = await load_game_context(user["_id"], data.game_number) or context
+        if not context:
+            return await fallback_quiz(context, user, "empty_context")
+
+        task = asyncio.ensure_future(quiz_cache.get_or_generate(context))
+        task.add_done_callback(_consume_result)
+        return await asyncio.wait_for(asyncio.shield(task), QUIZ_DEADLINE_S)
+
+    except asyncio.TimeoutError:
+        logger.warning("generate_quiz fallback username=%s reason=deadline", username)
+        return await fallback_quiz(context, user, "deadline")
+    except CircuitOpen:
+        return await fallback_quiz(context, user, "circuit_open")
     except Exception as e:
-        print("❌ generate_quiz failed:", e)
-        return {
-            "question": "What is the main nutrient found in meat?",
-            "options": ["Protein", "Fiber", "Vitamin C", "Carbohydrates"],
-            "correct_answer_letter": "A",
-            "correct_answer_text": "Protein"
-        }
+        logger.warning("generate_quiz fallback username=%s error=%s", username, e)
+        return await fallback_quiz(context, user, type(e).__name__)
+
+
+# --------------------------
+# 📊 Estadísticas de cachés
+# --------------------------
+@router.get("/cache_stats")
+async def cache_stats():
+    return {
+        "answer_cache": answer_cache.stats(),
+        "quiz_cache": quiz_cache.stats(),
+        "openai_coalescing": openai_gateway.coalesce_stats(),
+        "quiz_breaker": quiz_breaker.stats(),
+        "quiz_bank": quiz_bank.stats(),
+        "user_cache": user_cache.stats()
+    }
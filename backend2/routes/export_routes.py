@@ -0,0 +1,48 @@
+import hmac
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from config import settings
+from services import export
+from services.ndjson import ndjson_response
+
+router = APIRouter()
+
+EXPORT_API_KEY = settings.EXPORT_API_KEY
+
+
+# ---------------------------
+# Export para investigación (CSV / NDJSON en streaming)
+# ---------------------------
+@router.get("/{dataset}")
+async def export_dataset(
+    dataset: str,
+    fmt: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    game_number: Optional[int] = None,
+    cohort: Optional[str] = None,
+    x_export_key: Optional[str] = Header(None),
+):
+    """
+    Export anonimizado (user_hash en lugar de user_id/username), escrito por
+    trozos desde un cursor de agregación. Parquet solo por CLI (jobs.export).
+    Deshabilitado (404) mientras falten EXPORT_API_KEY o EXPORT_ANON_SALT.
+    """
+    if not EXPORT_API_KEY or not export.EXPORT_ANON_SALT:
+        raise HTTPException(status_code=404, detail="Export is not enabled")
+    if not x_export_key or not hmac.compare_digest(x_export_key.encode(), EXPORT_API_KEY.encode()):
+        raise HTTPException(status_code=403, detail="Invalid export key")
+    if dataset not in export.DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset, use one of: {', '.join(export.DATASETS)}")
+
+    rows = export.iter_rows(dataset, since=since, until=until, game_number=game_number, cohort=cohort)
+    if fmt == "ndjson":
+        response = ndjson_response(export.ndjson_chunks(rows))
+    else:
+        response = StreamingResponse(export.csv_chunks(dataset, rows), media_type="text/csv")
+    response.headers["Content-Disposition"] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
@@ -1,25 +1,50 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from db.mongo_client import db
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Header, Query
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from config import settings
+from db import repository as repo
+from db.pagination import KEYSET_SORT, encode_cursor, keyset_query
+from datetime import datetime, timedelta
 from bson import ObjectId
-import bcrypt
-from openai import OpenAI  
-import os
-from dotenv import load_dotenv
+from pymongo.errors import DuplicateKeyError
+import anyio
+import asyncio
+import logging
+import uuid
+from services import auth, conditional, deletion_jobs, leaderboard, openai_gateway, password_hasher, user_cache, user_stats, write_behind
+from services.answer_cache import answer_cache, ANSWER_CACHE_ENABLED
+from services.quiz_cache import quiz_cache, QUIZ_PREFETCH_ENABLED
+from services.quiz_generator import load_game_context
+from services.bson_json import BSONJSONResponse
+from services.ndjson import ndjson_line, ndjson_response
+from services.sse import sse_event, sse_response
 from fastapi import Body
 
-load_dotenv()
-
-# Inicializar cliente OpenAI
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 router = APIRouter()
-
-# Colecciones
-users_col = db["users"]
-messages_col = db["messages"]
-games_col = db["games"]
-quiz_col = db["quiz_results"]
+logger = logging.getLogger(__name__)
+
+TUTOR_SYSTEM_PROMPT = "You are a helpful tutor chatbot for Meat Science."
+TUTOR_MODEL = "gpt-5-mini"
+# Namespace de la caché: depende del modelo y del prompt de sistema
+TUTOR_CACHE_NAMESPACE = f"tutor:{TUTOR_MODEL}:{TUTOR_SYSTEM_PROMPT}"
+
+# batch_events: un claim sobre eventos sin aplicar que lleve más que esto se
+# da por abandonado (el intento que lo tomó murió sin liberarlo)
+BATCH_APPLY_CLAIM_S = 60
+
+# Historiales: tamaño de lote del cursor y tope de página
+HISTORY_BATCH_SIZE = settings.HISTORY_BATCH_SIZE
+HISTORY_MAX_LIMIT = 500
+
+# Vistas resumen: sin los campos de texto grandes
+MESSAGE_SUMMARY_PROJECTION = {
+    "user_id": 1, "game_number": 1, "question_number": 1,
+    "user_message": 1, "partial": 1, "created_at": 1
+}
+QUIZ_SUMMARY_PROJECTION = {
+    "user_id": 1, "game_number": 1, "question_number": 1, "selected_option": 1,
+    "correct_answer_letter": 1, "is_correct": 1, "created_at": 1
+}
 
 # ---------------------------
 # 🔹 Modelos de entrada
@@ -27,6 +52,7 @@ quiz_col = db["quiz_results"]
 class Register(BaseModel):
     username: str
     password: str
+    cohort: Optional[str] = None  # grupo/clase, para filtrar exports
 
 class Login(BaseModel):
     username: str
@@ -45,38 +71,122 @@ class GameUpdate(BaseModel):
     correct_count: int
     highest_score: int
 
+# Eventos del endpoint batch: event_id lo genera el cliente (p. ej. UUID)
+class QuizResultEvent(BaseModel):
+    event_id: str = Field(min_length=1, max_length=100)
+    game_number: int
+    question_number: int
+    quiz_question: str
+    quiz_options: List[str]
+    selected_option: str
+    correct_answer_letter: str
+    correct_answer_text: str
+    is_correct: bool
+
+class ProgressEvent(BaseModel):
+    event_id: str = Field(min_length=1, max_length=100)
+    game_number: int
+    question_number: int
+    correct_count: int
+    highest_score: int
+
+class BatchEvents(BaseModel):
+    username: str
+    quiz_results: List[QuizResultEvent] = Field(default_factory=list, max_length=500)
+    progress: List[ProgressEvent] = Field(default_factory=list, max_length=500)
+
 
 # ---------------------------
 # Funciones auxiliares
 # ---------------------------
-def hash_password(password: str) -> bytes:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+async def hash_password(password: str) -> bytes:
+    try:
+        return await password_hasher.hash_password(password)
+    except password_hasher.PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
 
-def verify_password(password: str, hashed: bytes) -> bool:
-    return bcrypt.checkpw(password.encode("utf-8"), hashed)
+async def verify_password(password: str, hashed: bytes) -> bool:
+    try:
+        return await password_hasher.verify_password(password, hashed)
+    except password_hasher.PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
 
-def get_user(username: str):
-    return users_col.find_one({"username": username})
+async def get_user(username: str, authorization: Optional[str] = None):
+    """
+    Resuelve el usuario de la petición: por token firmado si viene en
+    Authorization, o por username. Se sirve desde la caché de usuarios.
+    """
+    username = auth.username_from_request(username, authorization)
+    return await user_cache.get_user(username)
 
-def serialize_doc(doc):
-    """Convierte ObjectId y datetime a tipos serializables por JSON"""
-    if not doc:
-        return None
-    doc["_id"] = str(doc.get("_id"))
-    if "user_id" in doc and isinstance(doc["user_id"], ObjectId):
-        doc["user_id"] = str(doc["user_id"])
-    if "timestamp" in doc and hasattr(doc["timestamp"], "isoformat"):
-        doc["timestamp"] = doc["timestamp"].isoformat()
-    if "created_at" in doc and hasattr(doc["created_at"], "isoformat"):
-        doc["created_at"] = doc["created_at"].isoformat()
+async def bump_version(user: dict) -> None:
+    """Nueva versión del historial del usuario (cambia su ETag)."""
+    await user_cache.update(user["_id"], {"$inc": conditional.VERSION_BUMP})
+
+def tutor_messages(text: str) -> list:
+    return [
+        {"role": "system", "content": TUTOR_SYSTEM_PROMPT},
+        {"role": "user", "content": text}
+    ]
+
+def build_message_doc(user, data, bot_reply: str, partial: bool = False) -> dict:
+    doc = {
+        "user_id": ObjectId(user["_id"]),
+        "username": data.username,
+        "user_message": data.text,
+        "bot_response": bot_reply,
+        "game_number": data.game_number,
+        "question_number": data.question_number,
+        "created_at": datetime.utcnow()
+    }
+    if partial:
+        doc["partial"] = True
     return doc
 
+async def cached_tutor_answer(text: str):
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    return await answer_cache.get(TUTOR_CACHE_NAMESPACE, text)
+
+async def remember_tutor_answer(text: str, answer: str):
+    if ANSWER_CACHE_ENABLED and answer:
+        await answer_cache.put(TUTOR_CACHE_NAMESPACE, text, answer)
+
+def history_query(user_id, after: Optional[str]) -> dict:
+    try:
+        return keyset_query({"user_id": user_id}, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def read_page(cursor, limit: Optional[int]):
+    """Lee una página (se pidió limit + 1) y calcula el cursor siguiente."""
+    docs = await cursor.to_list(length=None)
+    next_after = None
+    if limit and len(docs) > limit:
+        docs = docs[:limit]
+        next_after = encode_cursor(docs[-1])
+    return docs, next_after
+
+async def stream_history(cursor, kind: str, limit: Optional[int]):
+    """Itera el cursor por lotes y emite una línea NDJSON por documento."""
+    count, last = 0, None
+    async for doc in cursor:
+        count += 1
+        last = doc
+        yield ndjson_line({"type": kind, **doc})
+    next_after = encode_cursor(last) if limit and count == limit else None
+    yield ndjson_line({"type": "end", "count": count, "next_after": next_after})
+
+def prefetch_quiz(user_id, game_number: int):
+    """Genera por adelantado el quiz del contexto actualizado del juego."""
+    if QUIZ_PREFETCH_ENABLED:
+        quiz_cache.schedule(lambda: load_game_context(user_id, game_number))
 
 # ---------------------------
 # Registro de usuario
 # ---------------------------
 @router.post("/register")
-def register_user(data: Register):
+async def register_user(data: Register):
     username = data.username.strip().lower()
 
     # ---- ❌ Validate forbidden patterns ----
@@ -100,19 +210,25 @@ def register_user(data: Register):
         )
 
     # ---- ❌ Check if user already exists ----
-    if get_user(username):
+    if await get_user(username):
         raise HTTPException(status_code=400, detail="Username already exists")
 
     # ---- ✔ Register user safely ----
-    hashed_pw = hash_password(data.password)
-    users_col.insert_one({
-        "username": username,
-        "password": hashed_pw,
-        "best_score": 0,
-        "current_game": 1,
-        "stats": {"total_games": 0, "total_correct": 0},
-        "created_at": datetime.utcnow()
-    })
+    hashed_pw = await hash_password(data.password)
+    try:
+        await repo.insert_user({
+            "username": username,
+            "password": hashed_pw,
+            "best_score": 0,
+            "current_game": 1,
+            "stats": {"total_games": 0, "total_correct": 0, "total_answered": 0, "per_game": {}},
+            "created_at": datetime.utcnow(),
+            **({"cohort": data.cohort} if data.cohort else {})
+        })
+    except DuplicateKeyError:
+        # Dos registros simultáneos pasan la comprobación de arriba; el
+        # índice único username_unique rechaza el segundo
+        raise HTTPException(status_code=400, detail="Username already exists")
 
     return {"message": "User registered successfully!"}
 
@@ -120,43 +236,47 @@ def register_user(data: Register):
 # Inicio de sesión
 # ---------------------------
 @router.post("/login")
-def login_user(data: Login):
-    user = get_user(data.username)
-    if not user or not verify_password(data.password, user["password"]):
+async def login_user(data: Login):
+    user = await repo.get_user(data.username)
+    if not user or not await verify_password(data.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
-    return {"message": "Login successful!"}
+    # Re-hash transparente si el hash guardado usa un costo distinto al actual
+    if password_hasher.needs_rehash(user["password"]):
+        new_hash = await hash_password(data.password)
+        await repo.update_user(user["_id"], {"$set": {"password": new_hash}})
+
+    user_cache.remember(user)
+
+    response = {"message": "Login successful!"}
+    if auth.SECRET_KEY:
+        response["access_token"] = auth.create_token(user)
+        response["token_type"] = "bearer"
+    return response
 
 
 # ---------------------------
 # Guardar mensaje + respuesta del bot
 # ---------------------------
 @router.post("/save_message")
-async def save_message(data: Message):
-    user = get_user(data.username)
+async def save_message(data: Message, authorization: Optional[str] = Header(None)):
+    user = await get_user(data.username, authorization)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-5-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful tutor chatbot for Meat Science."},
-                {"role": "user", "content": data.text}
-            ]
-        )
-
-        bot_reply = response.choices[0].message.content
+        bot_reply = await cached_tutor_answer(data.text)
+        if bot_reply is None:
+            response = await openai_gateway.chat_completion(
+                model=TUTOR_MODEL,
+                messages=tutor_messages(data.text)
+            )
+            bot_reply = response.choices[0].message.content
+            await remember_tutor_answer(data.text, bot_reply)
 
-        messages_col.insert_one({
-            "user_id": ObjectId(user["_id"]),
-            "username": data.username,
-            "user_message": data.text,
-            "bot_response": bot_reply,
-            "game_number": data.game_number,
-            "question_number": data.question_number,
-            "created_at": datetime.utcnow()
-        })
+        await write_behind.messages_buffer.write(build_message_doc(user, data, bot_reply))
+        await bump_version(user)
+        prefetch_quiz(user["_id"], data.game_number)
 
         return {
             "username": data.username,
@@ -165,60 +285,103 @@ async def save_message(data: Message):
             "status": "Message and response saved successfully"
         }
 
+    except openai_gateway.GatewayBusy as e:
+        raise HTTPException(status_code=503, detail=f"Tutor is busy, try again: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OpenAI or DB error: {str(e)}")
 
+
+# ---------------------------
+# Variante streaming (SSE) de save_message
+# ---------------------------
+@router.post("/save_message/stream")
+async def save_message_stream(data: Message, authorization: Optional[str] = Header(None)):
+    """
+    Envía los tokens de la respuesta como eventos SSE según llegan.
+    La respuesta completa se guarda una sola vez al terminar el stream;
+    si el cliente se desconecta antes, se guarda lo recibido como parcial.
+    """
+    user = await get_user(data.username, authorization)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    cached = await cached_tutor_answer(data.text)
+
+    async def event_stream():
+        parts = []
+        completed = False
+        try:
+            if cached is not None:
+                # Acierto de caché: se envía la respuesta completa en un solo evento
+                parts.append(cached)
+                yield sse_event({"token": cached})
+            else:
+                async for token in openai_gateway.stream_chat_completion(
+                    model=TUTOR_MODEL,
+                    messages=tutor_messages(data.text)
+                ):
+                    parts.append(token)
+                    yield sse_event({"token": token})
+                await remember_tutor_answer(data.text, "".join(parts))
+            completed = True
+        except Exception as e:
+            yield sse_event({"error": str(e)}, event="error")
+        finally:
+            bot_reply = "".join(parts)
+            if completed or bot_reply:
+                # Protegido de la cancelación por desconexión del cliente
+                with anyio.CancelScope(shield=True):
+                    await write_behind.messages_buffer.write(
+                        build_message_doc(user, data, bot_reply, partial=not completed)
+                    )
+                    await bump_version(user)
+                if completed:
+                    prefetch_quiz(user["_id"], data.game_number)
+
+        if completed:
+            yield sse_event({
+                "username": data.username,
+                "user_message": data.text,
+                "bot_response": "".join(parts),
+                "status": "Message and response saved successfully"
+            }, event="done")
+
+    return sse_response(event_stream())
+
 # ---------------------------
 # Actualizar progreso del juego (versión final con total_games correcto)
 # ---------------------------
 @router.post("/update_game")
-def update_game(data: GameUpdate):
-    user = get_user(data.username)
+async def update_game(data: GameUpdate, authorization: Optional[str] = Header(None)):
+    user = await get_user(data.username, authorization)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     user_id = ObjectId(user["_id"])
 
-    # Verificar si el juego ya existe
-    existing_game = games_col.find_one({
-        "user_id": user_id,
-        "game_number": data.game_number
-    })
-
-    # Si el juego no existe → crear uno nuevo y aumentar total_games
-    if not existing_game:
-        games_col.insert_one({
-            "user_id": user_id,
-            "game_number": data.game_number,
+    # 1) Upsert del juego: crea o actualiza en una sola operación atómica
+    new_game = await repo.upsert_game(user_id, data.game_number, {
+        "$set": {
             "question_number": data.question_number,
-            "correct_count": data.correct_count,
-            "created_at": datetime.utcnow()
-        })
+            "correct_count": data.correct_count
+        },
+        "$setOnInsert": {"created_at": datetime.utcnow(), "answered": 0}
+    })
 
-        # Solo sumar total_games cuando es un NUEVO juego
-        users_col.update_one(
-            {"_id": user["_id"]},
-            {"$inc": {"stats.total_games": 1}}
-        )
+    # 2) Una sola actualización del usuario: versión del historial,
+    #    total_games solo si el upsert creó el juego, y récord personal con $max
+    user_update = {"$inc": dict(conditional.VERSION_BUMP)}
+    if new_game:
+        user_update["$inc"]["stats.total_games"] = 1
+    if new_game or data.highest_score > user.get("best_score", 0):
+        user_update["$max"] = {"best_score": data.highest_score}
 
-        print(f"Nuevo juego creado para {data.username}, total_games incrementado.")
-    else:
-        # Actualizar progreso del juego existente
-        games_col.update_one(
-            {"user_id": user_id, "game_number": data.game_number},
-            {"$set": {
-                "question_number": data.question_number,
-                "correct_count": data.correct_count
-            }}
-        )
-        print(f"Juego existente actualizado para {data.username}.")
+    # Write-through: la caché queda con el documento actualizado
+    await user_cache.update(user_id, user_update)
+    if "$max" in user_update:
+        leaderboard.record_score(user["username"], max(data.highest_score, user.get("best_score", 0)))
 
-    # Actualizar récord personal si aplica
-    if data.highest_score > user.get("best_score", 0):
-        users_col.update_one(
-            {"_id": user["_id"]},
-            {"$set": {"best_score": data.highest_score}}
-        )
+    logger.info("update_game username=%s game_number=%s created=%s", data.username, data.game_number, new_game)
 
     return {"message": "Game progress updated successfully!"}
 
@@ -226,7 +389,7 @@ def update_game(data: GameUpdate):
 # Guardar resultado de quiz
 # ---------------------------
 @router.post("/save_quiz_result")
-def save_quiz_result(
+async def save_quiz_result(
     username: str = Body(...),
     game_number: int = Body(...),
     question_number: int = Body(...),
@@ -236,14 +399,15 @@ def save_quiz_result(
     correct_answer_letter: str = Body(...),
     correct_answer_text: str = Body(...),
     is_correct: bool = Body(...),
+    authorization: Optional[str] = Header(None),
 ):
-    user = get_user(username)
+    user = await get_user(username, authorization)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     user_id = ObjectId(user["_id"])
 
-    quiz_col.insert_one({
+    quiz_doc = {
         "user_id": user_id,
         "username": username,
         "game_number": game_number,
@@ -255,21 +419,24 @@ def save_quiz_result(
         "correct_answer_text": correct_answer_text,
         "is_correct": is_correct,
         "created_at": datetime.utcnow()
-    })
+    }
 
-    games_col.update_one(
-        {"user_id": user_id, "game_number": game_number},
-        {
+    # 1) Insert del resultado y upsert del juego en paralelo (colecciones distintas)
+    _, new_game = await asyncio.gather(
+        write_behind.quiz_results_buffer.write(quiz_doc),
+        repo.upsert_game(user_id, game_number, {
             "$set": {"question_number": question_number},
-            "$inc": {"correct_count": 1 if is_correct else 0}
-        },
-        upsert=True
+            "$inc": {"correct_count": 1 if is_correct else 0, "answered": 1},
+            "$setOnInsert": {"created_at": quiz_doc["created_at"]}
+        })
     )
 
-    users_col.update_one(
-        {"_id": user_id},
-        {"$inc": {"stats.total_correct": 1 if is_correct else 0}}
-    )
+    # 2) Agregados materializados en un solo $inc (total_games si el juego es nuevo)
+    increments = user_stats.quiz_result_increments(game_number, 1, 1 if is_correct else 0)
+    increments.update(conditional.VERSION_BUMP)
+    if new_game:
+        increments["stats.total_games"] = 1
+    await user_cache.update(user_id, {"$inc": increments})
 
     return {
         "message": "Quiz result saved",
@@ -279,60 +446,210 @@ def save_quiz_result(
     }
 
 
-# Función auxiliar para serializar cualquier ObjectId → str
-def serialize_doc(doc):
-    """Convierte todos los ObjectId en strings para que FastAPI los pueda devolver."""
-    if not doc:
-        return doc
-    return {k: str(v) if isinstance(v, ObjectId) else v for k, v in doc.items()}
+# ---------------------------
+# Ingesta en lote de resultados de quiz y progreso
+# ---------------------------
+@router.post("/batch_events")
+async def batch_events(data: BatchEvents, authorization: Optional[str] = Header(None)):
+    """
+    Aplica muchos eventos en pocas operaciones:
+    - un insert_many en quiz_results (idempotente por event_id: los repetidos
+      se marcan "duplicate" y no vuelven a insertarse),
+    - un bulk_write de upserts agregados por juego,
+    - un único update del usuario con los $inc agregados.
+    Los resultados se insertan con applied=false y se marcan applied=true
+    después de aplicar juegos y usuario; si algo falla entre medio, el
+    reintento del cliente (todo "duplicate") aplica los que quedaron sin
+    aplicar, así nada se cuenta dos veces ni se pierde.
+    El progreso se aplica con $max, así un reintento o un evento viejo no
+    hace retroceder el juego.
+    """
+    user = await get_user(data.username, authorization)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    user_id = ObjectId(user["_id"])
+    now = datetime.utcnow()
+
+    # 1) Resultados de quiz
+    quiz_docs = [
+        {
+            "user_id": user_id,
+            "username": user["username"],
+            **event.model_dump(),
+            "applied": False,
+            "created_at": now
+        }
+        for event in data.quiz_results
+    ]
+    quiz_status = await repo.insert_quiz_results(quiz_docs)
+
+    # 2) Agregar por juego lo que falta aplicar (insertado ahora o en un
+    #    intento anterior que falló antes de terminar)
+    claim = uuid.uuid4().hex
+    pending = []
+    if quiz_docs:
+        pending = await repo.claim_unapplied_quiz_results(
+            user_id, [event.event_id for event in data.quiz_results], claim, now,
+            stale_before=now - timedelta(seconds=BATCH_APPLY_CLAIM_S),
+        )
+    try:
+        new_games = await apply_batch(user, user_id, pending, data.progress, now)
+    except BaseException:
+        if pending:
+            await repo.finish_quiz_results_claim(user_id, claim, applied=False)
+        raise
+    if pending:
+        await repo.finish_quiz_results_claim(user_id, claim, applied=True)
+
+    return {
+        "username": data.username,
+        "quiz_results": [
+            {"event_id": event.event_id, "status": quiz_status[i]}
+            for i, event in enumerate(data.quiz_results)
+        ],
+        "progress": [{"event_id": event.event_id, "status": "applied"} for event in data.progress],
+        "new_games": new_games
+    }
+
+
+async def apply_batch(user: dict, user_id: ObjectId, pending: list, progress_events: list, now: datetime) -> int:
+    """Pasos 2 y 3 de batch_events: juegos y usuario. Devuelve los juegos creados."""
+    per_game = {}
+    for doc in pending:
+        game = per_game.setdefault(doc["game_number"], {"answered": 0, "correct": 0, "question_number": 0})
+        game["answered"] += 1
+        game["correct"] += 1 if doc["is_correct"] else 0
+        game["question_number"] = max(game["question_number"], doc["question_number"])
+
+    progress = {}
+    for event in progress_events:
+        game = progress.setdefault(event.game_number, {"question_number": 0, "correct_count": 0})
+        game["question_number"] = max(game["question_number"], event.question_number)
+        game["correct_count"] = max(game["correct_count"], event.correct_count)
+
+    game_updates = []
+    for game_number in set(per_game) | set(progress):
+        update = {"$setOnInsert": {"created_at": now}}
+        quiz = per_game.get(game_number)
+        prog = progress.get(game_number)
+        question_number = max(quiz["question_number"] if quiz else 0, prog["question_number"] if prog else 0)
+        update["$max"] = {"question_number": question_number}
+        if prog:
+            update["$max"]["correct_count"] = prog["correct_count"]
+        if quiz:
+            inc = {"answered": quiz["answered"]}
+            if not prog:
+                inc["correct_count"] = quiz["correct"]
+            update["$inc"] = inc
+        else:
+            update["$setOnInsert"]["answered"] = 0
+        game_updates.append(({"user_id": user_id, "game_number": game_number}, update))
+
+    new_games = await repo.bulk_upsert_games(game_updates)
+
+    # 3) Un solo update del usuario
+    increments = {}
+    for game_number, quiz in per_game.items():
+        for key, value in user_stats.quiz_result_increments(game_number, quiz["answered"], quiz["correct"]).items():
+            increments[key] = increments.get(key, 0) + value
+    if new_games:
+        increments["stats.total_games"] = new_games
+
+    user_update = {}
+    if increments or game_updates:
+        user_update["$inc"] = {**increments, **conditional.VERSION_BUMP}
+    if progress_events:
+        user_update["$max"] = {"best_score": max(e.highest_score for e in progress_events)}
+    if user_update:
+        await user_cache.update(user_id, user_update)
+    if progress_events:
+        leaderboard.record_score(user["username"], user_update["$max"]["best_score"])
+    return new_games
+
 
 @router.get("/get_stats/{username}")
-def get_stats(username: str):
+async def get_stats(
+    username: str,
+    limit: Optional[int] = Query(None, ge=1, le=HISTORY_MAX_LIMIT),
+    after: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|summary)$"),
+    fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    history: bool = True,
+    authorization: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Estadísticas + historial del usuario.
+    Los contadores salen del documento del usuario (materializados al
+    escribir); `history=false` devuelve solo eso, sin tocar el historial.
+    Los mensajes se paginan por keyset con `limit`/`after`; `view=summary`
+    omite las respuestas del bot y `format=ndjson` hace streaming del cursor.
+    Con If-None-Match igual al ETag (versión del usuario) responde 304.
+    """
     try:
-        user = get_user(username)
+        user = await get_user(username, authorization)
         if not user:
             raise HTTPException(status_code=404, detail=f"User '{username}' not found")
 
+        etag = conditional.user_etag(user)
+        if conditional.is_fresh(etag, if_none_match):
+            return conditional.not_modified(etag)
+
         # Aseguramos ObjectId correcto
         user_id = user["_id"] if isinstance(user["_id"], ObjectId) else ObjectId(user["_id"])
 
-        # Traemos juegos y mensajes por ObjectId
-        games = list(games_col.find({"user_id": user_id}))
-        messages = list(messages_col.find({"user_id": user_id}))
+        summary = {"username": username, **user_stats.summarize(user)}
+        if not history:
+            return conditional.with_etag(BSONJSONResponse(summary), etag)
 
-        # Serializamos para evitar error con ObjectId
-        games = [serialize_doc(g) for g in games]
-        messages = [serialize_doc(m) for m in messages]
+        messages_query = history_query(user_id, after)
+        projection = MESSAGE_SUMMARY_PROJECTION if view == "summary" else None
 
-        # Sincronizar total_games según cantidad real
-        real_total_games = len(games)
-        user_stats = user.get("stats") or {"total_games": 0, "total_correct": 0}
+        # Traemos juegos por ObjectId (pocos por usuario)
+        games = await repo.find_games({"user_id": user_id}, {"context_summary": 0})
 
-        if real_total_games != user_stats.get("total_games", 0):
-            users_col.update_one(
-                {"_id": user_id},
-                {"$set": {"stats.total_games": real_total_games}}
+        if fmt == "ndjson":
+            cursor = repo.messages_cursor(
+                messages_query, projection, sort=KEYSET_SORT,
+                limit=limit or 0, batch_size=HISTORY_BATCH_SIZE
             )
-            user_stats["total_games"] = real_total_games
 
-        # Devolver estructura limpia y serializable
-        return {
-            "username": username,
-            "best_score": user.get("best_score", 0),
-            "total_games": user_stats.get("total_games", 0),
-            "total_correct": user_stats.get("total_correct", 0),
+            async def stream():
+                yield ndjson_line({"type": "stats", **summary})
+                for g in games:
+                    yield ndjson_line({"type": "game", **g})
+                async for line in stream_history(cursor, "message", limit):
+                    yield line
+
+            return conditional.with_etag(ndjson_response(stream()), etag)
+
+        # Traemos mensajes por ObjectId (una página si se pidió limit)
+        cursor = repo.messages_cursor(
+            messages_query, projection, sort=KEYSET_SORT,
+            limit=limit + 1 if limit else 0, batch_size=HISTORY_BATCH_SIZE
+        )
+        messages, next_after = await read_page(cursor, limit)
+
+        # Los documentos van tal cual: el codec BSON → JSON (orjson) los
+        # serializa sin pasar por jsonable_encoder
+        return conditional.with_etag(BSONJSONResponse({
+            **summary,
             "games": games,
-            "messages": messages
-        }
+            "messages": messages,
+            "next_after": next_after
+        }), etag)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print("Error in get_stats:", str(e))
+        logger.exception("get_stats failed username=%s", username)
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
 @router.get("/debug_user_links/{username}") 
-def debug_user_links(username: str): 
-    user = get_user(username) 
+async def debug_user_links(username: str, authorization: Optional[str] = Header(None)): 
+    user = await get_user(username, authorization) 
     if not user: raise HTTPException(status_code=404, detail=f"User '{username}' not found") 
     
     user_id = user["_id"] 
@@ -341,14 +658,14 @@ def debug_user_links(username: str):
     # 
     # Cuántos documentos coinciden por cada tipo 
     # 
-    count_obj_games = games_col.count_documents({"user_id": uid_obj}) 
-    count_str_games = games_col.count_documents({"user_id": uid_str}) 
-    count_obj_msgs = messages_col.count_documents({"user_id": uid_obj}) 
-    count_str_msgs = messages_col.count_documents({"user_id": uid_str}) 
-    sample_games = list(games_col.find({"user_id": uid_str}, {"_id": 0}))
-    sample_msgs = list(messages_col.find({"user_id": uid_str}, {"_id": 0}))
-
-    return { "user_id_type": str(type(user_id)), 
+    count_obj_games = await repo.count_games({"user_id": uid_obj}) 
+    count_str_games = await repo.count_games({"user_id": uid_str}) 
+    count_obj_msgs = await repo.count_messages({"user_id": uid_obj}) 
+    count_str_msgs = await repo.count_messages({"user_id": uid_str}) 
+    sample_games = await repo.find_games({"user_id": uid_str}, {"_id": 0})
+    sample_msgs = await repo.find_messages({"user_id": uid_str}, {"_id": 0})
+
+    return BSONJSONResponse({ "user_id_type": str(type(user_id)), 
             "user_id_str": uid_str, 
             "match_counts": 
             { 
@@ -358,85 +675,148 @@ def debug_user_links(username: str):
                 "messages_by_string": count_str_msgs 
             }, 
               "sample_games_user_ids": sample_games, 
-              "sample_messages_user_ids": sample_msgs }
+              "sample_messages_user_ids": sample_msgs })
 
 @router.get("/get_game_messages/{username}/{game_number}")
-def get_game_messages(username: str, game_number: int):
+async def get_game_messages(
+    username: str,
+    game_number: int,
+    authorization: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Devuelve todos los mensajes de un usuario en un juego específico,
     correctamente filtrando por ObjectId y serializando la salida.
     """
     try:
         # Buscar usuario
-        user = get_user(username)
+        user = await get_user(username, authorization)
         if not user:
             raise HTTPException(status_code=404, detail=f"User '{username}' not found")
 
+        etag = conditional.user_etag(user)
+        if conditional.is_fresh(etag, if_none_match):
+            return conditional.not_modified(etag)
+
         # Asegurar que user_id sea ObjectId
         user_id = user["_id"] if isinstance(user["_id"], ObjectId) else ObjectId(user["_id"])
 
         # Buscar mensajes correspondientes al juego
-        msgs = list(messages_col.find(
+        # Buscar mensajes ordenados por número de pregunta
+        msgs = await repo.find_messages(
             {"user_id": user_id, "game_number": int(game_number)},
-            {"_id": 0}
-        ))
-
-        # Ordenar por número de pregunta
-        msgs.sort(key=lambda x: x.get("question_number", 0))
-
-        # Serializar mensajes
-        serialized_msgs = [serialize_doc(m) for m in msgs]
+            {"_id": 0},
+            sort=[("question_number", 1)]
+        )
 
-        return {
+        return conditional.with_etag(BSONJSONResponse({
             "username": username,
             "game_number": int(game_number),
-            "messages": serialized_msgs
-        }
+            "messages": msgs
+        }), etag)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in get_game_messages: {str(e)}")
+        logger.exception("get_game_messages failed username=%s game_number=%s", username, game_number)
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
-@router.delete("/delete_all_messages/{username}")
-def delete_all_messages(username: str):
-    """Elimina todas las conversaciones (mensajes) y juegos de un usuario."""
-    user = get_user(username)
+@router.delete("/delete_all_messages/{username}", status_code=202)
+async def delete_all_messages(username: str, authorization: Optional[str] = Header(None)):
+    """
+    Programa el borrado de mensajes, resultados de quiz y juegos del usuario
+    (job en segundo plano, por lotes). El progreso se consulta en
+    /user/delete_jobs/{job_id}.
+    """
+    user = await get_user(username, authorization)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user_id = str(user["_id"])
-
-    messages_col.delete_many({"user_id": user_id})
-    games_col.delete_many({"user_id": user["_id"]})
+    job = await deletion_jobs.start(user)
+    return {
+        "message": f"Deletion scheduled for {username}",
+        "job_id": job["_id"],
+        "status": job["status"],
+        "status_url": f"/user/delete_jobs/{job['_id']}",
+    }
 
-    users_col.update_one({"_id": user["_id"]}, {"$set": {"stats.total_games": 0, "stats.total_correct": 0}})
+@router.get("/delete_jobs/{job_id}")
+async def delete_job_status(job_id: str):
+    job = await deletion_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return BSONJSONResponse(job)
 
-    return {"message": f"All conversations deleted for {username}"}
 
-@router.get("/quiz_history/{username}")
-def quiz_history(username: str):
-    user = get_user(username)
+# ---------------------------
+# Leaderboard y rank
+# ---------------------------
+@router.get("/leaderboard")
+async def get_leaderboard(limit: int = Query(10, ge=1, le=leaderboard.LEADERBOARD_TOP_K)):
+    """Top por best_score (desde el top-K en memoria)."""
+    return {"leaderboard": await leaderboard.leaderboard.top(limit)}
+
+@router.get("/rank/{username}")
+async def get_rank(username: str, authorization: Optional[str] = Header(None)):
+    """Puesto del usuario: 1 + usuarios con best_score estrictamente mayor."""
+    user = await get_user(username, authorization)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user_id = ObjectId(user["_id"])
-
-    quizzes = list(quiz_col.find({"user_id": user_id}).sort("created_at", 1))
+    best_score = user.get("best_score", 0)
+    return {"username": user["username"], "best_score": best_score, **await leaderboard.leaderboard.rank(best_score)}
 
-    # Convert ObjectId → string
-    quizzes = [serialize_doc(q) for q in quizzes]
-
-    return {
-        "username": username,
-        "total_quizzes": len(quizzes),
-        "quizzes": quizzes
-    }
+@router.get("/leaderboard_stats")
+async def leaderboard_stats():
+    return leaderboard.leaderboard.stats()
 
 
+@router.get("/write_stats")
+async def write_stats():
+    """Estado de los buffers write-behind (cola, flushes y latencia de flush)."""
+    return write_behind.stats()
 
+@router.get("/quiz_history/{username}")
+async def quiz_history(
+    username: str,
+    limit: Optional[int] = Query(None, ge=1, le=HISTORY_MAX_LIMIT),
+    after: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|summary)$"),
+    fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    authorization: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    user = await get_user(username, authorization)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
 
+    etag = conditional.user_etag(user)
+    if conditional.is_fresh(etag, if_none_match):
+        return conditional.not_modified(etag)
 
+    user_id = ObjectId(user["_id"])
+    query = history_query(user_id, after)
+    projection = QUIZ_SUMMARY_PROJECTION if view == "summary" else None
 
+    if fmt == "ndjson":
+        cursor = repo.quiz_results_cursor(
+            query, projection, sort=KEYSET_SORT,
+            limit=limit or 0, batch_size=HISTORY_BATCH_SIZE
+        )
+        return conditional.with_etag(ndjson_response(stream_history(cursor, "quiz", limit)), etag)
 
+    cursor = repo.quiz_results_cursor(
+        query, projection, sort=KEYSET_SORT,
+        limit=limit + 1 if limit else 0, batch_size=HISTORY_BATCH_SIZE
+    )
+    quizzes, next_after = await read_page(cursor, limit)
 
+    # Con paginación el total se cuenta aparte (usa el índice por user_id)
+    total = await repo.count_quiz_results({"user_id": user_id}) if limit or after else len(quizzes)
 
+    return conditional.with_etag(BSONJSONResponse({
+        "username": username,
+        "total_quizzes": total,
+        "quizzes": quizzes,
+        "next_after": next_after
+    }), etag)
@@ -0,0 +1,264 @@
+"""
+Caché de respuestas del tutor.
+
+1. Búsqueda exacta por la pregunta normalizada.
+2. Búsqueda de casi-duplicados con MinHash + LSH sobre n-gramas de
+   caracteres de la pregunta sin palabras vacías (todo local, sin
+   llamadas externas). Un candidato solo se acepta si además las palabras
+   de contenido que no comparten son variantes una de otra (erratas,
+   plurales): "ground beef" y "ground turkey" se parecen en n-gramas pero
+   no son la misma pregunta.
+
+Acotada por tamaño (LRU) y TTL. Opcionalmente se persiste en la colección
+`answer_cache` para sobrevivir reinicios (ANSWER_CACHE_PERSIST=true).
+"""
+import hashlib
+import random
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+from difflib import SequenceMatcher
+from datetime import datetime
+from typing import Optional
+
+from config import settings
+from db import repository as repo
+from services.ttl_cache import TTLCache
+
+ANSWER_CACHE_ENABLED = settings.ANSWER_CACHE_ENABLED
+ANSWER_CACHE_MAX_ENTRIES = settings.ANSWER_CACHE_MAX_ENTRIES
+ANSWER_CACHE_TTL_S = settings.ANSWER_CACHE_TTL_S
+ANSWER_CACHE_SIMILARITY = settings.ANSWER_CACHE_SIMILARITY
+ANSWER_CACHE_PERSIST = settings.ANSWER_CACHE_PERSIST
+
+NGRAM_SIZE = 4
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 61) - 1
+# Parecido mínimo (difflib) entre dos palabras no compartidas para tomarlas
+# como la misma escrita distinto
+WORD_VARIANT_RATIO = 0.75
+
+# Palabras vacías: no aportan al parecido entre preguntas
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did",
+    "what", "whats", "s", "of", "in", "on", "for", "to", "and", "or", "it",
+    "can", "you", "me", "please", "tell", "about", "i", "my",
+    "el", "la", "los", "las", "un", "una", "de", "del", "que", "es", "por", "y",
+}
+
+# Semilla fija: las firmas deben ser estables entre procesos y reinicios
+_rng = random.Random(20240521)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+# ---------------------------
+# Normalización y firmas
+# ---------------------------
+def normalize_question(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def content_words(normalized: str) -> list:
+    return [w for w in normalized.split() if w not in STOPWORDS]
+
+
+def content_text(normalized: str) -> str:
+    """Texto usado para la firma MinHash: la pregunta sin palabras vacías."""
+    return " ".join(content_words(normalized)) or normalized
+
+
+def words_match(words_a, words_b) -> bool:
+    """
+    True si cada palabra de contenido no compartida tiene su variante (errata,
+    plural) en la otra pregunta. Una palabra distinta de verdad ("beef" /
+    "turkey") o una de más descartan el casi-duplicado.
+    """
+    only_a = sorted(set(words_a) - set(words_b))
+    only_b = sorted(set(words_b) - set(words_a))
+    if len(only_a) != len(only_b):
+        return False
+    for word in only_a:
+        ratio, variant = max((SequenceMatcher(None, word, other).ratio(), other) for other in only_b)
+        if ratio < WORD_VARIANT_RATIO:
+            return False
+        only_b.remove(variant)
+    return True
+
+
+def _shingles(text: str) -> set:
+    if len(text) <= NGRAM_SIZE:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {
+        zlib.crc32(text[i:i + NGRAM_SIZE].encode("utf-8"))
+        for i in range(len(text) - NGRAM_SIZE + 1)
+    }
+
+
+def minhash(text: str) -> tuple:
+    shingles = _shingles(text)
+    return tuple(
+        min((a * s + b) % _PRIME for s in shingles)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def band_keys(signature: tuple) -> list:
+    return [
+        f"{i}:{zlib.crc32(repr(signature[i * ROWS:(i + 1) * ROWS]).encode()):x}"
+        for i in range(BANDS)
+    ]
+
+
+def similarity(sig_a, sig_b) -> float:
+    """Estimación de Jaccard a partir de dos firmas MinHash."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+
+def _doc_words(doc: dict) -> list:
+    # Documentos persistidos antes de guardar `words`
+    return doc.get("words") or content_words(doc.get("normalized", ""))
+
+
+def _cache_key(namespace: str, normalized: str) -> str:
+    return hashlib.sha1(f"{namespace}\x00{normalized}".encode("utf-8")).hexdigest()
+
+
+# ---------------------------
+# Caché
+# ---------------------------
+class AnswerCache:
+    def __init__(self, maxsize: int, ttl: float, threshold: float, persist: bool):
+        self.threshold = threshold
+        self.persist = persist
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl, on_evict=self._unindex)
+        self._bands = defaultdict(set)  # band_key -> {cache_key}
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    async def get(self, namespace: str, question: str) -> Optional[str]:
+        normalized = normalize_question(question)
+        key = _cache_key(namespace, normalized)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.exact_hits += 1
+            return entry["answer"]
+
+        words = content_words(normalized)
+        signature = minhash(content_text(normalized))
+        bands = band_keys(signature)
+        entry = self._near_lookup(namespace, signature, bands, words)
+        if entry is not None:
+            self.near_hits += 1
+            return entry["answer"]
+
+        if self.persist:
+            entry = await self._persistent_lookup(key, namespace, signature, bands, words)
+            if entry is not None:
+                return entry["answer"]
+
+        self.misses += 1
+        return None
+
+    async def put(self, namespace: str, question: str, answer: str) -> None:
+        normalized = normalize_question(question)
+        key = _cache_key(namespace, normalized)
+        words = content_words(normalized)
+        signature = minhash(content_text(normalized))
+        bands = band_keys(signature)
+        self._store(key, {
+            "namespace": namespace, "signature": signature, "bands": bands, "words": words, "answer": answer,
+        })
+
+        if self.persist:
+            await repo.save_cached_answer({
+                "_id": key,
+                "namespace": namespace,
+                "normalized": normalized,
+                "signature": list(signature),
+                "bands": bands,
+                "words": words,
+                "answer": answer,
+                "created_at": datetime.utcnow(),
+            })
+
+    def _store(self, key: str, entry: dict) -> None:
+        self._entries.set(key, entry)
+        for band in entry["bands"]:
+            self._bands[band].add(key)
+
+    def _unindex(self, key: str, entry: dict) -> None:
+        for band in entry["bands"]:
+            keys = self._bands.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[band]
+
+    def _near_lookup(self, namespace: str, signature: tuple, bands: list, words: list) -> Optional[dict]:
+        candidates = set()
+        for band in bands:
+            candidates |= self._bands.get(band, set())
+
+        best, best_score = None, self.threshold
+        for key in candidates:
+            if key not in self._entries:
+                continue
+            entry = self._entries.get(key)
+            if entry["namespace"] != namespace:
+                continue
+            score = similarity(signature, entry["signature"])
+            if score >= best_score and words_match(words, entry["words"]):
+                best, best_score = entry, score
+        return best
+
+    async def _persistent_lookup(self, key, namespace, signature, bands, words) -> Optional[dict]:
+        doc = await repo.find_cached_answer(key)
+        if doc is not None:
+            self.exact_hits += 1
+        else:
+            best_score = self.threshold
+            for candidate in await repo.find_cached_answers_by_bands(namespace, bands):
+                score = similarity(signature, candidate["signature"])
+                if score >= best_score and words_match(words, _doc_words(candidate)):
+                    doc, best_score = candidate, score
+            if doc is None:
+                return None
+            self.near_hits += 1
+
+        # Se calienta la caché en memoria con lo encontrado
+        entry = {
+            "namespace": doc["namespace"],
+            "signature": tuple(doc["signature"]),
+            "bands": doc["bands"],
+            "words": _doc_words(doc),
+            "answer": doc["answer"],
+        }
+        self._store(doc["_id"], entry)
+        return entry
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.near_hits
+        total = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+
+answer_cache = AnswerCache(
+    maxsize=ANSWER_CACHE_MAX_ENTRIES,
+    ttl=ANSWER_CACHE_TTL_S,
+    threshold=ANSWER_CACHE_SIMILARITY,
+    persist=ANSWER_CACHE_PERSIST,
+)
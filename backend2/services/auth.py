@@ -0,0 +1,61 @@
+"""
+Tokens de sesión firmados (JWT HS256 con SECRET_KEY).
+
+El login emite un token; los endpoints lo aceptan en
+`Authorization: Bearer <token>`. Mientras el frontend migra, el token es
+opcional salvo que AUTH_REQUIRED=true.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import jwt
+from fastapi import HTTPException
+
+from config import settings
+
+SECRET_KEY = settings.SECRET_KEY
+JWT_ALGORITHM = "HS256"
+ACCESS_TOKEN_TTL_S = settings.ACCESS_TOKEN_TTL_S
+AUTH_REQUIRED = settings.AUTH_REQUIRED
+
+
+def create_token(user: dict) -> str:
+    if not SECRET_KEY:
+        raise RuntimeError("SECRET_KEY is not configured")
+    now = datetime.now(timezone.utc)
+    claims = {
+        "sub": user["username"],
+        "uid": str(user["_id"]),
+        "iat": now,
+        "exp": now + timedelta(seconds=ACCESS_TOKEN_TTL_S),
+    }
+    return jwt.encode(claims, SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+
+def decode_token(token: str) -> dict:
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Session expired, please log in again")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid session token")
+
+
+def username_from_request(username: Optional[str], authorization: Optional[str]) -> str:
+    """
+    Devuelve el username autenticado. Si viene token, manda el token y debe
+    coincidir con el username de la ruta/cuerpo (si se envió).
+    """
+    if not authorization:
+        if AUTH_REQUIRED:
+            raise HTTPException(status_code=401, detail="Missing session token")
+        return username
+
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Invalid authorization header")
+
+    claims = decode_token(token)
+    if username and claims["sub"] != username:
+        raise HTTPException(status_code=403, detail="Token does not match username")
+    return claims["sub"]
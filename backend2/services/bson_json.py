@@ -0,0 +1,39 @@
+"""
+Codec único BSON → JSON para las respuestas.
+
+- dumps(value): orjson con datetime nativo; ObjectId, bytes, Decimal128 y
+  sets por `_default`, sin pasar por jsonable_encoder.
+- BSONJSONResponse: clase de respuesta por defecto de la app. Las rutas con
+  payloads grandes devuelven la respuesta directamente para saltarse el
+  recorrido genérico de FastAPI.
+"""
+import base64
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    if isinstance(value, Decimal128):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value) -> bytes:
+    return orjson.dumps(value, default=_default, option=ORJSON_OPTIONS)
+
+
+class BSONJSONResponse(JSONResponse):
+    """JSONResponse con orjson que acepta documentos de Mongo tal cual."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,107 @@
+"""
+Circuit breaker con SLO de latencia.
+
+- closed: las llamadas pasan. Un error o una llamada más lenta que
+  `slow_call_s` cuenta como fallo (en cuanto se cumple el plazo, sin esperar
+  a que termine); `failure_threshold` fallos seguidos abren el circuito.
+- open: allow() devuelve False durante `open_s` (el llamador sirve su
+  fallback al instante, sin esperar al timeout del proveedor).
+- half_open: pasado `open_s` se deja pasar una sola llamada de prueba; si
+  sale bien y a tiempo se cierra, si no vuelve a abrirse.
+"""
+import asyncio
+import time
+
+from services import metrics
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(Exception):
+    """El circuito está abierto: no se llama al proveedor."""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, open_s: float, slow_call_s: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_s = open_s
+        self.slow_call_s = slow_call_s
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.counters = {"calls": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+        self._set_state(CLOSED)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        metrics.CIRCUIT_STATE.labels(name=self.name).set(_STATE_VALUE[state])
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_s:
+            self._set_state(HALF_OPEN)
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.counters["rejected"] += 1
+        return False
+
+    async def call(self, make_call):
+        """Ejecuta make_call() (corrutina) bajo el breaker; CircuitOpen si está abierto."""
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} circuit is open")
+        t0 = time.monotonic()
+        recorded = False
+
+        def on_slow():
+            nonlocal recorded
+            recorded = True
+            self.record(time.monotonic() - t0, ok=False)
+
+        watchdog = asyncio.get_running_loop().call_later(self.slow_call_s, on_slow)
+        try:
+            result = await make_call()
+        except BaseException:
+            watchdog.cancel()
+            if not recorded:
+                self.record(time.monotonic() - t0, ok=False)
+            raise
+        watchdog.cancel()
+        if not recorded:
+            self.record(time.monotonic() - t0)
+        return result
+
+    def record(self, elapsed_s: float, ok: bool = True) -> None:
+        """Resultado de una llamada permitida por allow()."""
+        self.counters["calls"] += 1
+        self._trial_in_flight = False
+        slow = elapsed_s > self.slow_call_s
+        if slow:
+            self.counters["slow_calls"] += 1
+        if ok and not slow:
+            self._failures = 0
+            if self.state != CLOSED:
+                self._set_state(CLOSED)
+            return
+
+        self.counters["failures"] += 1
+        self._failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self._failures >= self.failure_threshold):
+            self._open()
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        self.counters["opened"] += 1
+        self._set_state(OPEN)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "slow_call_s": self.slow_call_s,
+            **self.counters,
+        }
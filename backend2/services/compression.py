@@ -0,0 +1,143 @@
+"""
+Compresión de respuestas (brotli o gzip según Accept-Encoding).
+
+Middleware ASGI:
+- Respuestas de un solo cuerpo: se comprimen enteras si pasan de
+  COMPRESSION_MIN_BYTES.
+- Streaming (NDJSON, export CSV): se comprime trozo a trozo con flush, así
+  cada trozo llega al cliente sin esperar al final.
+- SSE, 304/204 y respuestas que ya traen Content-Encoding pasan tal cual.
+
+brotli es opcional: si el paquete no está instalado solo se ofrece gzip.
+"""
+import zlib
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+
+from config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_ENABLED = settings.COMPRESSION_ENABLED
+COMPRESSION_MIN_BYTES = settings.COMPRESSION_MIN_BYTES
+COMPRESSION_GZIP_LEVEL = settings.COMPRESSION_GZIP_LEVEL
+COMPRESSION_BROTLI_QUALITY = settings.COMPRESSION_BROTLI_QUALITY
+
+# Cuerpos grandes se comprimen en un hilo para no bloquear el event loop
+COMPRESSION_THREAD_MIN_BYTES = 256 * 1024
+EXCLUDED_MEDIA_TYPES = ("text/event-stream", "application/gzip", "application/zip", "image/", "audio/", "video/")
+
+
+def choose_encoding(accept_encoding: str):
+    """Codificación preferida del servidor que el cliente acepta (q > 0)."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.lower()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            # wbits 16 + MAX_WBITS: cabecera y trailer gzip
+            self._gz = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.flush()
+        return self._gz.compress(data) + self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.finish()
+        return self._gz.compress(data) + self._gz.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+                passthrough = (
+                    message["status"] in (204, 206, 304)
+                    or "content-encoding" in headers
+                    or media_type.startswith(EXCLUDED_MEDIA_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    # Se decide con el primer trozo del cuerpo
+                    start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start is not None:
+                response_start, start = start, None
+                headers = MutableHeaders(raw=response_start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(response_start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                if not more_body:
+                    if len(body) >= COMPRESSION_THREAD_MIN_BYTES:
+                        body = await anyio.to_thread.run_sync(compressor.finish, body)
+                    else:
+                        body = compressor.finish(body)
+                    headers["Content-Length"] = str(len(body))
+                    await send(response_start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                del headers["Content-Length"]
+                await send(response_start)
+
+            data = compressor.chunk(body) if more_body else compressor.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,49 @@
+"""
+GET condicional (ETag / If-None-Match) para los historiales de un usuario.
+
+Cada endpoint que escribe historial hace `$inc: {version: 1}` en el usuario;
+el ETag es (user_id, version), así que se resuelve con el documento del
+usuario (caché en proceso) sin tocar messages / games / quiz_results.
+Con write-behind la versión vuelve a subir cuando el lote llega a Mongo
+(write_behind.bump_versions), así un 304 nunca tapa un registro en cola.
+Entre workers vale lo mismo que para los contadores de get_stats: como
+mucho USER_CACHE_TTL_S de retraso.
+"""
+from typing import Optional
+
+from fastapi import Response
+
+# El cliente puede guardar la respuesta pero debe revalidar cada vez
+CACHE_CONTROL = "private, no-cache"
+
+VERSION_BUMP = {"version": 1}
+
+
+def user_etag(user: dict) -> str:
+    # Débil: la misma representación puede ir comprimida o no
+    return f'W/"{user["_id"]}-{user.get("version", 0)}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_fresh(etag: str, if_none_match: Optional[str]) -> bool:
+    """Comparación débil de If-None-Match (lista separada por comas o *)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = _opaque(etag)
+    return any(_opaque(tag) == target for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
@@ -0,0 +1,133 @@
+"""
+Memoria de conversación por sesión para /chatbot/ask.
+
+Cada sesión guarda sus turnos y un resumen corto de los turnos antiguos.
+Antes de llamar al modelo se aplica una ventana deslizante por presupuesto
+de tokens: los turnos más viejos que no caben se pliegan en el resumen.
+
+Backends:
+- "memory": LRU + TTL en el proceso (por defecto).
+- "mongo": colección `conversations`, compartida entre workers.
+"""
+from datetime import datetime, timedelta
+
+from config import settings
+from db import repository as repo
+from services.ttl_cache import TTLCache
+
+CONVERSATION_BACKEND = settings.CONVERSATION_BACKEND
+CONVERSATION_MAX_SESSIONS = settings.CONVERSATION_MAX_SESSIONS
+CONVERSATION_TTL_S = settings.CONVERSATION_TTL_S
+CONVERSATION_TOKEN_BUDGET = settings.CONVERSATION_TOKEN_BUDGET
+CONVERSATION_SUMMARY_MAX_CHARS = settings.CONVERSATION_SUMMARY_MAX_CHARS
+
+
+def estimate_tokens(text: str) -> int:
+    """Aproximación barata (~4 caracteres por token) sin depender de un tokenizer."""
+    return max(1, len(text) // 4)
+
+
+def extend_summary(summary: str, questions: list, max_chars: int) -> str:
+    """Resumen extractivo: agrega las preguntas del estudiante y conserva lo más reciente."""
+    asked = [q.strip().replace("\n", " ")[:120] for q in questions]
+    summary = "; ".join(filter(None, [summary] + [f"student asked: {q}" for q in asked]))
+    return summary[-max_chars:]
+
+
+def empty_state() -> dict:
+    return {"turns": [], "summary": ""}
+
+
+# ---------------------------
+# Backends
+# ---------------------------
+class InMemoryBackend:
+    def __init__(self, max_sessions: int, ttl: float):
+        self._cache = TTLCache(maxsize=max_sessions, ttl=ttl)
+
+    async def load(self, session_id: str) -> dict:
+        return self._cache.get(session_id) or empty_state()
+
+    async def save(self, session_id: str, state: dict) -> None:
+        self._cache.set(session_id, state)
+
+
+class MongoBackend:
+    """Las sesiones caducan por `updated_at` (índice TTL en la colección)."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+
+    async def load(self, session_id: str) -> dict:
+        doc = await repo.load_conversation(session_id)
+        if not doc or doc["updated_at"] < datetime.utcnow() - timedelta(seconds=self.ttl):
+            return empty_state()
+        return {"turns": doc.get("turns", []), "summary": doc.get("summary", "")}
+
+    async def save(self, session_id: str, state: dict) -> None:
+        await repo.save_conversation(session_id, {
+            "turns": state["turns"],
+            "summary": state["summary"],
+            "updated_at": datetime.utcnow(),
+        })
+
+
+# ---------------------------
+# Store
+# ---------------------------
+class ConversationStore:
+    def __init__(self, backend, token_budget: int, summary_max_chars: int):
+        self.backend = backend
+        self.token_budget = token_budget
+        self.summary_max_chars = summary_max_chars
+
+    async def get_messages(self, session_id: str, question: str) -> list:
+        """Mensajes a enviar al modelo: resumen + turnos recientes + pregunta nueva."""
+        state = await self.backend.load(session_id)
+        messages = []
+        if state["summary"]:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {state['summary']}",
+            })
+        messages.extend(state["turns"])
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    async def append(self, session_id: str, question: str, answer: str) -> None:
+        state = await self.backend.load(session_id)
+        state["turns"].append({"role": "user", "content": question})
+        state["turns"].append({"role": "assistant", "content": answer})
+        self._fit_to_budget(state)
+        await self.backend.save(session_id, state)
+
+    def _fit_to_budget(self, state: dict) -> None:
+        """Quita los turnos más viejos (por parejas) hasta caber en el presupuesto."""
+        turns = state["turns"]
+        used = sum(estimate_tokens(t["content"]) for t in turns)
+        dropped = []
+        while used > self.token_budget and len(turns) > 2:
+            for t in turns[:2]:
+                used -= estimate_tokens(t["content"])
+            dropped.extend(turns[:2])
+            del turns[:2]
+
+        if dropped:
+            state["summary"] = self._summarize(state["summary"], dropped)
+
+    def _summarize(self, summary: str, dropped: list) -> str:
+        asked = [t["content"] for t in dropped if t["role"] == "user"]
+        return extend_summary(summary, asked, self.summary_max_chars)
+
+
+def _build_backend():
+    if CONVERSATION_BACKEND == "mongo":
+        return MongoBackend(ttl=CONVERSATION_TTL_S)
+    return InMemoryBackend(max_sessions=CONVERSATION_MAX_SESSIONS, ttl=CONVERSATION_TTL_S)
+
+
+conversation_store = ConversationStore(
+    _build_backend(),
+    token_budget=CONVERSATION_TOKEN_BUDGET,
+    summary_max_chars=CONVERSATION_SUMMARY_MAX_CHARS,
+)
@@ -0,0 +1,219 @@
+"""
+Borrado del historial de un usuario como job en segundo plano.
+
+delete_all_messages solo crea el job y responde 202; el borrado recorre
+messages, quiz_results y games por lotes de DELETE_BATCH_SIZE (siguiendo un
+índice que empieza por user_id, con una pausa entre lotes para no sostener
+escrituras largas ni picos de replicación). El estado y el progreso se
+guardan en la colección deletion_jobs, así cualquier worker puede responder
+GET /user/delete_jobs/{job_id}. Al terminar se reinician los contadores del
+usuario con un único update.
+
+Un job sin terminar tiene `active: true` (índice único parcial por user_id:
+como mucho uno por usuario, también entre workers) y un lease (`owner`,
+`lease_until`) que el worker renueva en cada lote. Si el worker se cae o el
+job queda interrumpido al apagar, el lease vence y el barrido periódico (o
+un nuevo delete_all_messages del usuario) lo retoma; borrar es idempotente.
+
+Con write-behind, antes de borrar se drenan los buffers de este proceso
+(write_behind.drain_all). Los de otros workers no se ven desde aquí: tras
+una espera de DELETE_FINAL_PASS_DELAY_S se hace una segunda pasada que
+borra lo que hayan escrito mientras tanto (best effort: un worker con la
+cola atascada más tiempo que eso todavía puede escribir después).
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from config import settings
+from db import repository as repo
+from db.pagination import KEYSET_SORT
+from services import conditional, user_cache, user_stats, write_behind
+
+logger = logging.getLogger(__name__)
+
+DELETE_BATCH_SIZE = settings.DELETE_BATCH_SIZE
+DELETE_BATCH_PAUSE_S = settings.DELETE_BATCH_PAUSE_S
+DELETE_JOB_LEASE_S = settings.DELETE_JOB_LEASE_S
+# Pasada final con write-behind activo: intervalo de flush de los otros
+# workers más los reintentos de un insert_many (0.2 s + 0.4 s) y margen
+DELETE_FINAL_PASS_DELAY_S = write_behind.WRITE_BEHIND_FLUSH_INTERVAL_S + 2.0
+
+# (nombre, colección, orden del índice que se recorre)
+USER_COLLECTIONS = [
+    ("messages", repo.messages_col, KEYSET_SORT),
+    ("quiz_results", repo.quiz_col, KEYSET_SORT),
+    ("games", repo.games_col, [("game_number", 1)]),
+]
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+_running = set()
+_sweeper = None
+
+
+class LeaseLost(Exception):
+    """Otro worker retomó el job (este dejó vencer el lease)."""
+
+
+def _lease_until() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=DELETE_JOB_LEASE_S)
+
+
+def _spawn(job: dict) -> None:
+    task = asyncio.create_task(_run(job))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+async def _take_over(job_id: str) -> Optional[dict]:
+    """Retoma un job con el lease vencido y lo corre en este worker."""
+    job = await repo.claim_deletion_job(job_id, WORKER_ID, datetime.utcnow(), _lease_until())
+    if job is not None:
+        logger.info("delete_job job_id=%s username=%s resumed_by=%s", job_id, job["username"], WORKER_ID)
+        _spawn(job)
+    return job
+
+
+async def start(user: dict) -> dict:
+    """Crea el job (o devuelve el que ya está en curso para el usuario)."""
+    active = await repo.find_active_deletion_job(user["_id"])
+    if active:
+        return await _take_over(active["_id"]) or active
+
+    job = {
+        "_id": uuid.uuid4().hex,
+        "user_id": repo.as_object_id(user["_id"]),
+        "username": user["username"],
+        "status": "pending",
+        "active": True,
+        "owner": WORKER_ID,
+        "lease_until": _lease_until(),
+        "deleted": {name: 0 for name, _, _ in USER_COLLECTIONS},
+        "created_at": datetime.utcnow(),
+        "finished_at": None,
+        "error": None,
+    }
+    try:
+        await repo.insert_deletion_job(job)
+    except DuplicateKeyError:
+        # Otra petición creó el suyo entre la consulta y el insert
+        return await repo.find_active_deletion_job(user["_id"]) or job
+    # El historial empieza a cambiar: los ETag anteriores dejan de valer
+    await repo.update_user(job["user_id"], {"$inc": conditional.VERSION_BUMP})
+    user_cache.invalidate(user["username"])
+
+    _spawn(job)
+    return job
+
+
+async def _update(job_id: str, update: dict) -> None:
+    """Actualiza el job renovando el lease; LeaseLost si ya no es de este worker."""
+    update.setdefault("$set", {})["lease_until"] = _lease_until()
+    if not await repo.update_deletion_job(job_id, update, owner=WORKER_ID):
+        raise LeaseLost(job_id)
+
+
+async def _delete_all(job_id: str, user_id) -> None:
+    for name, collection, sort in USER_COLLECTIONS:
+        while True:
+            deleted = await repo.delete_batch(collection(), {"user_id": user_id}, sort, DELETE_BATCH_SIZE)
+            if not deleted:
+                break
+            await _update(job_id, {"$inc": {f"deleted.{name}": deleted}})
+            await asyncio.sleep(DELETE_BATCH_PAUSE_S)
+
+
+async def _run(job: dict) -> None:
+    job_id, user_id = job["_id"], job["user_id"]
+    try:
+        # Lo que esté en los buffers write-behind de este proceso se escribe
+        # antes de borrar (espera el flush en curso y sus reintentos)
+        await write_behind.drain_all()
+
+        # Totales al empezar, para reportar progreso (deleted / total); al
+        # retomar un job se suma lo que ya se había borrado
+        totals = {
+            name: job["deleted"].get(name, 0) + await collection().count_documents({"user_id": user_id})
+            for name, collection, _ in USER_COLLECTIONS
+        }
+        await _update(job_id, {"$set": {"status": "running", "total": totals, "started_at": datetime.utcnow()}})
+
+        await _delete_all(job_id, user_id)
+        if any(buffer.buffered for buffer in write_behind.BUFFERS):
+            # Los buffers de otros workers no se pueden drenar desde aquí: se
+            # espera a que los vacíen (intervalo + reintentos) y se repasa
+            await asyncio.sleep(DELETE_FINAL_PASS_DELAY_S)
+            await _delete_all(job_id, user_id)
+
+        # Contadores a cero en una sola operación, ya sin historial debajo
+        await repo.update_user(user_id, {**user_stats.RESET_STATS, "$inc": conditional.VERSION_BUMP})
+        user_cache.invalidate(job["username"])
+        await _update(job_id, {"$set": {"status": "done", "active": False, "finished_at": datetime.utcnow()}})
+        logger.info("delete_job job_id=%s username=%s status=done", job_id, job["username"])
+    except asyncio.CancelledError:
+        # Apagado: el lease se libera para que otro worker (o el próximo
+        # arranque) lo retome enseguida
+        await repo.update_deletion_job(
+            job_id, {"$set": {"status": "interrupted", "lease_until": datetime.utcnow()}}, owner=WORKER_ID
+        )
+        raise
+    except LeaseLost:
+        logger.warning("delete_job job_id=%s username=%s lease lost, stopping", job_id, job["username"])
+    except Exception as e:
+        logger.exception("delete_job job_id=%s username=%s status=failed", job_id, job["username"])
+        await repo.update_deletion_job(
+            job_id,
+            {"$set": {"status": "failed", "active": False, "error": str(e), "finished_at": datetime.utcnow()}},
+            owner=WORKER_ID,
+        )
+
+
+async def resume_stale() -> int:
+    """Retoma los jobs con lease vencido (caídos o interrumpidos). Devuelve cuántos."""
+    resumed = 0
+    for job in await repo.find_stale_deletion_jobs(datetime.utcnow()):
+        if await _take_over(job["_id"]) is not None:
+            resumed += 1
+    return resumed
+
+
+async def _sweep() -> None:
+    while True:
+        try:
+            await resume_stale()
+        except Exception as e:
+            logger.warning("delete_job sweep failed: %s", e)
+        await asyncio.sleep(DELETE_JOB_LEASE_S)
+
+
+def start_sweeper() -> None:
+    """Barrido periódico: al arrancar y cada DELETE_JOB_LEASE_S."""
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = asyncio.create_task(_sweep())
+
+
+async def get(job_id: str):
+    job = await repo.find_deletion_job(job_id)
+    if job:
+        # El id del worker (host:pid) no es para el cliente
+        job.pop("owner", None)
+    return job
+
+
+async def stop_all() -> None:
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        await asyncio.gather(_sweeper, return_exceptions=True)
+        _sweeper = None
+    for task in list(_running):
+        task.cancel()
+    await asyncio.gather(*_running, return_exceptions=True)
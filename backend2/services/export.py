@@ -0,0 +1,188 @@
+"""
+Export de datos para investigación (messages, quiz_results, games).
+
+Las filas salen de un cursor de agregación ($match por fechas, game_number y
+cohorte + $project a columnas fijas) y se escriben por trozos, así la memoria
+no depende del tamaño del export:
+- CSV / NDJSON: generadores de bytes (HTTP en streaming o archivo).
+- Parquet: archivo en disco por row groups (requiere pyarrow, opcional).
+
+Anonimización: el user_id se reemplaza por user_hash = HMAC-SHA256(salt,
+user_id) truncado; username nunca se exporta. Con el mismo salt el hash es
+estable entre exports, así se pueden cruzar datasets. Sin EXPORT_ANON_SALT
+propio no se exporta nada (no se reutiliza SECRET_KEY).
+"""
+import csv
+import hashlib
+import hmac
+import io
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from config import settings
+from db import repository as repo
+from services.bson_json import dumps
+from services.ndjson import ndjson_line
+
+EXPORT_ANON_SALT = (settings.EXPORT_ANON_SALT or "").encode()
+EXPORT_BATCH_SIZE = settings.EXPORT_BATCH_SIZE
+EXPORT_CHUNK_ROWS = settings.EXPORT_CHUNK_ROWS
+
+# Columnas por dataset: (nombre, tipo). user_hash sale del user_id.
+DATASETS = {
+    "messages": [
+        ("user_hash", "str"), ("game_number", "int"), ("question_number", "int"),
+        ("user_message", "str"), ("bot_response", "str"), ("partial", "bool"),
+        ("created_at", "datetime"),
+    ],
+    "quiz_results": [
+        ("user_hash", "str"), ("game_number", "int"), ("question_number", "int"),
+        ("quiz_question", "str"), ("quiz_options", "list"), ("selected_option", "str"),
+        ("correct_answer_letter", "str"), ("correct_answer_text", "str"),
+        ("is_correct", "bool"), ("created_at", "datetime"),
+    ],
+    "games": [
+        ("user_hash", "str"), ("game_number", "int"), ("question_number", "int"),
+        ("correct_count", "int"), ("answered", "int"), ("created_at", "datetime"),
+    ],
+}
+
+COLLECTIONS = {
+    "messages": repo.messages_col,
+    "quiz_results": repo.quiz_col,
+    "games": repo.games_col,
+}
+
+
+def columns(dataset: str) -> List[str]:
+    return [name for name, _ in DATASETS[dataset]]
+
+
+class ExportNotConfigured(RuntimeError):
+    """Falta EXPORT_ANON_SALT: no se puede anonimizar."""
+
+
+def require_salt() -> None:
+    if not EXPORT_ANON_SALT:
+        raise ExportNotConfigured("EXPORT_ANON_SALT is not configured")
+
+
+def anonymize(user_id) -> str:
+    return hmac.new(EXPORT_ANON_SALT, str(user_id).encode(), hashlib.sha256).hexdigest()[:16]
+
+
+# ---------------------------
+# Consulta
+# ---------------------------
+async def build_pipeline(
+    dataset: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    game_number: Optional[int] = None,
+    cohort: Optional[str] = None,
+) -> list:
+    match = {}
+    if since or until:
+        match["created_at"] = {}
+        if since:
+            match["created_at"]["$gte"] = since
+        if until:
+            match["created_at"]["$lt"] = until
+    if game_number is not None:
+        match["game_number"] = game_number
+    if cohort is not None:
+        match["user_id"] = {"$in": await repo.cohort_user_ids(cohort)}
+
+    project = {"_id": 0, "user_id": 1}
+    project.update({name: 1 for name in columns(dataset) if name != "user_hash"})
+    return [{"$match": match}, {"$project": project}]
+
+
+async def iter_rows(dataset: str, **filters) -> AsyncIterator[dict]:
+    """Filas anonimizadas, en el orden de columns(dataset)."""
+    require_salt()
+    pipeline = await build_pipeline(dataset, **filters)
+    cursor = await COLLECTIONS[dataset]().aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE)
+    names = columns(dataset)
+    async for doc in cursor:
+        doc["user_hash"] = anonymize(doc.pop("user_id", ""))
+        yield {name: doc.get(name) for name in names}
+
+
+# ---------------------------
+# Formatos
+# ---------------------------
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return dumps(value).decode()
+    return value
+
+
+async def csv_chunks(dataset: str, rows: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns(dataset))
+    pending = 0
+    async for row in rows:
+        writer.writerow([_csv_value(v) for v in row.values()])
+        pending += 1
+        if pending >= EXPORT_CHUNK_ROWS:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue().encode()
+
+
+async def ndjson_chunks(rows: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    lines = []
+    async for row in rows:
+        lines.append(ndjson_line(row))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield b"".join(lines)
+            lines = []
+    if lines:
+        yield b"".join(lines)
+
+
+def _arrow_schema(dataset: str):
+    import pyarrow as pa
+
+    types = {
+        "str": pa.string(), "int": pa.int64(), "bool": pa.bool_(),
+        "datetime": pa.timestamp("ms"), "list": pa.list_(pa.string()),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in DATASETS[dataset]])
+
+
+async def write_parquet(dataset: str, path: str, rows: AsyncIterator[dict]) -> int:
+    """Escribe un row group cada EXPORT_CHUNK_ROWS filas. Devuelve las filas escritas."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = _arrow_schema(dataset)
+    names = columns(dataset)
+    written = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = {name: [] for name in names}
+        pending = 0
+        async for row in rows:
+            for name in names:
+                batch[name].append(row[name])
+            pending += 1
+            if pending >= EXPORT_CHUNK_ROWS:
+                writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+                written += pending
+                batch = {name: [] for name in names}
+                pending = 0
+        if pending:
+            writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+            written += pending
+    return written
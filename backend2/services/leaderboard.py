@@ -0,0 +1,102 @@
+"""
+Leaderboard y rank por best_score.
+
+- Top-K en memoria: se carga una vez desde Mongo (índice best_score_desc) y
+  update_game/batch_events lo actualizan en el momento con record_score().
+  Cada LEADERBOARD_REFRESH_S se recarga para recoger lo escrito por otros
+  workers.
+- rank(): 1 + usuarios con best_score mayor (empates comparten puesto).
+  Si el puntaje cae dentro del top-K se calcula en memoria; si no, es un
+  count sobre el índice.
+"""
+import asyncio
+import time
+from typing import Optional
+
+from config import settings
+from db import repository as repo
+
+LEADERBOARD_TOP_K = settings.LEADERBOARD_TOP_K
+LEADERBOARD_REFRESH_S = settings.LEADERBOARD_REFRESH_S
+
+
+class Leaderboard:
+    def __init__(self, top_k: int, refresh_s: float):
+        self.top_k = top_k
+        self.refresh_s = refresh_s
+        self._entries = []          # [{"username", "best_score"}] ordenado
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _sort_key(entry: dict):
+        return (-entry["best_score"], entry["username"])
+
+    async def _ensure_loaded(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_s:
+            return
+        async with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_s:
+                return
+            entries = await repo.leaderboard_cursor(self.top_k).to_list(length=None)
+            self._entries = [
+                {"username": e["username"], "best_score": e.get("best_score", 0)} for e in entries
+            ]
+            self._loaded_at = time.monotonic()
+
+    @property
+    def _complete(self) -> bool:
+        """El top-K contiene a todos los usuarios (hay menos de K)."""
+        return len(self._entries) < self.top_k
+
+    def record_score(self, username: str, best_score: int) -> None:
+        """Actualización incremental tras subir el best_score de un usuario."""
+        if self._loaded_at is None:
+            return
+        for entry in self._entries:
+            if entry["username"] == username:
+                entry["best_score"] = max(entry["best_score"], best_score)
+                break
+        else:
+            if not self._complete and best_score < self._entries[-1]["best_score"]:
+                return
+            self._entries.append({"username": username, "best_score": best_score})
+        self._entries.sort(key=self._sort_key)
+        del self._entries[self.top_k:]
+
+    async def top(self, limit: int) -> list:
+        await self._ensure_loaded()
+        return [
+            {"rank": self._rank_in_cache(e["best_score"]), **e}
+            for e in self._entries[:limit]
+        ]
+
+    def _rank_in_cache(self, score: int) -> int:
+        return 1 + sum(1 for e in self._entries if e["best_score"] > score)
+
+    async def rank(self, best_score: int) -> dict:
+        await self._ensure_loaded()
+        # Dentro del top-K (estrictamente por encima del último) la cuenta es exacta en memoria
+        if self._complete or (self._entries and best_score > self._entries[-1]["best_score"]):
+            position = self._rank_in_cache(best_score)
+        else:
+            position = 1 + await repo.count_users_above(best_score)
+        return {"rank": position, "total_users": await repo.count_users()}
+
+    def stats(self) -> dict:
+        age = None if self._loaded_at is None else round(time.monotonic() - self._loaded_at, 1)
+        return {
+            "top_k": self.top_k,
+            "cached_entries": len(self._entries),
+            "complete": self._loaded_at is not None and self._complete,
+            "age_s": age,
+            "refresh_s": self.refresh_s,
+        }
+
+
+leaderboard = Leaderboard(top_k=LEADERBOARD_TOP_K, refresh_s=LEADERBOARD_REFRESH_S)
+
+
+def record_score(username: str, best_score: Optional[int]) -> None:
+    if best_score is not None:
+        leaderboard.record_score(username, best_score)
@@ -0,0 +1,167 @@
+"""
+Métricas Prometheus y logs de tiempos del camino caliente.
+
+- HTTP: histograma de latencia, contador por status y gauge de peticiones
+  en vuelo, por ruta (plantilla, no la URL concreta).
+- MongoDB: duración de cada comando por colección y comando
+  (command monitoring de pymongo, ver MongoCommandTimer).
+- OpenAI: latencia, tokens (response.usage), reintentos y fallbacks por modelo,
+  y estado del circuit breaker del quiz.
+- bcrypt: duración de hash/verify en el pool.
+
+GET /metrics (main.py) expone todo en formato de texto de Prometheus.
+"""
+import logging
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from pymongo import monitoring
+from starlette.routing import compile_path
+
+logger = logging.getLogger("metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being served", ["method", "route"]
+)
+
+MONGO_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency",
+    ["collection", "command", "outcome"], buckets=MONGO_BUCKETS,
+)
+
+OPENAI_LATENCY = Histogram(
+    "openai_request_duration_seconds", "OpenAI call latency (stream: until the last token)",
+    ["model", "kind", "outcome"], buckets=LATENCY_BUCKETS,
+)
+OPENAI_TOKENS = Counter("openai_tokens_total", "OpenAI tokens from response.usage", ["model", "type"])
+OPENAI_RETRIES = Counter("openai_retries_total", "OpenAI calls retried", ["model"])
+OPENAI_COALESCED = Counter(
+    "openai_coalesced_total", "chat_completion calls by single-flight role (leader = upstream call)",
+    ["model", "role"],
+)
+OPENAI_FALLBACKS = Counter("openai_fallbacks_total", "Responses served from a fallback", ["model", "reason"])
+CIRCUIT_STATE = Gauge("circuit_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["name"])
+
+PASSWORD_LATENCY = Histogram(
+    "password_hash_duration_seconds", "bcrypt operation latency (queue + pool)",
+    ["operation"], buckets=LATENCY_BUCKETS,
+)
+
+
+def render() -> tuple:
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+# ---------------------------
+# OpenAI
+# ---------------------------
+def record_usage(model: str, usage) -> None:
+    if usage is None:
+        return
+    OPENAI_TOKENS.labels(model=model, type="prompt").inc(usage.prompt_tokens or 0)
+    OPENAI_TOKENS.labels(model=model, type="completion").inc(usage.completion_tokens or 0)
+
+
+# ---------------------------
+# MongoDB
+# ---------------------------
+class MongoCommandTimer(monitoring.CommandListener):
+    """Se registra en el AsyncMongoClient (event_listeners) en db/mongo_client.py."""
+
+    # Comandos internos del driver que no interesan
+    IGNORED = {"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue", "endSessions", "buildInfo"}
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        if event.command_name in self.IGNORED:
+            return
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        key = (event.connection_id, event.request_id)
+        self._collections[key] = target if isinstance(target, str) else "-"
+
+    def _observe(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return
+        MONGO_LATENCY.labels(
+            collection=collection, command=event.command_name, outcome=outcome
+        ).observe(event.duration_micros / 1_000_000)
+
+    def succeeded(self, event):
+        self._observe(event, "ok")
+
+    def failed(self, event):
+        self._observe(event, "error")
+
+
+# ---------------------------
+# HTTP
+# ---------------------------
+class MetricsMiddleware:
+    """
+    Middleware ASGI: mide cada petición por plantilla de ruta
+    ("/user/get_stats/{username}") para no explotar la cardinalidad.
+    Las rutas se resuelven con el esquema OpenAPI de la app.
+    """
+
+    def __init__(self, app, fastapi_app):
+        self.app = app
+        self.fastapi_app = fastapi_app
+        self._routes = None
+
+    def _route_table(self) -> list:
+        if self._routes is None:
+            routes = []
+            for path, methods in self.fastapi_app.openapi().get("paths", {}).items():
+                regex, _, _ = compile_path(path)
+                routes.append((regex, {m.upper() for m in methods}, path))
+            self._routes = routes
+        return self._routes
+
+    def resolve(self, method: str, path: str) -> str:
+        for regex, methods, template in self._route_table():
+            if method in methods and regex.match(path):
+                return template
+        return "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self.resolve(method, scope["path"])
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method=method, route=route)
+        in_flight.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - t0
+            in_flight.dec()
+            HTTP_LATENCY.labels(method=method, route=route).observe(elapsed)
+            HTTP_REQUESTS.labels(method=method, route=route, status=str(status["code"])).inc()
+            logger.info(
+                "request method=%s route=%s status=%s duration_ms=%.1f",
+                method, route, status["code"], elapsed * 1000,
+            )
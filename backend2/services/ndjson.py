@@ -0,0 +1,12 @@
+"""Respuestas NDJSON (un documento JSON por línea) para historiales grandes."""
+from fastapi.responses import StreamingResponse
+
+from services.bson_json import dumps
+
+
+def ndjson_line(doc: dict) -> bytes:
+    return dumps(doc) + b"\n"
+
+
+def ndjson_response(generator) -> StreamingResponse:
+    return StreamingResponse(generator, media_type="application/x-ndjson")
@@ -0,0 +1,317 @@
+"""
+Gateway asíncrono compartido para OpenAI.
+
+- Un único AsyncOpenAI con pool de conexiones HTTP.
+- Límite de peticiones en vuelo (semáforo) y cola acotada de espera.
+- Reintentos con backoff exponencial + jitter en 429 / 5xx / timeouts.
+- Timeout por llamada.
+- Métricas por modelo: latencia, tokens, reintentos (services/metrics.py).
+- Single-flight: peticiones idénticas concurrentes comparten una llamada.
+- El SDK se importa al crear el cliente, no al importar este módulo
+  (es la mitad del tiempo de arranque).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+
+from config import settings
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_KEY = settings.OPENAI_API_KEY
+
+OPENAI_MAX_CONCURRENCY = settings.OPENAI_MAX_CONCURRENCY
+OPENAI_MAX_QUEUE = settings.OPENAI_MAX_QUEUE
+OPENAI_QUEUE_TIMEOUT_S = settings.OPENAI_QUEUE_TIMEOUT_S
+OPENAI_TIMEOUT_S = settings.OPENAI_TIMEOUT_S
+OPENAI_MAX_RETRIES = settings.OPENAI_MAX_RETRIES
+OPENAI_BACKOFF_BASE_S = settings.OPENAI_BACKOFF_BASE_S
+OPENAI_BACKOFF_MAX_S = settings.OPENAI_BACKOFF_MAX_S
+OPENAI_POOL_MAX_CONNECTIONS = settings.OPENAI_POOL_MAX_CONNECTIONS
+OPENAI_POOL_MAX_KEEPALIVE = settings.OPENAI_POOL_MAX_KEEPALIVE
+OPENAI_COALESCE_ENABLED = settings.OPENAI_COALESCE_ENABLED
+# Tras terminar, la respuesta se sigue compartiendo este tiempo (0 = solo en vuelo)
+OPENAI_COALESCE_WINDOW_S = settings.OPENAI_COALESCE_WINDOW_S
+
+
+class GatewayBusy(Exception):
+    """La cola de espera está llena o se agotó el tiempo de espera por un turno."""
+
+
+_client = None
+_semaphore = None
+_waiting = 0
+# clave de coalescing -> tarea de la llamada compartida
+_inflight = {}
+_coalesce_counts = {"leader": 0, "joined": 0}
+
+
+def warm_up():
+    """Importa el SDK (lo más caro del arranque); se llama en un hilo desde el lifespan."""
+    import openai  # noqa: F401
+
+
+def get_client():
+    """AsyncOpenAI compartido; se crea (e importa el SDK) en la primera llamada."""
+    global _client
+    if _client is None:
+        import httpx
+        import openai
+
+        http_client = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_POOL_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(OPENAI_TIMEOUT_S),
+        )
+        # Los reintentos los hacemos aquí (con jitter), no en el SDK
+        _client = openai.AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            http_client=http_client,
+            max_retries=0,
+        )
+    return _client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def close():
+    global _client, _semaphore
+    for task in list(_inflight.values()):
+        task.cancel()
+    _inflight.clear()
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _semaphore = None
+
+
+# ---------------------------
+# Control de concurrencia
+# ---------------------------
+async def _acquire_slot():
+    """Espera un turno en el semáforo; rechaza rápido si la cola está llena."""
+    global _waiting
+    semaphore = _get_semaphore()
+    if _waiting >= OPENAI_MAX_QUEUE:
+        raise GatewayBusy("OpenAI queue is full")
+
+    _waiting += 1
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=OPENAI_QUEUE_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        raise GatewayBusy("Timed out waiting for an OpenAI slot")
+    finally:
+        _waiting -= 1
+
+
+def _release_slot():
+    _get_semaphore().release()
+
+
+# ---------------------------
+# Reintentos
+# ---------------------------
+def _is_retryable(exc: Exception) -> bool:
+    import openai
+    if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+def _backoff_delay(attempt: int, exc: Exception) -> float:
+    # Si el servidor indica Retry-After lo respetamos (acotado)
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), OPENAI_BACKOFF_MAX_S)
+        except ValueError:
+            pass
+    # Full jitter: uniforme entre 0 y base * 2^intento
+    cap = min(OPENAI_BACKOFF_MAX_S, OPENAI_BACKOFF_BASE_S * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+def _observe(model: str, kind: str, outcome: str, attempt: int, t0: float):
+    elapsed = time.perf_counter() - t0
+    metrics.OPENAI_LATENCY.labels(model=model, kind=kind, outcome=outcome).observe(elapsed)
+    logger.info(
+        "openai model=%s kind=%s outcome=%s attempt=%d duration_ms=%.1f",
+        model, kind, outcome, attempt, elapsed * 1000,
+    )
+
+
+def _retrying(model: str, attempt: int, exc: Exception) -> float:
+    metrics.OPENAI_RETRIES.labels(model=model).inc()
+    delay = _backoff_delay(attempt, exc)
+    logger.warning("openai model=%s retry=%d delay_s=%.2f error=%s", model, attempt + 1, delay, type(exc).__name__)
+    return delay
+
+
+async def _call_with_retries(model: str, make_call):
+    attempt = 0
+    while True:
+        await _acquire_slot()
+        t0 = time.perf_counter()
+        try:
+            response = await make_call()
+            _observe(model, "chat", "ok", attempt, t0)
+            return response
+        except Exception as e:
+            _observe(model, "chat", "error", attempt, t0)
+            if attempt >= OPENAI_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = _retrying(model, attempt, e)
+        finally:
+            _release_slot()
+
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+# ---------------------------
+# Single-flight
+# ---------------------------
+def _normalize(text) -> str:
+    if not isinstance(text, str):
+        return json.dumps(text, sort_keys=True, default=str)
+    return " ".join(text.split()).casefold()
+
+
+def coalesce_key(model: str, messages: list, params: dict) -> str:
+    """(modelo, mensajes normalizados, parámetros) → clave estable."""
+    payload = {
+        "model": model,
+        "messages": [(m.get("role"), _normalize(m.get("content"))) for m in messages],
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _forget(key: str, task: asyncio.Task):
+    if _inflight.get(key) is task:
+        del _inflight[key]
+
+
+def _on_shared_done(key: str, task: asyncio.Task):
+    # Los errores no se comparten más allá de quienes ya esperaban
+    if task.cancelled() or task.exception() is not None or OPENAI_COALESCE_WINDOW_S <= 0:
+        _forget(key, task)
+    else:
+        asyncio.get_running_loop().call_later(OPENAI_COALESCE_WINDOW_S, _forget, key, task)
+
+
+def coalesce_stats() -> dict:
+    total = _coalesce_counts["leader"] + _coalesce_counts["joined"]
+    return {
+        "enabled": OPENAI_COALESCE_ENABLED,
+        "window_s": OPENAI_COALESCE_WINDOW_S,
+        **_coalesce_counts,
+        "in_flight": len(_inflight),
+        "coalesced_ratio": round(_coalesce_counts["joined"] / total, 4) if total else 0.0,
+    }
+
+
+# ---------------------------
+# API pública
+# ---------------------------
+async def chat_completion(model: str, messages: list, timeout: float = None, **params):
+    """
+    Equivalente a client.chat.completions.create pero sin bloquear el worker.
+    Las peticiones idénticas que llegan mientras otra está en vuelo (o dentro
+    de OPENAI_COALESCE_WINDOW_S tras terminar) reciben la misma respuesta.
+    """
+    if not OPENAI_COALESCE_ENABLED:
+        return await _chat_completion(model, messages, timeout, **params)
+
+    key = coalesce_key(model, messages, params)
+    task = _inflight.get(key)
+    if task is not None:
+        role = "joined"
+    else:
+        role = "leader"
+        # Tarea propia: si el primer llamador se cancela, los demás siguen esperando
+        task = asyncio.create_task(_chat_completion(model, messages, timeout, **params))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _on_shared_done(key, t))
+
+    _coalesce_counts[role] += 1
+    metrics.OPENAI_COALESCED.labels(model=model, role=role).inc()
+    return await asyncio.shield(task)
+
+
+async def _chat_completion(model: str, messages: list, timeout: float = None, **params):
+    client = get_client()
+    response = await _call_with_retries(
+        model,
+        lambda: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            timeout=timeout or OPENAI_TIMEOUT_S,
+            **params,
+        )
+    )
+    metrics.record_usage(model, getattr(response, "usage", None))
+    return response
+
+
+async def stream_chat_completion(model: str, messages: list, timeout: float = None, **params):
+    """
+    Generador asíncrono que devuelve los fragmentos de texto según llegan.
+    Solo se reintenta la apertura del stream; el turno del semáforo se
+    mantiene mientras dura la generación.
+    """
+    client = get_client()
+    attempt = 0
+    while True:
+        await _acquire_slot()
+        t0 = time.perf_counter()
+        try:
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=timeout or OPENAI_TIMEOUT_S,
+                stream=True,
+                # El último chunk trae response.usage
+                stream_options={"include_usage": True},
+                **params,
+            )
+            break
+        except Exception as e:
+            _release_slot()
+            _observe(model, "stream", "error", attempt, t0)
+            if attempt >= OPENAI_MAX_RETRIES or not _is_retryable(e):
+                raise
+            delay = _retrying(model, attempt, e)
+
+        attempt += 1
+        await asyncio.sleep(delay)
+
+    outcome = "error"
+    try:
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                metrics.record_usage(model, chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+        outcome = "ok"
+    finally:
+        _release_slot()
+        _observe(model, "stream", outcome, attempt, t0)
+        await stream.close()
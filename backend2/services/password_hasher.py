@@ -0,0 +1,99 @@
+"""
+Hash y verificación de contraseñas (bcrypt) fuera del event loop.
+
+El trabajo va a un executor dedicado y acotado (procesos por defecto) para
+que un login masivo no sature el threadpool del worker. Si hay demasiadas
+operaciones pendientes se rechaza rápido con PasswordPoolBusy (→ 503).
+"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+
+from config import settings
+from services import metrics
+
+BCRYPT_ROUNDS = settings.BCRYPT_ROUNDS
+PASSWORD_POOL_KIND = settings.PASSWORD_POOL_KIND
+PASSWORD_POOL_WORKERS = settings.PASSWORD_POOL_WORKERS
+PASSWORD_POOL_MAX_PENDING = settings.PASSWORD_POOL_MAX_PENDING
+
+
+class PasswordPoolBusy(Exception):
+    """Demasiadas operaciones de contraseña en cola."""
+
+
+_executor = None
+_pending = 0
+
+
+# ---------------------------
+# Trabajo CPU (se ejecuta en el pool)
+# ---------------------------
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+def hash_cost(hashed: bytes) -> int:
+    """Factor de trabajo de un hash bcrypt ($2b$12$...)."""
+    try:
+        return int(hashed.split(b"$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+def needs_rehash(hashed: bytes, rounds: int = None) -> bool:
+    return hash_cost(hashed) != (rounds or BCRYPT_ROUNDS)
+
+
+# ---------------------------
+# Pool
+# ---------------------------
+def start(workers: int = None, kind: str = None):
+    global _executor
+    if _executor is not None:
+        return
+    workers = workers or PASSWORD_POOL_WORKERS
+    if (kind or PASSWORD_POOL_KIND) == "thread":
+        # bcrypt libera el GIL, así que los hilos también escalan
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+    else:
+        # Sin fork: el worker tiene hilos y el event loop corriendo, y un hijo
+        # forkeado heredaría locks tomados y los sockets de Mongo/OpenAI
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+    _executor = None
+
+
+async def _submit(fn, *args):
+    global _pending
+    if _pending >= PASSWORD_POOL_MAX_PENDING:
+        raise PasswordPoolBusy("Too many password operations in progress")
+    start()
+    _pending += 1
+    t0 = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _pending -= 1
+        operation = "hash" if fn is _hash else "verify"
+        metrics.PASSWORD_LATENCY.labels(operation=operation).observe(time.perf_counter() - t0)
+
+
+# ---------------------------
+# API pública
+# ---------------------------
+async def hash_password(password: str) -> bytes:
+    return await _submit(_hash, password.encode("utf-8"), BCRYPT_ROUNDS)
+
+async def verify_password(password: str, hashed: bytes) -> bool:
+    return await _submit(_check, password.encode("utf-8"), hashed)
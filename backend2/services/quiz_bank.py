@@ -0,0 +1,127 @@
+"""
+Banco local de quizzes: respuesta instantánea cuando el modelo no llega.
+
+El banco (colección quiz_bank) lo construye offline jobs.build_quiz_bank a
+partir de los quizzes que generó el propio servidor (colección
+generated_quizzes, ver record_generated); nunca de lo que envían los
+clientes en quiz_results. Cada entrada guarda las palabras clave de su tema
+en `keywords` (índice multikey): las del contexto con el que se generó (las
+mismas que extrae pick) y, detrás, las de la pregunta y la respuesta.
+
+pick() extrae las palabras clave del contexto de la conversación y pide a
+Mongo la entrada con más palabras en común (excluyendo las preguntas que el
+usuario ya vio en quiz_results). Sin coincidencias elige una al azar entre
+las no vistas.
+"""
+import hashlib
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from db import repository as repo
+from services.answer_cache import STOPWORDS, normalize_question
+
+logger = logging.getLogger(__name__)
+
+QUIZ_BANK_CONTEXT_KEYWORDS = 12
+QUIZ_BANK_ENTRY_KEYWORDS = 30
+
+# Además de las del caché de respuestas: palabras de enunciado sin tema
+QUIZ_STOPWORDS = STOPWORDS | {
+    "which", "following", "most", "main", "primary", "not", "true", "false",
+    "with", "from", "by", "as", "at", "this", "that", "these", "those", "its",
+    "than", "their", "they", "when", "why", "how", "has", "have", "will",
+    "would", "should", "could", "user", "tutor", "summary", "earlier", "turns",
+    "also", "more", "less", "one", "two", "all", "any", "some", "such",
+}
+
+counters = {"picks": 0, "keyword_matches": 0, "random_picks": 0, "empty": 0}
+
+
+def question_id(question: str) -> str:
+    return hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()[:32]
+
+
+def _stem(word: str) -> str:
+    # Plural simple: "proteins" -> "protein", sin tocar "glass"
+    if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def extract_keywords(text: str, limit: int = QUIZ_BANK_CONTEXT_KEYWORDS) -> list:
+    """Palabras de contenido más frecuentes del texto (normalizadas)."""
+    words = [
+        _stem(w) for w in normalize_question(text).split()
+        if len(w) >= 3 and not w.isdigit() and w not in QUIZ_STOPWORDS
+    ]
+    return [w for w, _ in Counter(words).most_common(limit)]
+
+
+def bank_entry(question: str, options, letter: str, answer_text: str, context_keywords=None) -> Optional[dict]:
+    """Documento del banco a partir de un quiz guardado; None si no es válido."""
+    if not question or not isinstance(options, list) or len(options) != 4:
+        return None
+    if letter not in ("A", "B", "C", "D") or options[ord(letter) - 65] != answer_text:
+        return None
+    # Primero las del contexto; las de la pregunta completan sin repetir
+    keywords = list(context_keywords or [])
+    keywords += [w for w in extract_keywords(f"{question} {answer_text}", limit=20) if w not in keywords]
+    return {
+        "_id": question_id(question),
+        "question": question,
+        "options": options,
+        "correct_answer_letter": letter,
+        "correct_answer_text": answer_text,
+        "keywords": keywords[:QUIZ_BANK_ENTRY_KEYWORDS],
+    }
+
+
+async def record_generated(quiz: dict, context: str = "") -> None:
+    """Guarda un quiz que generó el modelo (fuente del banco); no falla la petición."""
+    try:
+        await repo.record_generated_quiz(
+            question_id(quiz["question"]), _as_quiz(quiz), extract_keywords(context), datetime.utcnow(),
+        )
+    except Exception as e:
+        logger.warning("record_generated failed: %s", e)
+
+
+def _as_quiz(doc: dict) -> dict:
+    return {
+        "question": doc["question"],
+        "options": doc["options"],
+        "correct_answer_letter": doc["correct_answer_letter"],
+        "correct_answer_text": doc["correct_answer_text"],
+    }
+
+
+async def seen_question_ids(user_id) -> list:
+    questions = await repo.distinct_quiz_questions(user_id)
+    return [question_id(q) for q in questions if isinstance(q, str)]
+
+
+async def pick(context: str, user_id=None) -> Optional[dict]:
+    """Quiz del banco para el contexto; None si el banco está vacío."""
+    counters["picks"] += 1
+    seen = await seen_question_ids(user_id) if user_id is not None else []
+    keywords = extract_keywords(context) if context else []
+
+    if keywords:
+        doc = await repo.best_bank_quiz(keywords, exclude_ids=seen)
+        if doc is not None:
+            counters["keyword_matches"] += 1
+            return _as_quiz(doc)
+
+    # Sin coincidencias: una no vista al azar; si ya vio todo, cualquiera
+    doc = await repo.sample_bank_quiz(exclude_ids=seen) or await repo.sample_bank_quiz(exclude_ids=[])
+    if doc is None:
+        counters["empty"] += 1
+        return None
+    counters["random_picks"] += 1
+    return _as_quiz(doc)
+
+
+def stats() -> dict:
+    return dict(counters)
@@ -0,0 +1,171 @@
+"""
+Caché de quizzes por digest del contexto + pool de prefetch en segundo plano.
+
+- Cuando save_message guarda un turno nuevo se encola la generación del quiz
+  para el contexto actualizado; un pool acotado de workers lo genera antes de
+  que el jugador lo pida.
+- El trabajo en vuelo se deduplica por digest: una petición que llega
+  mientras se genera el mismo contexto espera ese resultado.
+- Memoria acotada: LRU + TTL para resultados y cola de prefetch con tope.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+
+from config import settings
+from services.quiz_generator import build_quiz
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+QUIZ_CACHE_MAX_ENTRIES = settings.QUIZ_CACHE_MAX_ENTRIES
+QUIZ_CACHE_TTL_S = settings.QUIZ_CACHE_TTL_S
+QUIZ_PREFETCH_ENABLED = settings.QUIZ_PREFETCH_ENABLED
+QUIZ_PREFETCH_WORKERS = settings.QUIZ_PREFETCH_WORKERS
+QUIZ_PREFETCH_QUEUE = settings.QUIZ_PREFETCH_QUEUE
+
+
+def context_digest(context: str) -> str:
+    normalized = re.sub(r"\s+", " ", context).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class QuizCache:
+    def __init__(self, maxsize: int, ttl: float, workers: int, queue_size: int):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight = {}  # digest -> asyncio.Future
+        self._workers = workers
+        self._queue_size = queue_size
+        self._queue = None
+        self._tasks = []
+        self.counters = {
+            "requests": 0,
+            "hits": 0,
+            "prefetch_hits": 0,
+            "inflight_joins": 0,
+            "misses": 0,
+            "prefetch_scheduled": 0,
+            "prefetch_completed": 0,
+            "prefetch_dropped": 0,
+            "prefetch_failed": 0,
+        }
+
+    # ---------------------------
+    # Ciclo de vida del pool
+    # ---------------------------
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    # ---------------------------
+    # Lectura (camino crítico)
+    # ---------------------------
+    async def get_or_generate(self, context: str) -> dict:
+        self.counters["requests"] += 1
+        digest = context_digest(context)
+
+        entry = self._cache.get(digest)
+        if entry is not None:
+            self.counters["hits"] += 1
+            if entry["source"] == "prefetch":
+                self.counters["prefetch_hits"] += 1
+            return entry["quiz"]
+
+        future = self._inflight.get(digest)
+        if future is not None:
+            self.counters["inflight_joins"] += 1
+            return await asyncio.shield(future)
+
+        self.counters["misses"] += 1
+        return await self._generate(digest, context, source="request")
+
+    async def _generate(self, digest: str, context: str, source: str) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[digest] = future
+        try:
+            quiz = await build_quiz(context)
+        except asyncio.CancelledError:
+            # Cancelaron al dueño (apagado del prefetch, petición caída): los
+            # que esperan el mismo digest reciben un error normal y sirven su
+            # fallback en lugar de quedar colgados
+            future.set_exception(RuntimeError("quiz generation cancelled"))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # marcada como leída aunque nadie la espere
+            raise
+        else:
+            self._cache.set(digest, {"quiz": quiz, "source": source})
+            future.set_result(quiz)
+            return quiz
+        finally:
+            if not future.done():
+                future.cancel()
+            self._inflight.pop(digest, None)
+
+    # ---------------------------
+    # Prefetch
+    # ---------------------------
+    def schedule(self, load_context):
+        """
+        Encola la generación de un quiz. `load_context` es una corrutina sin
+        argumentos que devuelve el contexto (se resuelve ya en el worker,
+        fuera del camino de la petición).
+        """
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(load_context)
+            self.counters["prefetch_scheduled"] += 1
+        except asyncio.QueueFull:
+            self.counters["prefetch_dropped"] += 1
+
+    async def _worker(self):
+        while True:
+            load_context = await self._queue.get()
+            try:
+                context = await load_context()
+                if not context:
+                    continue
+                digest = context_digest(context)
+                if digest in self._cache or digest in self._inflight:
+                    continue
+                await self._generate(digest, context, source="prefetch")
+                self.counters["prefetch_completed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.counters["prefetch_failed"] += 1
+                logger.warning("quiz prefetch failed: %s", e)
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        requests = self.counters["requests"]
+        return {
+            **self.counters,
+            "size": len(self._cache),
+            "inflight": len(self._inflight),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "hit_rate": round(self.counters["hits"] / requests, 4) if requests else 0.0,
+            "prefetch_hit_rate": round(self.counters["prefetch_hits"] / requests, 4) if requests else 0.0,
+        }
+
+
+quiz_cache = QuizCache(
+    maxsize=QUIZ_CACHE_MAX_ENTRIES,
+    ttl=QUIZ_CACHE_TTL_S,
+    workers=QUIZ_PREFETCH_WORKERS,
+    queue_size=QUIZ_PREFETCH_QUEUE,
+)
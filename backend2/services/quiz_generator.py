@@ -0,0 +1,214 @@
+"""
+Generación de quizzes con el modelo.
+
+Separado de la ruta para que lo usen tanto /chatbot/generate_quiz como
+el pool de prefetch en segundo plano.
+"""
+import json
+import re
+
+from bson import ObjectId
+
+from config import settings
+from db import repository as repo
+from services import openai_gateway, quiz_bank
+from services.circuit_breaker import CircuitBreaker
+from services.conversation_store import estimate_tokens, extend_summary
+
+QUIZ_MODEL = "gpt-4o-mini"
+QUIZ_CONTEXT_TOKEN_BUDGET = settings.QUIZ_CONTEXT_TOKEN_BUDGET
+QUIZ_CONTEXT_SUMMARY_MAX_CHARS = settings.QUIZ_CONTEXT_SUMMARY_MAX_CHARS
+QUIZ_DEADLINE_S = settings.QUIZ_DEADLINE_S
+
+# Una llamada más lenta que el deadline de la petición cuenta como fallo
+quiz_breaker = CircuitBreaker(
+    "quiz",
+    failure_threshold=settings.QUIZ_BREAKER_FAILURES,
+    open_s=settings.QUIZ_BREAKER_OPEN_S,
+    slow_call_s=QUIZ_DEADLINE_S,
+)
+
+FALLBACK_QUIZ = {
+    "question": "What is the main nutrient found in meat?",
+    "options": ["Protein", "Fiber", "Vitamin C", "Carbohydrates"],
+    "correct_answer_letter": "A",
+    "correct_answer_text": "Protein"
+}
+
+
+async def build_quiz(context: str) -> dict:
+    """
+    Genera un quiz basado en TODO el contexto enviado.
+    Devuelve pregunta, opciones, letra correcta (A-D) y texto correcto.
+    Lanza excepción si el modelo falla (el llamador decide el fallback) y
+    CircuitOpen sin llamar al modelo si el circuit breaker está abierto.
+    """
+    prompt = f"""
+        You are an expert Meat Science tutor.
+
+        Based ONLY on the following conversation context, generate ONE multiple-choice quiz question.
+
+        Output ONLY valid JSON in this exact structure:
+
+        {{
+          "question": "string",
+          "options": ["string1", "string2", "string3", "string4"],
+          "correct_answer_index": 0
+        }}
+
+        Conversation:
+        {context}
+        """
+
+    response = await quiz_breaker.call(lambda: openai_gateway.chat_completion(
+        model=QUIZ_MODEL,
+        messages=[
+            {"role": "system", "content": "Return ONLY raw JSON. No explanations."},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0.4,
+    ))
+
+    raw = response.choices[0].message.content.strip()
+
+    # --------------------------
+    # Intentar parsear JSON válido
+    # --------------------------
+    try:
+        quiz_data = json.loads(raw)
+    except json.JSONDecodeError:
+        match = re.search(r"\{[\s\S]*\}", raw)
+        if match:
+            quiz_data = json.loads(match.group(0))
+        else:
+            raise ValueError("Invalid JSON returned by the model.")
+
+    # --------------------------
+    # Validaciones mínimas
+    # --------------------------
+    repaired = False
+    if "options" not in quiz_data or len(quiz_data["options"]) != 4:
+        quiz_data["options"] = ["Protein", "Carbohydrates", "Lipids", "Vitamins"]
+        repaired = True
+
+    if "question" not in quiz_data or not quiz_data["question"]:
+        quiz_data["question"] = "Which nutrient is most abundant in meat?"
+        repaired = True
+
+    if "correct_answer_index" not in quiz_data:
+        quiz_data["correct_answer_index"] = 0
+        repaired = True
+
+    correct_idx = int(quiz_data["correct_answer_index"])
+    options = quiz_data["options"]
+
+    correct_letter = chr(65 + correct_idx)   # A, B, C, D
+    correct_text = options[correct_idx]
+
+    quiz = {
+        "question": quiz_data["question"],
+        "options": options,
+        "correct_answer_letter": correct_letter,
+        "correct_answer_text": correct_text
+    }
+    # Solo lo que el modelo devolvió completo alimenta el banco local
+    if not repaired:
+        await quiz_bank.record_generated(quiz, context)
+    return quiz
+
+
+def _format_turn(m: dict) -> str:
+    return f"User: {m.get('user_message', '')}\nTutor: {m.get('bot_response', '')}"
+
+
+def fit_context(context: str, budget: int = QUIZ_CONTEXT_TOKEN_BUDGET) -> str:
+    """Recorta un contexto enviado por el cliente: se quedan las últimas líneas que caben."""
+    lines = context.splitlines()
+    kept, used = [], 0
+    for line in reversed(lines):
+        used += estimate_tokens(line)
+        if used > budget and kept:
+            break
+        kept.append(line)
+    return "\n".join(reversed(kept))
+
+
+async def load_game_context(user_id, game_number: int, budget: int = QUIZ_CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Contexto canónico de un juego a partir de los mensajes guardados.
+
+    Se leen los turnos del más nuevo al más viejo (índice
+    user_game_question) hasta llenar el presupuesto de tokens. Los turnos más
+    viejos quedan en un resumen guardado en el documento del juego
+    (`context_summary`), que solo se extiende con los turnos que salieron de
+    la ventana desde la última vez: nunca se recalcula entero.
+
+    La ventana se mide contra el resumen ya extendido, así una segunda
+    llamada sin mensajes nuevos devuelve exactamente el mismo contexto (el
+    digest del prefetch coincide con el de la petición).
+    """
+    user_id = repo.as_object_id(user_id)
+    game_number = int(game_number)
+
+    game = await repo.find_game(user_id, game_number) or {}
+    summary = game.get("context_summary") or {"text": "", "question_number": None, "id": None}
+
+    query = {"user_id": user_id, "game_number": game_number}
+    if summary["question_number"] is not None:
+        # Solo lo posterior a lo ya resumido
+        query["$or"] = [
+            {"question_number": {"$gt": summary["question_number"]}},
+            {"question_number": summary["question_number"], "_id": {"$gt": ObjectId(summary["id"])}},
+        ]
+
+    cursor = repo.messages_cursor(
+        query,
+        {"user_message": 1, "bot_response": 1, "question_number": 1},
+        sort=[("question_number", -1), ("_id", -1)],
+        limit=0,
+        batch_size=100,
+    )
+
+    # Del más nuevo al más viejo
+    turns = [m async for m in cursor]
+    sizes = [estimate_tokens(_format_turn(m)) for m in turns]
+
+    def summary_tokens(text: str) -> int:
+        return estimate_tokens(text) if text else 0
+
+    # Primera ventana contra el resumen actual: cota superior, porque
+    # extender el resumen nunca lo acorta
+    keep, used = 0, summary_tokens(summary["text"])
+    for size in sizes:
+        if keep and used + size > budget:
+            break
+        used += size
+        keep += 1
+
+    # Se achica hasta que resumen extendido + ventana quepan (mínimo un turno)
+    text = summary["text"]
+    while keep < len(turns):
+        # turns[keep:] va del más nuevo al más viejo; el resumen se extiende en orden
+        dropped = turns[keep:][::-1]
+        text = extend_summary(
+            summary["text"],
+            [m.get("user_message", "") for m in dropped],
+            QUIZ_CONTEXT_SUMMARY_MAX_CHARS,
+        )
+        if keep <= 1 or summary_tokens(text) + sum(sizes[:keep]) <= budget:
+            break
+        keep -= 1
+
+    if keep < len(turns):
+        newest = turns[keep]
+        summary = {
+            "text": text,
+            "question_number": newest.get("question_number"),
+            "id": str(newest["_id"]),
+        }
+        if game:
+            await repo.set_game_context_summary(user_id, game_number, summary)
+
+    parts = [f"Summary of earlier turns: {summary['text']}"] if summary["text"] else []
+    parts.extend(_format_turn(m) for m in reversed(turns[:keep]))
+    return "\n".join(parts)
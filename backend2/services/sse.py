@@ -0,0 +1,21 @@
+"""Utilidades para respuestas Server-Sent Events (SSE)."""
+import json
+
+from fastapi.responses import StreamingResponse
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # evita que proxies (Render/nginx) acumulen el stream
+}
+
+
+def sse_event(data: dict, event: str = None) -> str:
+    """Formatea un evento SSE con payload JSON."""
+    payload = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    if event:
+        payload = f"event: {event}\n" + payload
+    return payload
+
+
+def sse_response(generator) -> StreamingResponse:
+    return StreamingResponse(generator, media_type="text/event-stream", headers=SSE_HEADERS)
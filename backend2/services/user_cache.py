@@ -0,0 +1,63 @@
+"""
+Caché en proceso de documentos de usuario (LRU + TTL).
+
+Evita un `find_one` en `users` en cada petición. Es write-through: las
+rutas que modifican el documento del usuario lo hacen con update(), que
+escribe con find_one_and_update y guarda en la caché el documento resultante,
+así la siguiente petición del mismo usuario no vuelve a Mongo. invalidate()
+queda para los borrados. No guarda el hash de la contraseña.
+"""
+from typing import Optional
+
+from config import settings
+from db import repository as repo
+from services.ttl_cache import TTLCache
+
+USER_CACHE_MAX_ENTRIES = settings.USER_CACHE_MAX_ENTRIES
+USER_CACHE_TTL_S = settings.USER_CACHE_TTL_S
+
+_cache = TTLCache(maxsize=USER_CACHE_MAX_ENTRIES, ttl=USER_CACHE_TTL_S)
+
+
+async def get_user(username: str) -> Optional[dict]:
+    if not username:
+        return None
+    user = _cache.get(username)
+    if user is None:
+        user = await repo.get_user(username, projection={"password": 0})
+        if user is not None:
+            _cache.set(username, user)
+    return user
+
+
+def remember(user: dict) -> None:
+    """Guarda un usuario ya leído (por ejemplo en el login)."""
+    user = {k: v for k, v in user.items() if k != "password"}
+    _cache.set(user["username"], user)
+
+
+async def update(user_id, update: dict) -> Optional[dict]:
+    """Aplica el update en Mongo y deja en la caché el documento actualizado."""
+    user = await repo.update_user_returning(user_id, update, projection={"password": 0})
+    if user is not None:
+        _cache.set(user["username"], user)
+    return user
+
+
+def patch_inc(username: str, increments: dict) -> None:
+    """Refleja en la copia cacheada un $inc de campos de primer nivel ya escrito en Mongo."""
+    def apply(user):
+        user = dict(user)
+        for field, value in increments.items():
+            user[field] = user.get(field, 0) + value
+        return user
+
+    _cache.update(username, apply)
+
+
+def invalidate(username: str) -> None:
+    _cache.pop(username)
+
+
+def stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,56 @@
+"""
+Agregados por usuario materializados en el documento de `users`.
+
+Los contadores se mantienen de forma atómica al escribir ($inc / $max),
+así get_stats los sirve con una sola lectura del usuario:
+
+    best_score
+    stats.total_games
+    stats.total_answered
+    stats.total_correct
+    stats.per_game.<game_number>.answered / .correct
+
+jobs/reconcile_stats.py repara cualquier desviación a partir del historial.
+"""
+
+
+def quiz_result_increments(game_number: int, answered: int, correct: int) -> dict:
+    """$inc sobre el usuario al registrar `answered` respuestas (`correct` correctas)."""
+    return {
+        "stats.total_answered": answered,
+        "stats.total_correct": correct,
+        f"stats.per_game.{game_number}.answered": answered,
+        f"stats.per_game.{game_number}.correct": correct,
+    }
+
+
+RESET_STATS = {
+    "$set": {
+        "stats.total_games": 0,
+        "stats.total_correct": 0,
+        "stats.total_answered": 0,
+        "stats.per_game": {},
+    }
+}
+
+
+def _accuracy(correct: int, answered: int) -> float:
+    return round(correct / answered, 4) if answered else 0.0
+
+
+def summarize(user: dict) -> dict:
+    stats = user.get("stats") or {}
+    per_game = stats.get("per_game") or {}
+    answered = stats.get("total_answered", 0)
+    correct = stats.get("total_correct", 0)
+    return {
+        "best_score": user.get("best_score", 0),
+        "total_games": stats.get("total_games", 0),
+        "total_correct": correct,
+        "total_answered": answered,
+        "accuracy": _accuracy(correct, answered),
+        "per_game_accuracy": {
+            game: _accuracy(g.get("correct", 0), g.get("answered", 0))
+            for game, g in sorted(per_game.items(), key=lambda item: int(item[0]))
+        },
+    }
@@ -0,0 +1,254 @@
+"""
+Write-behind para los registros append-only (mensajes y resultados de quiz).
+
+Modo por colección (WRITE_MODE_MESSAGES / WRITE_MODE_QUIZ_RESULTS):
+- "sync": insert_one en el camino de la respuesta (por defecto).
+- "buffered": el documento va a una cola en memoria acotada y una tarea de
+  fondo lo inserta con insert_many al llegar a WRITE_BEHIND_BATCH_SIZE o
+  cada WRITE_BEHIND_FLUSH_INTERVAL_S. Al apagar la app se vacía la cola.
+
+En modo buffered una lectura inmediatamente posterior puede no ver aún el
+registro, y una caída del proceso pierde lo que esté en la cola. Tras cada
+lote insertado se sube la versión (ETag) de los usuarios afectados, así que
+un ETag tomado antes del flush deja de valer.
+Si la cola está llena el llamador espera (backpressure) y, pasado
+WRITE_BEHIND_PUT_TIMEOUT_S, escribe de forma síncrona: nunca se descarta.
+"""
+import asyncio
+import logging
+import time
+
+from config import settings
+from db import repository as repo
+from services import conditional, user_cache
+
+logger = logging.getLogger(__name__)
+
+WRITE_MODE_MESSAGES = settings.WRITE_MODE_MESSAGES
+WRITE_MODE_QUIZ_RESULTS = settings.WRITE_MODE_QUIZ_RESULTS
+WRITE_BEHIND_MAX_QUEUE = settings.WRITE_BEHIND_MAX_QUEUE
+WRITE_BEHIND_BATCH_SIZE = settings.WRITE_BEHIND_BATCH_SIZE
+WRITE_BEHIND_FLUSH_INTERVAL_S = settings.WRITE_BEHIND_FLUSH_INTERVAL_S
+WRITE_BEHIND_PUT_TIMEOUT_S = settings.WRITE_BEHIND_PUT_TIMEOUT_S
+WRITE_BEHIND_MAX_RETRIES = 3
+
+_STOP = object()
+_FLUSH = object()
+
+
+class WriteBehindBuffer:
+    def __init__(self, name: str, insert_many, insert_one, mode: str, on_flush=None):
+        self.name = name
+        self.mode = mode
+        self._insert_many = insert_many
+        self._insert_one = insert_one
+        self._on_flush = on_flush
+        self._queue = None
+        self._task = None
+        # Posición en la cola: drain() espera a que se procese hasta su marca
+        self._seq_enqueued = 0
+        self._seq_done = 0
+        self._progress = asyncio.Condition()
+        self.counters = {
+            "enqueued": 0,
+            "flushed": 0,
+            "flushes": 0,
+            "sync_fallbacks": 0,
+            "failed": 0,
+        }
+        self.flush_latency = {"last_ms": 0.0, "max_ms": 0.0, "total_ms": 0.0}
+
+    @property
+    def buffered(self) -> bool:
+        return self.mode == "buffered"
+
+    # ---------------------------
+    # Ciclo de vida
+    # ---------------------------
+    def start(self):
+        if not self.buffered or self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=WRITE_BEHIND_MAX_QUEUE)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Detiene la tarea y vacía lo que quede en la cola."""
+        if self._task is None:
+            return
+        # Centinela: la tarea termina el lote en curso y sale sin cancelarse
+        # a mitad de un insert_many
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        while not self._queue.empty():
+            batch = self._drain(WRITE_BEHIND_BATCH_SIZE)
+            await self._flush(batch)
+            await self._processed(len(batch))
+        self._queue = None
+        async with self._progress:
+            self._progress.notify_all()
+
+    async def drain(self) -> None:
+        """
+        Espera a que todo lo encolado hasta ahora haya pasado por _flush
+        (incluido el lote en curso y sus reintentos). Lo que se encole
+        después no se espera. Solo cubre la cola de este proceso.
+        """
+        target = self._seq_enqueued
+        if self._queue is not None and self._seq_done < target:
+            # Corta la ventana de agrupado del lote en curso: flush ya
+            try:
+                self._queue.put_nowait(_FLUSH)
+            except asyncio.QueueFull:
+                pass  # cola llena: el lote ya sale completo sin esperar
+        async with self._progress:
+            await self._progress.wait_for(lambda: self._queue is None or self._seq_done >= target)
+
+    async def _processed(self, count: int) -> None:
+        self._seq_done += count
+        async with self._progress:
+            self._progress.notify_all()
+
+    # ---------------------------
+    # Escritura
+    # ---------------------------
+    async def write(self, doc: dict) -> None:
+        if self._queue is None:
+            await self._insert_one(doc)
+            return
+        try:
+            await asyncio.wait_for(self._queue.put(doc), timeout=WRITE_BEHIND_PUT_TIMEOUT_S)
+            self.counters["enqueued"] += 1
+            self._seq_enqueued += 1
+        except asyncio.TimeoutError:
+            # Cola llena demasiado tiempo: escritura directa (no se pierde nada)
+            self.counters["sync_fallbacks"] += 1
+            await self._insert_one(doc)
+
+    def _drain(self, limit: int) -> list:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            doc = self._queue.get_nowait()
+            if doc is not _FLUSH:
+                batch.append(doc)
+        return batch
+
+    async def _run(self):
+        while True:
+            # Espera el primer documento; luego junta hasta el tamaño de lote
+            # o hasta que se cumpla el intervalo
+            first = await self._queue.get()
+            if first is _STOP:
+                return
+            if first is _FLUSH:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + WRITE_BEHIND_FLUSH_INTERVAL_S
+            while len(batch) < WRITE_BEHIND_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    doc = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if doc is _STOP:
+                    await self._flush(batch)
+                    await self._processed(len(batch))
+                    return
+                if doc is _FLUSH:
+                    break
+                batch.append(doc)
+            await self._flush(batch)
+            await self._processed(len(batch))
+
+    async def _flush(self, batch: list) -> None:
+        """
+        insert_many no ordenado (devuelve {índice: estado}). Solo se
+        reintentan los documentos con error; un E11000 ("duplicate") cuenta
+        como escrito, porque es un documento que ya entró en un intento
+        anterior (insert_many le asignó el _id). on_flush corre siempre con
+        lo que quedó escrito, aunque parte del lote se pierda.
+        """
+        if not batch:
+            return
+        t0 = time.perf_counter()
+        pending, written, error = batch, [], None
+        for attempt in range(WRITE_BEHIND_MAX_RETRIES):
+            try:
+                status = await self._insert_many(pending)
+            except Exception as e:
+                error = e
+            else:
+                written.extend(doc for i, doc in enumerate(pending) if status.get(i) != "error")
+                pending = [doc for i, doc in enumerate(pending) if status.get(i) == "error"]
+                error = "write errors"
+            if not pending or attempt == WRITE_BEHIND_MAX_RETRIES - 1:
+                break
+            await asyncio.sleep(0.2 * (2 ** attempt))
+
+        if pending:
+            self.counters["failed"] += len(pending)
+            logger.error("write-behind %s: dropped %d docs after retries: %s", self.name, len(pending), error)
+
+        if written and self._on_flush is not None:
+            try:
+                await self._on_flush(written)
+            except Exception as e:
+                logger.warning("write-behind %s: on_flush failed: %s", self.name, e)
+
+        if not written:
+            return
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        self.counters["flushed"] += len(written)
+        self.counters["flushes"] += 1
+        self.flush_latency["last_ms"] = round(elapsed_ms, 2)
+        self.flush_latency["max_ms"] = round(max(self.flush_latency["max_ms"], elapsed_ms), 2)
+        self.flush_latency["total_ms"] += elapsed_ms
+
+    def stats(self) -> dict:
+        flushes = self.counters["flushes"]
+        return {
+            "mode": self.mode,
+            **self.counters,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "flush_latency_ms": {
+                "last": self.flush_latency["last_ms"],
+                "max": self.flush_latency["max_ms"],
+                "avg": round(self.flush_latency["total_ms"] / flushes, 2) if flushes else 0.0,
+            },
+        }
+
+
+async def bump_versions(batch: list) -> None:
+    """Nueva versión del historial de los usuarios del lote recién insertado."""
+    users = {doc["user_id"]: doc.get("username") for doc in batch}
+    await repo.update_users(list(users), {"$inc": conditional.VERSION_BUMP})
+    for username in users.values():
+        if username:
+            user_cache.patch_inc(username, conditional.VERSION_BUMP)
+
+
+messages_buffer = WriteBehindBuffer(
+    "messages", repo.insert_messages, repo.insert_message, WRITE_MODE_MESSAGES, bump_versions
+)
+quiz_results_buffer = WriteBehindBuffer(
+    "quiz_results", repo.insert_quiz_results, repo.insert_quiz_result, WRITE_MODE_QUIZ_RESULTS, bump_versions
+)
+BUFFERS = [messages_buffer, quiz_results_buffer]
+
+
+def start_all():
+    for buffer in BUFFERS:
+        buffer.start()
+
+async def stop_all():
+    for buffer in BUFFERS:
+        await buffer.stop()
+
+async def drain_all():
+    for buffer in BUFFERS:
+        await buffer.drain()
+
+def stats() -> dict:
+    return {buffer.name: buffer.stats() for buffer in BUFFERS}
@@ -0,0 +1,142 @@
+"""
+Fixtures compartidos: colecciones de Mongo reemplazadas por un fake en
+memoria (FakeCollection) con el subconjunto de operaciones que usa repo.
+"""
+import asyncio
+import copy
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# Los tests importan los módulos igual que la app (desde backend2/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+from pymongo.errors import DuplicateKeyError  # noqa: E402
+
+from db import repository as repo  # noqa: E402
+from services import user_cache  # noqa: E402
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None
+        doc = doc[part]
+    return doc
+
+
+_OPERATORS = {
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+
+def matches(doc, query) -> bool:
+    """Subconjunto del lenguaje de consultas de Mongo: igualdad, $and/$or y comparaciones."""
+    for key, value in query.items():
+        if key == "$and":
+            if not all(matches(doc, q) for q in value):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, q) for q in value):
+                return False
+        elif isinstance(value, dict) and value and all(op in _OPERATORS for op in value):
+            if not all(_OPERATORS[op](_get(doc, key), arg) for op, arg in value.items()):
+                return False
+        elif _get(doc, key) != value:
+            return False
+    return True
+
+
+def _set(doc, path, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+class FakeCollection:
+    def __init__(self, unique=None):
+        self.docs = []
+        self.unique = unique
+        self.duplicate_key_errors = 0
+
+    def _match(self, query):
+        return [d for d in self.docs if matches(d, query)]
+
+    def _check_unique(self, doc):
+        if self.unique and self._match({k: doc.get(k) for k in self.unique}):
+            self.duplicate_key_errors += 1
+            raise DuplicateKeyError("E11000 duplicate key")
+
+    @staticmethod
+    def _apply(doc, update, inserting):
+        for path, value in update.get("$set", {}).items():
+            _set(doc, path, value)
+        for path, value in update.get("$inc", {}).items():
+            _set(doc, path, (_get(doc, path) or 0) + value)
+        for path, value in update.get("$max", {}).items():
+            current = _get(doc, path)
+            _set(doc, path, value if current is None else max(current, value))
+        if inserting:
+            for path, value in update.get("$setOnInsert", {}).items():
+                _set(doc, path, value)
+
+    async def find_one(self, query, projection=None):
+        await asyncio.sleep(0)
+        found = self._match(query)
+        return copy.deepcopy(found[0]) if found else None
+
+    async def insert_one(self, doc):
+        await asyncio.sleep(0)
+        doc.setdefault("_id", ObjectId())
+        self._check_unique(doc)
+        self.docs.append(copy.deepcopy(doc))
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=None):
+        await asyncio.sleep(0)
+        found = self._match(query)
+        if not found:
+            return None
+        self._apply(found[0], update, inserting=False)
+        return copy.deepcopy(found[0])
+
+    async def update_one(self, query, update, upsert=False):
+        await asyncio.sleep(0)
+        found = self._match(query)
+        if found:
+            self._apply(found[0], update, inserting=False)
+            return SimpleNamespace(matched_count=1, upserted_id=None)
+        if not upsert:
+            return SimpleNamespace(matched_count=0, upserted_id=None)
+        # Como en Mongo: otra escritura puede colarse antes del insert
+        await asyncio.sleep(0)
+        doc = {"_id": ObjectId(), **query}
+        self._apply(doc, update, inserting=True)
+        self._check_unique(doc)
+        self.docs.append(doc)
+        return SimpleNamespace(matched_count=0, upserted_id=doc["_id"])
+
+
+@pytest.fixture
+def db(monkeypatch):
+    collections = SimpleNamespace(
+        users=FakeCollection(unique=["username"]),
+        games=FakeCollection(unique=["user_id", "game_number"]),
+        quiz_results=FakeCollection(),
+    )
+    monkeypatch.setattr(repo, "users_col", lambda: collections.users)
+    monkeypatch.setattr(repo, "games_col", lambda: collections.games)
+    monkeypatch.setattr(repo, "quiz_col", lambda: collections.quiz_results)
+    collections.users.docs.append({"_id": ObjectId(), "username": "ana", "best_score": 0, "stats": {}})
+    user_cache.invalidate("ana")
+    yield collections
+    user_cache.invalidate("ana")
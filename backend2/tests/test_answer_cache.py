@@ -0,0 +1,35 @@
+"""
+words_match: el filtro final del caché de respuestas. Acepta erratas y
+plurales en las palabras no compartidas, pero no palabras distintas ni de más.
+"""
+import pytest
+
+from services.answer_cache import content_words, normalize_question, words_match
+
+
+def _words(question):
+    return content_words(normalize_question(question))
+
+
+@pytest.mark.parametrize("a, b", [
+    ("What is myoglobin?", "what is MYOGLOBIN"),
+    ("What is myoglobin?", "What is myglobin?"),
+    ("Which foods have protein?", "Which foods have proteins?"),
+    ("How does hemoglobin carry oxygen?", "How does hemoglobn cary oxygen?"),
+])
+def test_variants_match(a, b):
+    assert words_match(_words(a), _words(b))
+
+
+@pytest.mark.parametrize("a, b", [
+    ("How much protein is in beef?", "How much protein is in turkey?"),
+    ("What is myoglobin?", "What is myoglobin in muscle?"),
+    ("Is fat good for you?", "Is sugar good for you?"),
+])
+def test_different_questions_do_not_match(a, b):
+    assert not words_match(_words(a), _words(b))
+
+
+def test_each_variant_is_used_once():
+    # "protien" ya se emparejó con "protein": "protiens" no puede reusarla
+    assert not words_match(["protien", "protiens"], ["protein", "beef"])
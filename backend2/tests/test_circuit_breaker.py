@@ -0,0 +1,125 @@
+"""
+Transiciones del circuit breaker: closed → open tras N fallos seguidos,
+open rechaza hasta open_s, half_open deja pasar una sola prueba que cierra
+o vuelve a abrir. El reloj (time.monotonic) se controla desde el test.
+"""
+import asyncio
+
+import pytest
+
+from services import circuit_breaker
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _breaker():
+    return CircuitBreaker("test", failure_threshold=3, open_s=30, slow_call_s=1.0)
+
+
+def test_opens_after_consecutive_failures_only(clock):
+    breaker = _breaker()
+    breaker.record(0.1, ok=False)
+    breaker.record(0.1, ok=False)
+    breaker.record(0.1)  # un éxito reinicia la racha
+    breaker.record(0.1, ok=False)
+    breaker.record(0.1, ok=False)
+    assert breaker.state == CLOSED
+
+    breaker.record(0.1, ok=False)
+    assert breaker.state == OPEN
+    assert breaker.counters["opened"] == 1
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record(2.5)  # ok pero por encima del SLO
+
+    assert breaker.state == OPEN
+    assert breaker.counters["slow_calls"] == 3
+
+
+def test_open_rejects_until_open_s_then_allows_one_trial(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record(0.1, ok=False)
+
+    clock[0] += 29
+    assert not breaker.allow()
+    assert breaker.counters["rejected"] == 1
+
+    clock[0] += 1
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Solo una llamada de prueba a la vez
+    assert not breaker.allow()
+
+
+def test_half_open_trial_success_closes(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record(0.1, ok=False)
+    clock[0] += 30
+    assert breaker.allow()
+
+    breaker.record(0.2)
+
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_half_open_trial_failure_reopens(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record(0.1, ok=False)
+    clock[0] += 30
+    assert breaker.allow()
+
+    breaker.record(0.1, ok=False)
+
+    assert breaker.state == OPEN
+    assert breaker.counters["opened"] == 2
+    assert not breaker.allow()
+
+
+def test_call_raises_circuit_open_without_calling():
+    breaker = CircuitBreaker("test", failure_threshold=1, open_s=30, slow_call_s=1.0)
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        raise ConnectionError("provider down")
+
+    async def run():
+        with pytest.raises(ConnectionError):
+            await breaker.call(failing)
+        with pytest.raises(CircuitOpen):
+            await breaker.call(failing)
+
+    asyncio.run(run())
+
+    assert calls == [1]
+    assert breaker.state == OPEN
+
+
+def test_call_counts_slow_call_as_soon_as_deadline_passes():
+    breaker = CircuitBreaker("test", failure_threshold=1, open_s=30, slow_call_s=0.01)
+    state_during_call = []
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        state_during_call.append(breaker.state)
+        return "late"
+
+    assert asyncio.run(breaker.call(slow)) == "late"
+    # El watchdog abrió el circuito antes de que la llamada terminara, y el
+    # resultado tardío no lo cierra
+    assert state_during_call == [OPEN]
+    assert breaker.state == OPEN
+    assert breaker.counters["calls"] == 1
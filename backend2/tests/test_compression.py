@@ -0,0 +1,105 @@
+"""
+CompressionMiddleware: comprime cuerpos grandes y streaming según
+Accept-Encoding, y deja pasar tal cual los pequeños, SSE y 304.
+"""
+import asyncio
+import gzip
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+
+from services.compression import CompressionMiddleware, brotli, choose_encoding
+
+BIG = "protein " * 500
+
+
+def _app():
+    app = FastAPI()
+
+    @app.get("/big")
+    async def big():
+        return PlainTextResponse(BIG)
+
+    @app.get("/small")
+    async def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/stream")
+    async def stream():
+        async def lines():
+            for i in range(20):
+                yield f'{{"n": {i}}}\n'.encode()
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.get("/sse")
+    async def sse():
+        return StreamingResponse(iter([BIG.encode()]), media_type="text/event-stream")
+
+    @app.get("/not-modified")
+    async def not_modified():
+        return Response(status_code=304, headers={"ETag": 'W/"1"'})
+
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+    return app
+
+
+def _get(path, accept_encoding="gzip"):
+    async def run():
+        transport = httpx.ASGITransport(app=_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            async with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+                raw = b"".join([chunk async for chunk in response.aiter_raw()])
+                return response, raw
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("", None),
+    ("br;q=1.0, gzip;q=0.5", "br" if brotli is not None else "gzip"),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header) == expected
+
+
+def test_large_body_is_gzipped_with_length_and_vary():
+    response, raw = _get("/big")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-length"] == str(len(raw))
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert gzip.decompress(raw).decode() == BIG
+
+
+def test_small_body_and_no_accept_encoding_pass_through():
+    small, raw = _get("/small")
+    assert "content-encoding" not in small.headers
+    assert raw == b"ok"
+
+    plain, raw = _get("/big", accept_encoding="identity")
+    assert "content-encoding" not in plain.headers
+    assert raw.decode() == BIG
+
+
+def test_stream_is_compressed_chunk_by_chunk():
+    response, raw = _get("/stream")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert gzip.decompress(raw).decode() == "".join(f'{{"n": {i}}}\n' for i in range(20))
+
+
+def test_sse_and_304_are_not_compressed():
+    sse, raw = _get("/sse")
+    assert "content-encoding" not in sse.headers
+    assert raw.decode() == BIG
+
+    not_modified, raw = _get("/not-modified")
+    assert not_modified.status_code == 304
+    assert "content-encoding" not in not_modified.headers
+    assert raw == b""
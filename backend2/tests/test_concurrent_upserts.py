@@ -0,0 +1,72 @@
+"""
+Concurrencia del camino de escritura: update_game / save_quiz_result.
+
+Las colecciones se reemplazan por un fake en memoria que reproduce la
+carrera de un upsert real en Mongo: entre "no hay documento" y el insert se
+cede el event loop, y el índice único (user_id, game_number) hace que el
+perdedor reciba DuplicateKeyError. Así se prueba que solo un envío por
+juego nuevo cuenta en total_games (upserted_id) y que el reintento de
+repo.upsert_game convierte el DuplicateKeyError en un update. El fake y el
+fixture `db` están en conftest.py.
+"""
+import asyncio
+
+from db import repository as repo
+from routes import user_routes
+
+
+def _quiz_result(game_number, question_number, is_correct):
+    return user_routes.save_quiz_result(
+        username="ana",
+        game_number=game_number,
+        question_number=question_number,
+        quiz_question="What is myoglobin?",
+        quiz_options=["a", "b", "c", "d"],
+        selected_option="B" if is_correct else "A",
+        correct_answer_letter="B",
+        correct_answer_text="b",
+        is_correct=is_correct,
+        authorization=None,
+    )
+
+
+def test_upsert_game_reports_creation_once_and_retries_duplicate_key(db):
+    user_id = db.users.docs[0]["_id"]
+
+    async def run():
+        return await asyncio.gather(*[
+            repo.upsert_game(user_id, 1, {"$inc": {"answered": 1}}) for _ in range(10)
+        ])
+
+    created = asyncio.run(run())
+
+    assert created.count(True) == 1
+    # Los perdedores chocaron con el índice único y se reintentaron como update
+    assert db.games.duplicate_key_errors > 0
+    assert len(db.games.docs) == 1
+    assert db.games.docs[0]["answered"] == 10
+
+
+def test_concurrent_update_game_and_save_quiz_result_count_each_game_once(db):
+    games, submissions = 3, 30
+
+    async def run():
+        calls = []
+        for i in range(submissions):
+            calls.append(_quiz_result(i % games, i, is_correct=i % 2 == 0))
+            calls.append(user_routes.update_game(user_routes.GameUpdate(
+                username="ana", game_number=i % games, question_number=i, correct_count=0, highest_score=i,
+            ), authorization=None))
+        await asyncio.gather(*calls)
+
+    asyncio.run(run())
+
+    user = db.users.docs[0]
+    assert db.games.duplicate_key_errors > 0
+    assert len(db.games.docs) == games
+    assert user["stats"]["total_games"] == games
+    assert user["stats"]["total_answered"] == submissions
+    assert user["stats"]["total_correct"] == submissions // 2
+    assert user["best_score"] == submissions - 1
+    assert sum(g["answered"] for g in db.games.docs) == submissions
+    assert len(db.quiz_results.docs) == submissions
@@ -0,0 +1,61 @@
+"""
+GET condicional: If-None-Match con el ETag de la versión del usuario da 304
+sin tocar el historial, y cualquier escritura que sube la versión invalida
+el ETag que tiene el cliente.
+"""
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from routes import user_routes
+from services import conditional
+
+
+def _etag(version):
+    return conditional.user_etag({"_id": ObjectId("0123456789abcdef01234567"), "version": version})
+
+
+@pytest.mark.parametrize("if_none_match, fresh", [
+    (None, False),
+    ("", False),
+    ("*", True),
+    (_etag(3), True),
+    (_etag(3)[2:], True),  # comparación débil: con o sin W/
+    (f'"other", {_etag(3)}', True),
+    (_etag(4), False),
+])
+def test_is_fresh(if_none_match, fresh):
+    assert conditional.is_fresh(_etag(3), if_none_match) is fresh
+
+
+def _get_stats(if_none_match=None):
+    # history=False: solo el documento del usuario (el fake no tiene messages)
+    return user_routes.get_stats(
+        username="ana", limit=None, after=None, view="full", fmt="json",
+        history=False, authorization=None, if_none_match=if_none_match,
+    )
+
+
+def test_get_stats_304_until_a_write_bumps_the_version(db):
+    async def run():
+        first = await _get_stats()
+        etag = first.headers["etag"]
+        again = await _get_stats(if_none_match=etag)
+
+        await user_routes.update_game(user_routes.GameUpdate(
+            username="ana", game_number=1, question_number=1, correct_count=1, highest_score=5,
+        ), authorization=None)
+        after_write = await _get_stats(if_none_match=etag)
+        return first, again, after_write
+
+    first, again, after_write = asyncio.run(run())
+
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == conditional.CACHE_CONTROL
+    assert again.status_code == 304
+    assert again.headers["etag"] == first.headers["etag"]
+    assert again.body == b""
+    assert after_write.status_code == 200
+    assert after_write.headers["etag"] != first.headers["etag"]
+    assert db.users.docs[0]["version"] == 1
@@ -0,0 +1,58 @@
+"""
+Paginación por keyset: el cursor opaco vuelve a (created_at, _id) y
+keyset_query pide exactamente lo posterior, también con created_at repetido.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from conftest import matches
+from db.pagination import decode_cursor, encode_cursor, keyset_query
+
+
+def _page(docs, query, after, limit):
+    """Lo que hace Mongo con el índice: filtro, orden (created_at, _id) y limit."""
+    found = [d for d in docs if matches(d, keyset_query(query, after))]
+    found.sort(key=lambda d: (d["created_at"], d["_id"]))
+    return found[:limit]
+
+
+def test_cursor_round_trip():
+    doc = {"_id": ObjectId(), "created_at": datetime(2024, 3, 1, 12, 30, 5, 123000)}
+
+    assert decode_cursor(encode_cursor(doc)) == (doc["created_at"], doc["_id"])
+
+
+@pytest.mark.parametrize("token", ["", "not-base64!", "eyJ0IjoxfQ==", encode_cursor({"_id": "x", "created_at": "2024-01-01"})])
+def test_invalid_cursor_raises_value_error(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+def test_keyset_pages_cover_every_doc_once_with_tied_timestamps():
+    user_id = ObjectId()
+    t0 = datetime(2024, 1, 1)
+    # Tres documentos por segundo: las páginas cortan en medio de un empate
+    docs = [
+        {"_id": ObjectId(), "user_id": user_id, "created_at": t0 + timedelta(seconds=i // 3)}
+        for i in range(10)
+    ]
+    docs.append({"_id": ObjectId(), "user_id": ObjectId(), "created_at": t0})
+    expected = sorted((d for d in docs if d["user_id"] == user_id), key=lambda d: (d["created_at"], d["_id"]))
+
+    seen, after = [], None
+    while True:
+        page = _page(docs, {"user_id": user_id}, after, limit=4)
+        if not page:
+            break
+        seen.extend(page)
+        after = encode_cursor(page[-1])
+
+    assert [d["_id"] for d in seen] == [d["_id"] for d in expected]
+
+
+def test_keyset_query_without_cursor_is_the_base_query():
+    query = {"user_id": ObjectId()}
+
+    assert keyset_query(query, None) is query
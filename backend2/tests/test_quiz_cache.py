@@ -0,0 +1,72 @@
+"""
+QuizCache: las peticiones con el mismo contexto comparten una generación, y
+si se cancela al dueño los que esperan reciben un error (sirven su
+fallback) en lugar de quedar colgados.
+"""
+import asyncio
+
+import pytest
+
+from services import quiz_cache as quiz_cache_module
+from services.quiz_cache import QuizCache
+
+QUIZ = {"question": "q", "options": ["a", "b", "c", "d"], "correct_answer_letter": "A", "correct_answer_text": "a"}
+
+
+@pytest.fixture
+def build(monkeypatch):
+    state = {"calls": 0, "release": None}
+
+    async def fake_build_quiz(context):
+        state["calls"] += 1
+        await state["release"].wait()
+        return QUIZ
+
+    monkeypatch.setattr(quiz_cache_module, "build_quiz", fake_build_quiz)
+    return state
+
+
+def _cache():
+    return QuizCache(maxsize=10, ttl=60, workers=1, queue_size=5)
+
+
+def test_same_context_shares_one_generation_then_hits_cache(build):
+    cache = _cache()
+
+    async def run():
+        build["release"] = asyncio.Event()
+        waiters = [asyncio.create_task(cache.get_or_generate("Tutor:  protein\n")) for _ in range(5)]
+        await asyncio.sleep(0)
+        build["release"].set()
+        results = await asyncio.gather(*waiters)
+        # Mismo contexto salvo espacios: mismo digest
+        return results, await cache.get_or_generate("Tutor: protein")
+
+    results, cached = asyncio.run(run())
+
+    assert build["calls"] == 1
+    assert results == [QUIZ] * 5 and cached == QUIZ
+    assert cache.counters["inflight_joins"] == 4
+    assert cache.counters["hits"] == 1
+
+
+def test_cancelled_owner_fails_waiters_instead_of_hanging(build):
+    cache = _cache()
+
+    async def run():
+        build["release"] = asyncio.Event()
+        owner = asyncio.create_task(cache.get_or_generate("ctx"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_generate("ctx"))
+        await asyncio.sleep(0)
+        owner.cancel()
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(waiter, timeout=1.0)
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        return cache.stats()
+
+    stats = asyncio.run(run())
+
+    assert stats["inflight"] == 0
+    assert stats["size"] == 0
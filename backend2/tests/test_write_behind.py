@@ -0,0 +1,120 @@
+"""
+Flush del write-behind con escrituras parciales: solo se reintenta lo que
+falló, un E11000 de un intento anterior cuenta como escrito y on_flush
+recibe todo lo que quedó en Mongo.
+"""
+import asyncio
+
+from services import write_behind
+from services.write_behind import WriteBehindBuffer
+
+
+class FlakyInsert:
+    """insert_many no ordenado que falla en los índices de `fail_first` la primera vez."""
+
+    def __init__(self, fail_first=(), raise_after_insert=False):
+        self.stored = set()
+        self.fail_first = set(fail_first)
+        self.raise_after_insert = raise_after_insert
+        self.calls = []
+
+    async def __call__(self, docs):
+        self.calls.append([d["n"] for d in docs])
+        status = {}
+        for i, doc in enumerate(docs):
+            if doc["n"] in self.stored:
+                status[i] = "duplicate"
+            elif doc["n"] in self.fail_first:
+                self.fail_first.discard(doc["n"])
+                status[i] = "error"
+            else:
+                self.stored.add(doc["n"])
+                status[i] = "inserted"
+        if self.raise_after_insert:
+            self.raise_after_insert = False
+            raise ConnectionError("network error after partial insert")
+        return status
+
+
+def _flush(insert, batch):
+    flushed = []
+
+    async def on_flush(docs):
+        flushed.extend(d["n"] for d in docs)
+
+    buffer = WriteBehindBuffer("test", insert, None, "buffered", on_flush)
+
+    async def run():
+        await buffer._flush(batch)
+
+    asyncio.run(run())
+    return buffer, flushed
+
+
+def test_flush_retries_only_failed_docs(monkeypatch):
+    monkeypatch.setattr(write_behind.asyncio, "sleep", _no_sleep)
+    insert = FlakyInsert(fail_first={2, 4})
+    buffer, flushed = _flush(insert, [{"n": n} for n in range(6)])
+
+    assert insert.calls == [[0, 1, 2, 3, 4, 5], [2, 4]]
+    assert sorted(flushed) == list(range(6))
+    assert buffer.counters["flushed"] == 6
+    assert buffer.counters["failed"] == 0
+
+
+def test_flush_counts_duplicates_from_previous_attempt_as_written(monkeypatch):
+    monkeypatch.setattr(write_behind.asyncio, "sleep", _no_sleep)
+    insert = FlakyInsert(raise_after_insert=True)
+    buffer, flushed = _flush(insert, [{"n": n} for n in range(3)])
+
+    assert len(insert.calls) == 2
+    assert sorted(flushed) == [0, 1, 2]
+    assert buffer.counters["failed"] == 0
+
+
+def test_flush_reports_only_lost_docs_and_still_calls_on_flush(monkeypatch):
+    monkeypatch.setattr(write_behind.asyncio, "sleep", _no_sleep)
+    insert = FlakyInsert()
+
+    async def always_fails_on_1(docs):
+        status = await insert(docs)
+        return {i: ("error" if d["n"] == 1 else s) for i, (d, s) in enumerate(zip(docs, status.values()))}
+
+    buffer, flushed = _flush(always_fails_on_1, [{"n": n} for n in range(3)])
+
+    assert sorted(flushed) == [0, 2]
+    assert buffer.counters["failed"] == 1
+    assert buffer.counters["flushed"] == 2
+
+
+async def _no_sleep(_):
+    return None
+
+
+def test_drain_waits_for_in_flight_flush_without_batch_window(monkeypatch):
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_FLUSH_INTERVAL_S", 30.0)
+    insert = FlakyInsert()
+    release = None
+
+    async def slow_insert(docs):
+        await release.wait()
+        return await insert(docs)
+
+    buffer = WriteBehindBuffer("test", slow_insert, None, "buffered")
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        buffer.start()
+        for n in range(3):
+            await buffer.write({"n": n})
+        drain = asyncio.create_task(buffer.drain())
+        await asyncio.sleep(0.05)
+        assert not drain.done()  # el insert_many sigue en curso
+        release.set()
+        # Sin la señal de flush esperaría los 30 s de ventana de agrupado
+        await asyncio.wait_for(drain, timeout=1.0)
+        assert insert.stored == {0, 1, 2}
+        await buffer.stop()
+
+    asyncio.run(run())